@@ -0,0 +1,598 @@
+from typing import Optional
+
+import streamlit as st
+import pandas as pd
+import numpy as np
+import plotly.graph_objects as go
+
+from data_loader import (agreger_par_blocs, decouper_en_blocs, version_dataset, TAILLE_BLOC, CATEGORIES_NICAD,
+                         CATEGORIES_DELIBERATION, SCHEMAS_COLONNES)
+
+# Dimensions du cube d'agrégats des parcelles (seules les colonnes présentes sont utilisées)
+DIMENSIONS_CUBE = ['commune', 'village', 'nicad', 'statut_deliberation', 'type_usag']
+
+
+class CubeParcelles:
+    """
+    Cube d'agrégats des parcelles : une ligne par combinaison de dimensions,
+    avec le nombre de parcelles et la somme / le min / le max de la superficie
+
+    Toutes les métriques et tous les graphiques des onglets du tableau de bord
+    sont des tranches de ce cube, bien plus petit que le jeu de données.
+    """
+
+    def __init__(self, cube, dimensions):
+        self.cube = cube
+        self.dimensions = dimensions
+
+    @classmethod
+    def construire(cls, df, taille_bloc=TAILLE_BLOC):
+        """Cube agrégé bloc par bloc : les groupby ne portent jamais que sur taille_bloc lignes"""
+        dimensions = [col for col in DIMENSIONS_CUBE if col in df.columns]
+        colonnes = dimensions + (['superficie'] if 'superficie' in df.columns else [])
+        blocs = decouper_en_blocs(df[colonnes], taille_bloc)
+        if 'superficie' in colonnes:
+            # Sommes en float64, quel que soit le type de la superficie reçue (import, dépôt)
+            blocs = (bloc.assign(superficie=bloc['superficie'].astype("float64")) for bloc in blocs)
+            cube = agreger_par_blocs(blocs, dimensions, 'superficie')
+        else:
+            cube = agreger_par_blocs(blocs, dimensions)
+            cube['sum'] = 0.0
+            cube['min'] = float('nan')
+            cube['max'] = float('nan')
+
+        cube = cube.rename(columns={'sum': 'superficie_totale', 'min': 'superficie_min', 'max': 'superficie_max'})
+        return cls(cube, dimensions)
+
+    def a_dimension(self, colonne):
+        return colonne in self.dimensions
+
+    def filtrer(self, **egalites):
+        """Tranche du cube restreinte aux valeurs données (ex: commune="BALA")"""
+        masque = pd.Series(True, index=self.cube.index)
+        for colonne, valeur in egalites.items():
+            if colonne not in self.dimensions:
+                masque &= False
+                continue
+            masque &= self.cube[colonne] == valeur
+        return CubeParcelles(self.cube[masque], self.dimensions)
+
+    def total(self):
+        return int(self.cube['nombre'].sum())
+
+    def nombre(self, colonne, valeur):
+        """Nombre de parcelles ayant une valeur donnée pour une dimension"""
+        if colonne not in self.dimensions:
+            return 0
+        return int(self.cube.loc[self.cube[colonne] == valeur, 'nombre'].sum())
+
+    def nombre_nicad(self):
+        return self.nombre('nicad', CATEGORIES_NICAD[0])
+
+    def nombre_deliberees(self):
+        return self.nombre('statut_deliberation', CATEGORIES_DELIBERATION[0])
+
+    def superficie_totale(self):
+        return float(self.cube['superficie_totale'].sum())
+
+    def valeurs(self, colonne):
+        """Valeurs distinctes (triées) d'une dimension dans la tranche"""
+        return sorted(self.cube[colonne].dropna().unique().tolist())
+
+    def repartition(self, colonne):
+        """Nombre de parcelles par valeur d'une dimension, du plus grand au plus petit"""
+        serie = self.cube.groupby(colonne, observed=True)['nombre'].sum()
+        return serie[serie > 0].sort_values(ascending=False)
+
+    def croise(self, colonne_1, colonne_2, nom="Nombre"):
+        """Nombre de parcelles par couple de valeurs de deux dimensions"""
+        croise = self.cube.groupby([colonne_1, colonne_2], observed=True)['nombre'].sum()
+        return croise[croise > 0].reset_index(name=nom)
+
+    def superficie_par(self, colonne):
+        """Superficie totale par valeur d'une dimension"""
+        return self.cube.groupby(colonne, observed=True)['superficie_totale'].sum()
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _cube_pour_version(version, _df):
+    return CubeParcelles.construire(_df)
+
+
+def obtenir_cube(df):
+    """Cube d'agrégats du jeu de données, construit une seule fois par version"""
+    return _cube_pour_version(version_dataset(df), df)
+
+
+# Colonnes filtrables de l'onglet "Analyse détaillée"
+COLONNES_FILTRES = ['commune', 'nicad', 'statut_deliberation', 'type_usag']
+# Option des filtres désignant les lignes sans valeur (sélectionnable comme les autres valeurs)
+VALEUR_MANQUANTE_FILTRE = "(non renseigné)"
+
+# Nombre de bits à 1 de chaque octet, pour compter les lignes d'un bitmap compressé
+_BITS_PAR_OCTET = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
+
+class MoteurFiltres:
+    """
+    Moteur de filtres à index bitmap pour les parcelles
+
+    Pour chaque colonne filtrable, un bitmap compressé (np.packbits) est
+    précalculé par valeur ; la superficie est indexée par un tri. Un état de
+    filtres se résout en un seul masque par opérations bit à bit et par
+    recherche dichotomique, sans créer de DataFrame intermédiaire.
+
+    Les lignes sans valeur d'une colonne ont leur propre bitmap, sous l'option
+    VALEUR_MANQUANTE_FILTRE : comme avec isin sur les valeurs de unique(), elles
+    restent retenues tant que cette option est sélectionnée.
+    """
+
+    def __init__(self, df):
+        self.nombre_lignes = len(df)
+        self.bitmaps = {}
+        for colonne in COLONNES_FILTRES:
+            if colonne not in df.columns:
+                continue
+            codes, valeurs = pd.factorize(df[colonne], sort=True)
+            self.bitmaps[colonne] = {
+                valeur: np.packbits(codes == code)
+                for code, valeur in enumerate(valeurs.tolist())
+            }
+            if (codes < 0).any():
+                self.bitmaps[colonne][VALEUR_MANQUANTE_FILTRE] = np.packbits(codes < 0)
+
+        if 'superficie' in df.columns:
+            superficie = df['superficie'].to_numpy(dtype="float64", na_value=np.nan)
+            self.superficie = superficie
+            self.ordre_superficie = np.argsort(superficie, kind="stable")
+            superficies_triees = superficie[self.ordre_superficie]
+            # Les NaN sont rangés en fin de tri : ils sont exclus de l'index
+            self.nombre_superficies = int(np.count_nonzero(~np.isnan(superficies_triees)))
+            self.superficies_triees = superficies_triees[:self.nombre_superficies]
+        else:
+            self.superficie = None
+
+        self._tout = np.packbits(np.ones(self.nombre_lignes, dtype=bool))
+
+    def a_colonne(self, colonne):
+        return colonne in self.bitmaps
+
+    def valeurs(self, colonne):
+        """Valeurs distinctes (triées) d'une colonne filtrable, puis VALEUR_MANQUANTE_FILTRE si besoin"""
+        return list(self.bitmaps.get(colonne, {}))
+
+    def bornes_superficie(self):
+        if self.superficie is None or self.nombre_superficies == 0:
+            return None
+        return float(self.superficies_triees[0]), float(self.superficies_triees[-1])
+
+    def _bitmap_plage(self, minimum, maximum):
+        debut = np.searchsorted(self.superficies_triees, minimum, side="left")
+        fin = np.searchsorted(self.superficies_triees, maximum, side="right")
+        masque = np.zeros(self.nombre_lignes, dtype=bool)
+        masque[self.ordre_superficie[debut:fin]] = True
+        return np.packbits(masque)
+
+    def bitmap(self, selections=None, plage_superficie=None):
+        """
+        Bitmap compressé des lignes retenues
+
+        selections : {colonne: valeurs retenues} ; une colonne dont toutes les
+        valeurs sont retenues est ignorée. plage_superficie : (min, max) inclusifs.
+        """
+        resultat = self._tout.copy()
+        for colonne, retenues in (selections or {}).items():
+            bitmaps = self.bitmaps.get(colonne)
+            if bitmaps is None or set(bitmaps) <= set(retenues):
+                continue
+            union = np.zeros_like(resultat)
+            for valeur in retenues:
+                if valeur in bitmaps:
+                    union |= bitmaps[valeur]
+            resultat &= union
+
+        if plage_superficie is not None and self.superficie is not None:
+            minimum, maximum = plage_superficie
+            bornes = self.bornes_superficie()
+            if bornes is None or minimum > bornes[0] or maximum < bornes[1] or self.nombre_superficies < self.nombre_lignes:
+                resultat &= self._bitmap_plage(minimum, maximum)
+        return resultat
+
+    def masque(self, selections=None, plage_superficie=None):
+        """Masque booléen (une valeur par ligne) de l'état de filtres"""
+        bitmap = self.bitmap(selections, plage_superficie)
+        return np.unpackbits(bitmap, count=self.nombre_lignes).astype(bool)
+
+    @staticmethod
+    def compter(bitmap):
+        return int(_BITS_PAR_OCTET[bitmap].sum())
+
+    def compter_valeur(self, bitmap, colonne, valeur):
+        """Nombre de lignes retenues ayant une valeur donnée pour une colonne"""
+        bitmap_valeur = self.bitmaps.get(colonne, {}).get(valeur)
+        if bitmap_valeur is None:
+            return 0
+        return self.compter(bitmap & bitmap_valeur)
+
+    def tableau_croise(self, bitmap, colonne_1, colonne_2):
+        """Tableau croisé des lignes retenues, calculé par intersections de bitmaps"""
+        # Comme pd.crosstab : les lignes sans valeur n'y figurent pas
+        lignes = {v: b for v, b in self.bitmaps[colonne_1].items() if v != VALEUR_MANQUANTE_FILTRE}
+        colonnes = {v: b for v, b in self.bitmaps[colonne_2].items() if v != VALEUR_MANQUANTE_FILTRE}
+        tableau = pd.DataFrame(
+            [[self.compter(bitmap & b1 & b2) for b2 in colonnes.values()] for b1 in lignes.values()],
+            index=pd.Index(list(lignes), name=colonne_1),
+            columns=pd.Index(list(colonnes), name=colonne_2)
+        )
+        # Comme pd.crosstab : lignes et colonnes vides retirées
+        return tableau.loc[tableau.sum(axis=1) > 0, tableau.sum(axis=0) > 0]
+
+    def superficies(self, masque):
+        """Superficies des lignes retenues (tableau NumPy, sans copie de DataFrame)"""
+        if self.superficie is None:
+            return np.empty(0)
+        return self.superficie[masque]
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _moteur_pour_version(version, _df):
+    return MoteurFiltres(_df)
+
+
+def obtenir_moteur_filtres(df):
+    """Moteur de filtres du jeu de données, construit une seule fois par version"""
+    return _moteur_pour_version(version_dataset(df), df)
+
+
+# Colonnes du récapitulatif par commune, dans l'ordre d'affichage et d'export
+COLONNES_RESUME_COMMUNE = ['Commune', 'Nombre total parcelles', 'Parcelles NICAD', 'Parcelles délibérées', 'Superficie totale']
+
+
+def _masque_booleen(df, colonne_booleenne, colonne_libelle, libelle_vrai):
+    """Masque booléen (a_nicad, deliberee) ou, à défaut, comparaison au libellé"""
+    if colonne_booleenne in df.columns:
+        return df[colonne_booleenne].astype(bool).to_numpy()
+    if colonne_libelle in df.columns:
+        return (df[colonne_libelle] == libelle_vrai).to_numpy()
+    return np.zeros(len(df), dtype=bool)
+
+
+def construire_resume_par_commune(df) -> pd.DataFrame:
+    """
+    Récapitulatif par commune en un seul groupby vectorisé
+
+    Chaque indicateur est une colonne numérique (1 par parcelle, masques
+    booléens NICAD / délibération, superficie) : une seule somme groupée par
+    commune les calcule tous, alignés sur la clé commune.
+    """
+    if 'commune' not in df.columns:
+        return pd.DataFrame(columns=COLONNES_RESUME_COMMUNE)
+
+    indicateurs = pd.DataFrame({
+        'Commune': df['commune'].to_numpy(),
+        'Nombre total parcelles': np.ones(len(df), dtype="int64"),
+        'Parcelles NICAD': _masque_booleen(df, 'a_nicad', 'nicad', CATEGORIES_NICAD[0]).astype("int64"),
+        'Parcelles délibérées': _masque_booleen(df, 'deliberee', 'statut_deliberation', CATEGORIES_DELIBERATION[0]).astype("int64"),
+        'Superficie totale': (
+            pd.to_numeric(df['superficie'], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+            if 'superficie' in df.columns else np.zeros(len(df))
+        ),
+    })
+    resume = indicateurs.groupby('Commune', observed=True, sort=False).sum().reset_index()
+    return resume.sort_values('Nombre total parcelles', ascending=False, kind="stable").reset_index(drop=True)
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _resume_pour_version(version, _df):
+    return construire_resume_par_commune(_df)
+
+
+def resume_par_commune(df) -> pd.DataFrame:
+    """
+    Récapitulatif par commune (parcelles, NICAD, délibérées, superficie), calculé
+    une fois par version du jeu de données
+
+    Utilisé par l'onglet "Analyse par Commune" et son export CSV ; la table
+    retournée est indépendante de Streamlit pour servir aussi aux rapports.
+    """
+    return _resume_pour_version(version_dataset(df), df)
+
+
+# Options de découpage des histogrammes calculés côté serveur
+ECHELLES_HISTOGRAMME = {"Linéaire": "lineaire", "Logarithmique": "log"}
+BORNES_HISTOGRAMME = {"Classes égales": "egales", "Quantiles": "quantiles"}
+
+
+def classes_histogramme(valeurs, nb_classes: int = 20, echelle: str = "lineaire", bornes: str = "egales", poids=None) -> pd.DataFrame:
+    """
+    Découpe des valeurs en classes d'histogramme avec NumPy
+
+    Retourne une ligne par classe (debut, fin, nombre, densite) : le graphique
+    n'envoie au navigateur que ces nb_classes barres, quel que soit le nombre
+    de valeurs. echelle="log" espace les bornes géométriquement (valeurs > 0
+    seulement) ; bornes="quantiles" donne des classes d'effectifs égaux.
+    poids : pondération de chaque valeur (ex: inverse du taux de sondage d'un
+    échantillon), les effectifs étant alors des effectifs estimés.
+    """
+    valeurs = np.asarray(valeurs, dtype="float64")
+    poids = np.ones(valeurs.size) if poids is None else np.asarray(poids, dtype="float64")
+    gardees = np.isfinite(valeurs)
+    if echelle == "log":
+        gardees &= valeurs > 0
+    valeurs, poids = valeurs[gardees], poids[gardees]
+    if valeurs.size == 0:
+        return pd.DataFrame(columns=['debut', 'fin', 'nombre', 'densite'])
+
+    minimum, maximum = valeurs.min(), valeurs.max()
+    if bornes == "quantiles":
+        limites = np.unique(np.quantile(valeurs, np.linspace(0, 1, nb_classes + 1)))
+    elif echelle == "log":
+        limites = np.geomspace(minimum, maximum, nb_classes + 1) if maximum > minimum else np.array([])
+    else:
+        limites = np.histogram_bin_edges(valeurs, bins=nb_classes)
+    if limites.size < 2:
+        # Une seule valeur distincte : une classe unique autour d'elle
+        if maximum > minimum:
+            limites = np.array([minimum, maximum])
+        elif echelle == "log":
+            limites = np.array([minimum / 2, minimum * 2])
+        else:
+            limites = np.array([minimum - 0.5, minimum + 0.5])
+
+    nombres, limites = np.histogram(valeurs, bins=limites, weights=poids)
+    nombres = np.rint(nombres).astype("int64")
+    largeurs = np.diff(limites)
+    return pd.DataFrame({
+        'debut': limites[:-1],
+        'fin': limites[1:],
+        'nombre': nombres,
+        'densite': np.divide(nombres, largeurs, out=np.zeros(len(nombres)), where=largeurs > 0)
+    })
+
+
+def figure_histogramme(classes: pd.DataFrame, titre: str, libelle_x: str, echelle: str = "lineaire", bornes: str = "egales"):
+    """
+    Histogramme Plotly à partir de classes précalculées (barres jointives)
+
+    Avec des classes inégales (quantiles), la hauteur est la densité pour que
+    l'aire des barres reste proportionnelle aux effectifs. En échelle log, la
+    géométrie est calculée en log10 et l'axe porte les valeurs réelles.
+    """
+    debut = classes['debut'].to_numpy()
+    fin = classes['fin'].to_numpy()
+    if echelle == "log":
+        debut, fin = np.log10(debut), np.log10(fin)
+    hauteur = classes['densite'] if bornes == "quantiles" else classes['nombre']
+    libelle_y = f"Parcelles par unité de {libelle_x}" if bornes == "quantiles" else "Nombre de parcelles"
+
+    fig = go.Figure(go.Bar(
+        x=(debut + fin) / 2,
+        y=hauteur,
+        width=fin - debut,
+        customdata=np.column_stack([classes['debut'], classes['fin'], classes['nombre']]),
+        hovertemplate="%{customdata[0]:,.1f} – %{customdata[1]:,.1f}<br>%{customdata[2]:,} parcelles<extra></extra>",
+        marker_line_width=0.5,
+        marker_line_color="white"
+    ))
+    fig.update_layout(title=titre, xaxis_title=libelle_x, yaxis_title=libelle_y, bargap=0)
+
+    if echelle == "log" and len(classes) > 0:
+        puissances = np.arange(np.floor(debut.min()), np.ceil(fin.max()) + 1)
+        fig.update_xaxes(tickvals=puissances, ticktext=[f"{10 ** p:,.0f}" if p >= 0 else f"{10 ** p:g}" for p in puissances])
+    return fig
+
+
+# Communes de la zone d'intervention : toute autre valeur est signalée par le profil qualité
+COMMUNES_CONNUES = frozenset([
+    'BALA', 'BALLOU', 'BANDAFASSI', 'BEMBOU', 'DIMBOLI', 'DINDEFELO', 'FONGOLIMBI', 'GABOU',
+    'KOAR', 'MISSIRAH', 'MOUDERY', 'NDOGA BABACAR', 'NETTEBOULOU', 'SINTHIOU MALEME', 'TOMBORONKOTO'
+])
+
+# Numéro cadastral (NICAD) : 12 à 16 chiffres
+LONGUEUR_NICAD = (12, 16)
+
+
+def _doublons_par_hash(valeurs, exemples: int = 20) -> dict:
+    """Doublons d'une colonne d'identifiants via un index de hash (un seul passage)"""
+    valeurs = valeurs.dropna().astype(str)
+    hashes = pd.util.hash_array(valeurs.to_numpy(dtype=object))
+    uniques, inverse, effectifs = np.unique(hashes, return_inverse=True, return_counts=True)
+    repetes = effectifs[inverse] > 1
+    return {
+        'lignes': int((effectifs[effectifs > 1] - 1).sum()),
+        'identifiants': int((effectifs > 1).sum()),
+        'exemples': valeurs[repetes].drop_duplicates().head(exemples).tolist(),
+    }
+
+
+def _controle_nicad(df) -> Optional[dict]:
+    """Format des numéros cadastraux et cohérence avec le statut NICAD"""
+    colonne = 'numero cadastral'
+    if colonne not in df.columns:
+        return None
+
+    numeros = df[colonne]
+    if pd.api.types.is_float_dtype(numeros.dtype):
+        # Numéros lus comme flottants par Excel : reconvertis en entiers
+        texte = numeros.round().astype("Int64").astype("string")
+    else:
+        texte = numeros.astype(str).str.strip().where(numeros.notna())
+    presents = texte.notna().to_numpy()
+    longueurs = texte.str.len()
+    format_valide = texte.str.fullmatch(r"\d+", na=False) & longueurs.between(*LONGUEUR_NICAD)
+    invalides = presents & ~format_valide.to_numpy()
+
+    a_nicad = _masque_booleen(df, 'a_nicad', 'nicad', CATEGORIES_NICAD[0])
+    return {
+        'colonne': colonne,
+        'format_invalide': int(invalides.sum()),
+        'exemples_invalides': texte[invalides].drop_duplicates().head(10).tolist(),
+        'nicad_sans_numero': int((a_nicad & ~presents).sum()),
+        'numero_sans_nicad': int((~a_nicad & presents).sum()),
+    }
+
+
+def construire_profil_qualite(df) -> dict:
+    """
+    Profil qualité d'un jeu de parcelles : valeurs manquantes, doublons,
+    superficies invalides, communes inconnues et format NICAD
+
+    Chaque contrôle est vectorisé et n'est calculé qu'une fois par version
+    (voir profil_qualite) ; l'affichage ne fait que lire le dictionnaire.
+    """
+    nb_lignes = len(df)
+    manquantes = df.isna().sum()
+    valeurs_manquantes = pd.DataFrame({
+        'Colonne': manquantes.index.astype(str),
+        'Valeurs manquantes': manquantes.to_numpy(),
+        'Pourcentage': (manquantes.to_numpy() / nb_lignes * 100) if nb_lignes else 0.0,
+    })
+    valeurs_manquantes = valeurs_manquantes[valeurs_manquantes['Valeurs manquantes'] > 0].reset_index(drop=True)
+
+    # Lignes entièrement identiques : un seul hash par ligne
+    hashes_lignes = pd.util.hash_pandas_object(df, index=False).to_numpy() if nb_lignes else np.empty(0, dtype="uint64")
+    lignes_dupliquees = int(nb_lignes - np.unique(hashes_lignes).size)
+
+    superficie = None
+    if 'superficie' in df.columns:
+        valeurs = pd.to_numeric(df['superficie'], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        superficie = {
+            'manquantes': int(np.isnan(valeurs).sum()),
+            'nulles_ou_negatives': int((valeurs <= 0).sum()),
+            'non_finies': int(np.isinf(valeurs).sum()),
+        }
+
+    communes_inconnues = {}
+    if 'commune' in df.columns:
+        effectifs = df['commune'].astype(str).str.strip().str.upper().value_counts()
+        communes_inconnues = {
+            commune: int(nombre) for commune, nombre in effectifs.items()
+            if commune not in COMMUNES_CONNUES
+        }
+
+    return {
+        'lignes': nb_lignes,
+        'valeurs_manquantes': valeurs_manquantes,
+        'lignes_dupliquees': lignes_dupliquees,
+        'doublons_id': _doublons_par_hash(df['id_parcelle']) if 'id_parcelle' in df.columns else None,
+        'superficie': superficie,
+        'communes_inconnues': communes_inconnues,
+        'nicad': _controle_nicad(df),
+    }
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _profil_pour_version(version, _df):
+    return construire_profil_qualite(_df)
+
+
+def profil_qualite(df, charger_colonnes=None) -> dict:
+    """
+    Profil qualité du jeu de données, calculé une seule fois par version
+
+    Le profil porte sur toutes les colonnes des parcelles : si df est la
+    projection par défaut, les colonnes optionnelles absentes (id_parcelle,
+    numero cadastral...) sont d'abord chargées par charger_colonnes(colonnes).
+    Sans elles, les doublons seraient comptés sur une partie des colonnes et
+    les contrôles d'identifiants et de NICAD ne pourraient pas être faits.
+    """
+    absentes = tuple(col for col in SCHEMAS_COLONNES['parcelles']['optionnelles'] if col not in df.columns)
+    if absentes and charger_colonnes is not None:
+        complet = charger_colonnes(absentes)
+        # Même nombre de lignes : df est bien une projection du jeu chargé
+        if len(complet) == len(df):
+            df = complet
+    return _profil_pour_version(version_dataset(df), df)
+
+
+# Échantillon stratifié par commune du mode approximatif
+FRACTION_ECHANTILLON = 0.1
+MINIMUM_PAR_STRATE = 50
+# Quantile de la loi normale pour des intervalles de confiance à 95 %
+Z_CONFIANCE = 1.96
+
+
+class EchantillonStratifie:
+    """
+    Échantillon aléatoire stratifié par commune, pour estimer les métriques
+    de l'onglet "Analyse détaillée" avec des intervalles de confiance
+
+    Chaque commune est échantillonnée au taux FRACTION_ECHANTILLON (au moins
+    MINIMUM_PAR_STRATE parcelles, ou toutes si elle en compte moins). Les
+    filtres sont évalués sur l'échantillon par son propre MoteurFiltres et les
+    totaux sont extrapolés par l'estimateur stratifié classique.
+    """
+
+    def __init__(self, df, colonne_strate='commune', fraction=FRACTION_ECHANTILLON,
+                 minimum=MINIMUM_PAR_STRATE, graine=0):
+        generateur = np.random.default_rng(graine)
+        if colonne_strate in df.columns:
+            codes, _ = pd.factorize(df[colonne_strate])
+            codes = np.where(codes < 0, codes.max() + 1, codes)
+        else:
+            codes = np.zeros(len(df), dtype="int64")
+        nb_strates = int(codes.max()) + 1 if len(codes) else 0
+
+        tirages = []
+        for strate in range(nb_strates):
+            lignes = np.flatnonzero(codes == strate)
+            taille = min(lignes.size, max(minimum, int(np.ceil(fraction * lignes.size))))
+            tirages.append(generateur.choice(lignes, size=taille, replace=False))
+        self.positions = np.sort(np.concatenate(tirages)) if tirages else np.empty(0, dtype="int64")
+
+        self.strates = codes[self.positions]
+        self.effectifs = np.bincount(codes, minlength=nb_strates).astype("float64")
+        self.tailles = np.bincount(self.strates, minlength=nb_strates).astype("float64")
+        self.poids = (self.effectifs / np.maximum(self.tailles, 1))[self.strates]
+
+        df_echantillon = df.iloc[self.positions]
+        self.moteur = MoteurFiltres(df_echantillon)
+        self.a_nicad = _masque_booleen(df_echantillon, 'a_nicad', 'nicad', CATEGORIES_NICAD[0])
+        self.deliberee = _masque_booleen(df_echantillon, 'deliberee', 'statut_deliberation', CATEGORIES_DELIBERATION[0])
+
+    @property
+    def taille(self):
+        return len(self.positions)
+
+    def estimer_total(self, y):
+        """Total estimé d'une variable observée sur l'échantillon et demi-largeur de l'IC à 95 %"""
+        y = np.asarray(y, dtype="float64")
+        n = self.tailles
+        sommes = np.bincount(self.strates, weights=y, minlength=n.size)
+        carres = np.bincount(self.strates, weights=y * y, minlength=n.size)
+        moyennes = np.divide(sommes, n, out=np.zeros_like(sommes), where=n > 0)
+        variances = np.divide(carres - n * moyennes ** 2, n - 1, out=np.zeros_like(sommes), where=n > 1)
+        # Correction de population finie : une strate recensée entièrement n'a pas de variance
+        variance_total = np.sum(
+            np.divide(self.effectifs ** 2 * (1 - n / np.maximum(self.effectifs, 1)) * np.maximum(variances, 0), n,
+                      out=np.zeros_like(sommes), where=n > 0)
+        )
+        return float(np.sum(self.effectifs * moyennes)), float(Z_CONFIANCE * np.sqrt(variance_total))
+
+    def estimer(self, selections=None, plage_superficie=None):
+        """
+        Estimations (valeur, demi-intervalle) du total, des parcelles NICAD et
+        délibérées et de la superficie pour un état de filtres, plus les
+        superficies retenues de l'échantillon et leurs poids (histogramme)
+        """
+        masque = self.moteur.masque(selections, plage_superficie)
+        superficies = self.moteur.superficies(np.ones(self.taille, dtype=bool))
+        superficie_retenue = np.where(masque & np.isfinite(superficies), superficies, 0.0)
+        return {
+            'total': self.estimer_total(masque),
+            'nicad': self.estimer_total(masque & self.a_nicad),
+            'deliberees': self.estimer_total(masque & self.deliberee),
+            'superficie': self.estimer_total(superficie_retenue),
+            'superficies': superficies[masque],
+            'poids': self.poids[masque],
+        }
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _echantillon_pour_version(version, _df):
+    return EchantillonStratifie(_df)
+
+
+def obtenir_echantillon(df):
+    """Échantillon stratifié du jeu de données, tiré une seule fois par version"""
+    return _echantillon_pour_version(version_dataset(df), df)
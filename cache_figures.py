@@ -0,0 +1,114 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from data_loader import version_dataset
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximal de figures gardées en mémoire (toutes pages et sessions confondues)
+TAILLE_MAX_CACHE_FIGURES = int(os.environ.get("PROCASEF_CACHE_FIGURES", "128"))
+
+
+def normaliser_parametres(valeur: Any) -> Any:
+    """
+    Convertit des arguments de filtre en une forme hachable et canonique
+
+    Les listes de sélection (multiselect) sont triées : deux états de filtres
+    qui ne diffèrent que par l'ordre de sélection partagent la même figure.
+    """
+    if isinstance(valeur, dict):
+        return tuple(sorted((str(cle), normaliser_parametres(val)) for cle, val in valeur.items()))
+    if isinstance(valeur, (list, tuple, set, frozenset, pd.Index, np.ndarray)):
+        elements = [normaliser_parametres(val) for val in valeur]
+        try:
+            return tuple(sorted(elements))
+        except TypeError:
+            return tuple(sorted(elements, key=repr))
+    if isinstance(valeur, np.generic):
+        return valeur.item()
+    if isinstance(valeur, pd.Timestamp):
+        return valeur.isoformat()
+    return valeur
+
+
+class CacheFigures:
+    """Cache LRU borné des figures Plotly construites, partagé entre les sessions
+
+    La clé combine l'empreinte du jeu de données (version_dataset), le nom de la
+    figure et les arguments de filtre normalisés. Une figure n'est reconstruite
+    que si l'un des trois change ; un rerun provoqué par un autre widget la
+    retrouve telle quelle, prête pour st.plotly_chart.
+
+    Les figures retournées sont partagées : ne jamais les modifier après coup,
+    toute mise en forme doit se faire dans la fonction de construction.
+    """
+
+    def __init__(self, taille_max: int = TAILLE_MAX_CACHE_FIGURES):
+        self.taille_max = taille_max
+        self.figures = OrderedDict()
+        self.succes = 0
+        self.echecs = 0
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def cle(empreinte: str, nom: str, parametres: dict) -> tuple:
+        return (empreinte, nom, normaliser_parametres(parametres))
+
+    def obtenir(self, empreinte: str, nom: str, construire: Callable[[], Any], **parametres):
+        """Retourne la figure en cache, ou la construit avec construire() et la garde"""
+        cle = self.cle(empreinte, nom, parametres)
+        with self.lock:
+            if cle in self.figures:
+                self.figures.move_to_end(cle)
+                self.succes += 1
+                return self.figures[cle]
+
+        figure = construire()
+        if figure is None:
+            return None
+
+        with self.lock:
+            self.echecs += 1
+            self.figures[cle] = figure
+            self.figures.move_to_end(cle)
+            while len(self.figures) > self.taille_max:
+                cle_evincee, _ = self.figures.popitem(last=False)
+                logger.debug(f"Cache figures: {cle_evincee[1]} évincée")
+        return figure
+
+    def vider(self, empreinte: Optional[str] = None) -> None:
+        """Vide le cache, ou seulement les figures d'une version de jeu de données"""
+        with self.lock:
+            if empreinte is None:
+                self.figures.clear()
+                return
+            for cle in [cle for cle in self.figures if cle[0] == empreinte]:
+                del self.figures[cle]
+
+    def statistiques(self) -> dict:
+        with self.lock:
+            return {'figures': len(self.figures), 'taille_max': self.taille_max,
+                    'succes': self.succes, 'echecs': self.echecs}
+
+
+# Cache de figures partagé par toutes les pages du tableau de bord
+cache_figures = CacheFigures()
+
+
+def figure_en_cache(donnees, nom: str, construire: Callable[[], Any], **parametres):
+    """
+    Figure construite par construire(), mise en cache par version des données
+
+    Args:
+        donnees: DataFrame (ou dict / liste de DataFrames) dont dépend la figure
+        nom (str): Identifiant unique de la figure (ex: "parcelles.repartition_nicad")
+        construire: Fonction sans argument qui construit la figure
+        **parametres: Arguments de filtre dont dépend la figure
+    """
+    return cache_figures.obtenir(version_dataset(donnees), nom, construire, **parametres)
@@ -16,11 +16,12 @@ import progression
 from projections_2025 import afficher_projections_2025
 import genre_dashboard
 import post_traitement
+import rapport_preparation
 from data_loader import (
-    charger_parcelles,
-    charger_levee_par_commune,
-    charger_parcelles_terrain_periode,
-    charger_etapes,
+    registre_donnees,
+    magasin_donnees,
+    lancer_prechauffage,
+    lancer_surveillance,
     interface_telechargement_fichier
 )
 
@@ -35,8 +36,32 @@ def load_gif_as_base64(gif_path):
         return None
 
 
+@st.cache_resource
+def demarrer_magasin():
+    """Purge une seule fois par processus serveur les jeux déversés par un serveur précédent"""
+    magasin_donnees.purger_dossier()
+    return magasin_donnees
+
+
+@st.cache_resource
+def demarrer_prechauffage():
+    """Lance une seule fois par processus serveur le préchauffage des classeurs"""
+    return lancer_prechauffage()
+
+
+@st.cache_resource
+def demarrer_surveillance():
+    """Lance une seule fois par processus serveur la surveillance des fichiers de données"""
+    return lancer_surveillance()
+
+
 # --- APPLICATION PRINCIPALE ---
 def main():
+    demarrer_magasin()
+    # Préchauffage en arrière-plan : ne bloque pas l'affichage
+    demarrer_prechauffage()
+    demarrer_surveillance()
+
     # --- SIDEBAR ---
     with st.sidebar:
         # Personnalisation du fond de la sidebar
@@ -97,7 +122,8 @@ def main():
                 "État d'avancement",
                 "Projections 2025",
                 "Répartition du genre",
-                "Post-traitement"
+                "Post-traitement",
+                "Préparation des données"
             ],
             icons=["map", "bar-chart-line", "calendar", "gender-female", "search", "gear"],
             menu_icon="cast",
@@ -121,31 +147,32 @@ def main():
     # --- CONTENU PRINCIPAL ---
     st.title("📊 Tableau de Bord PROCASEF - Boundou")
 
-    # Chargement des données avec gestion des erreurs
-    df_parcelles = charger_parcelles()
-    
-    # Vérifier si les données sont présentes
-    if df_parcelles.empty:
-        # Vérifier si on a des données uploadées dans la session
-        if 'df_parcelles_uploaded' in st.session_state:
-            df_parcelles = st.session_state['df_parcelles_uploaded']
-        else:
-            # Afficher l'interface de téléchargement
-            df_uploaded = interface_telechargement_fichier()
-            if not df_uploaded.empty:
+    # Chaque page ne charge que les jeux de données qu'elle déclare (DATASETS_REQUIS)
+    if selected == "Répartition des parcelles":
+        donnees = registre_donnees.charger_page(repartParcelles.DATASETS_REQUIS)
+        df_parcelles = donnees['parcelles']
+
+        # Vérifier si les données sont présentes
+        if df_parcelles.empty:
+            # Vérifier si la session a déjà téléchargé un fichier (poignée du magasin partagé)
+            df_uploaded = magasin_donnees.obtenir(st.session_state.get('parcelles_uploaded_handle'))
+            if df_uploaded is not None:
                 df_parcelles = df_uploaded
             else:
-                # Afficher un message d'information et arrêter l'exécution
-                st.info("🔄 Veuillez télécharger un fichier de données pour commencer l'analyse.")
-                return
+                # Afficher l'interface de téléchargement
+                df_uploaded = interface_telechargement_fichier()
+                if not df_uploaded.empty:
+                    df_parcelles = df_uploaded
+                else:
+                    # Afficher un message d'information et arrêter l'exécution
+                    st.info("🔄 Veuillez télécharger un fichier de données pour commencer l'analyse.")
+                    return
 
-    # Maintenant procéder avec l'affichage des différents modules
-    if selected == "Répartition des parcelles":
         repartParcelles.afficher_dashboard_parcelles(df_parcelles)
 
     elif selected == "État d'avancement":
-        df_etapes = charger_etapes()
-        progression.afficher_etat_avancement(df_etapes)
+        donnees = registre_donnees.charger_page(progression.DATASETS_REQUIS)
+        progression.afficher_etat_avancement(donnees['etapes'])
 
     elif selected == "Projections 2025":
         afficher_projections_2025()
@@ -156,6 +183,9 @@ def main():
     elif selected == "Post-traitement":
         post_traitement.afficher_analyse_parcelles()
 
+    elif selected == "Préparation des données":
+        rapport_preparation.afficher_rapport_preparation()
+
 
 # --- POINT D'ENTRÉE ---
 if __name__ == "__main__":
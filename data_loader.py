@@ -1,15 +1,762 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import io
 import os
 import sys
+import json
+import time
+import hashlib
+import threading
+import weakref
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Iterator, Tuple
 import logging
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# pyarrow est optionnel : sans lui, on relit simplement les fichiers Excel
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_DISPONIBLE = True
+except ImportError:
+    PARQUET_DISPONIBLE = False
+
+# Dossier des fichiers Parquet "sidecar", créé à côté de chaque classeur
+DOSSIER_SIDECAR = ".cache"
+# À incrémenter quand une fonction process_* change le schéma produit
+VERSION_SIDECAR = 4
+
+# Classeurs lus directement par les pages genre et projections
+FICHIERS_GENRE = {
+    'trimestre': "genre/Genre par trimestre.xlsx",
+    'repartition': "genre/Repartition genre.xlsx",
+    'commune': "genre/Genre par Commune.xlsx"
+}
+FICHIER_PROJECTIONS = "projections/Projections 2025.xlsx"
+# Rapport d'exécution JSON écrit par prepare_data dans son dossier de sortie
+FICHIER_RAPPORT_PREPARATION = "rapport_preparation.json"
+
+# Au-delà de cette taille, les classeurs sont lus en flux par blocs de lignes. En
+# dessous, pd.read_excel est plus rapide pour un pic mémoire comparable (mesuré sur
+# parcelles.xlsx, 2 Mo : ~60 Mo contre ~50 Mo) ; le flux sert aux classeurs qui ne
+# tiendraient pas en mémoire sous forme d'arbre openpyxl complet.
+SEUIL_LECTURE_PAR_BLOCS = 20 * 1024 * 1024
+TAILLE_BLOC = 20000
+
+# Projection de colonnes par jeu de données (noms en minuscules) : les colonnes
+# "requises" sont toujours lues, les "optionnelles" seulement sur demande
+SCHEMAS_COLONNES = {
+    'parcelles': {
+        'requises': ['commune', 'village', 'nicad', 'superficie', 'type_usag', 'delibere', 'deliberee'],
+        'optionnelles': ['id_parcelle', 'region', 'autorite_delib', 'numero cadastral']
+    }
+}
+
+# Manifeste des fichiers de données : extensions indexées et dossiers jamais parcourus
+EXTENSIONS_MANIFESTE = {'.xlsx', '.xls', '.csv', '.parquet', '.json'}
+DOSSIERS_IGNORES = {'__pycache__', 'node_modules', 'venv', 'env', 'site-packages', DOSSIER_SIDECAR}
+
+def _convertir_cellule(valeur):
+    """Normalise une valeur openpyxl comme le fait pandas (1427.0 -> 1427)"""
+    if isinstance(valeur, float) and valeur.is_integer():
+        return int(valeur)
+    return valeur
+
+def _type_commun(type_1, type_2):
+    """Type commun de deux blocs d'une même colonne, comme pandas pour la colonne entière"""
+    if type_1 == type_2:
+        return type_1
+    numeriques = [t for t in (type_1, type_2)
+                  if pd.api.types.is_numeric_dtype(t) and not pd.api.types.is_bool_dtype(t)]
+    if len(numeriques) == 2:
+        return np.dtype("float64") if any(pd.api.types.is_float_dtype(t) for t in numeriques) else np.dtype("int64")
+    return np.dtype(object)
+
+# Textes lus comme valeurs manquantes et comme booléens par pd.read_excel (valeurs par défaut)
+VALEURS_MANQUANTES_EXCEL = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+                            '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+TEXTES_BOOLEENS_EXCEL = {'True': True, 'TRUE': True, 'true': True, 'False': False, 'FALSE': False, 'false': False}
+
+def _textes_convertibles(textes) -> Tuple[bool, bool]:
+    """Les textes donnés sont-ils tous des nombres ? tous des booléens ?"""
+    if not textes:
+        return True, True
+    numeriques = bool(pd.to_numeric(pd.Series(textes, dtype=object), errors="coerce").notna().all())
+    booleens = all(texte in TEXTES_BOOLEENS_EXCEL for texte in textes)
+    return numeriques, booleens
+
+def lire_excel_par_blocs(file_path, taille_bloc: int = TAILLE_BLOC, usecols=None,
+                         dtype: Optional[Dict[str, Any]] = None, sheet_name=0) -> Iterator[pd.DataFrame]:
+    """Lit une feuille Excel en flux et produit des DataFrames de `taille_bloc` lignes
+
+    Le classeur est ouvert en mode read_only d'openpyxl : seules les lignes du bloc
+    courant sont en mémoire. `usecols` filtre les colonnes (noms en minuscules) et
+    `dtype` force le type de certaines colonnes, comme pour pd.read_excel.
+
+    La concaténation des blocs donne le DataFrame de pd.read_excel :
+    - les lignes vides internes sont gardées, seules les lignes vides finales
+      sont ignorées ;
+    - les textes de VALEURS_MANQUANTES_EXCEL ("nan", "NULL", "N/A"...) sont
+      des valeurs manquantes ;
+    - une colonne dont tous les textes sont des nombres (ou tous des booléens)
+      est convertie. Cette décision porte sur la colonne entière : si un bloc
+      contient de tels textes, une première lecture rapide du classeur vérifie
+      les blocs suivants avant de convertir ;
+    - le type de chaque colonne est établi au premier bloc où elle a des
+      valeurs, puis appliqué aux blocs suivants (élargi en float ou object si
+      un bloc ne s'y conforme pas).
+    """
+    import openpyxl
+
+    def ouvrir():
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+        ws = wb[sheet_name] if isinstance(sheet_name, str) else wb.worksheets[sheet_name]
+        return wb, ws.iter_rows(values_only=True)
+
+    wb, lignes = ouvrir()
+    try:
+        entete = next(lignes, None)
+        if entete is None:
+            return
+
+        # Sélection des colonnes et dédoublonnage des noms (comme pandas : x, x.1...)
+        indices, noms, vus = [], [], {}
+        for i, nom in enumerate(entete):
+            if nom is None:
+                continue
+            nom = str(nom)
+            if usecols is not None and nom.strip().lower() not in usecols:
+                continue
+            if nom in vus:
+                vus[nom] += 1
+                nom = f"{nom}.{vus[nom]}"
+            else:
+                vus[nom] = 0
+            indices.append(i)
+            noms.append(nom)
+
+        # Type établi de chaque colonne (hors dtype déclarés), fixé au premier bloc non vide
+        types = {}
+        # Conversion des textes de chaque colonne sur toute la feuille : 'nombre', 'booleen' ou None
+        conversions = {}
+
+        def examiner_feuille(colonnes):
+            """Première lecture : conversion possible des textes de chaque colonne sur toute la feuille"""
+            positions = {col: indices[noms.index(col)] for col in colonnes}
+            possibles = {col: [True, True] for col in colonnes}
+            textes = {col: [] for col in colonnes}
+
+            def verifier(col):
+                numeriques, booleens = _textes_convertibles(textes[col])
+                possibles[col][0] &= numeriques
+                possibles[col][1] &= booleens
+                textes[col] = []
+
+            wb_examen, lignes_examen = ouvrir()
+            try:
+                next(lignes_examen, None)
+                for ligne in lignes_examen:
+                    for col in [c for c in colonnes if any(possibles[c])]:
+                        position = positions[col]
+                        valeur = ligne[position] if position < len(ligne) else None
+                        if isinstance(valeur, str) and valeur not in VALEURS_MANQUANTES_EXCEL:
+                            textes[col].append(valeur)
+                            if len(textes[col]) >= taille_bloc:
+                                verifier(col)
+                    if not any(any(p) for p in possibles.values()):
+                        break
+            finally:
+                wb_examen.close()
+            for col in colonnes:
+                verifier(col)
+                numeriques, booleens = possibles[col]
+                conversions[col] = 'nombre' if numeriques else ('booleen' if booleens else None)
+
+        def convertir_textes(bloc):
+            """Convertit les colonnes de textes numériques ou booléens, décision prise sur toute la feuille"""
+            a_examiner = []
+            for col in noms:
+                if col in (dtype or {}) or col in conversions:
+                    continue
+                textes = [v for v in bloc[col] if isinstance(v, str)]
+                if not textes:
+                    continue
+                if any(_textes_convertibles(textes)):
+                    a_examiner.append(col)
+                else:
+                    # Un seul texte non convertible suffit : la colonne reste telle quelle
+                    conversions[col] = None
+            if a_examiner:
+                examiner_feuille(a_examiner)
+
+            for col in noms:
+                conversion = conversions.get(col)
+                if conversion == 'nombre':
+                    try:
+                        bloc[col] = pd.to_numeric(bloc[col])
+                    except (ValueError, TypeError):
+                        # Cellules non numériques (dates...) : valeurs brutes, comme pd.read_excel
+                        pass
+                elif conversion == 'booleen':
+                    bloc[col] = bloc[col].map(lambda v: TEXTES_BOOLEENS_EXCEL.get(v, v) if isinstance(v, str) else v)
+
+        def construire_bloc(valeurs):
+            # En object d'abord : les dtype déclarés et les conversions s'appliquent aux cellules brutes
+            bloc = pd.DataFrame(valeurs, columns=noms, dtype=object)
+            bloc = bloc.mask(bloc.isin(VALEURS_MANQUANTES_EXCEL), None)
+            for col, type_col in (dtype or {}).items():
+                if col in bloc.columns:
+                    if type_col is str:
+                        serie = bloc[col].map(lambda v: v if v is None else str(v))
+                        bloc[col] = serie.where(serie.notna(), np.nan)
+                    else:
+                        bloc[col] = bloc[col].astype(type_col)
+            convertir_textes(bloc)
+
+            for col in noms:
+                if col in (dtype or {}):
+                    continue
+                # Inférence colonne par colonne (sur le DataFrame entier, les textes resteraient en object)
+                serie = bloc[col].infer_objects()
+                if serie.isna().all():
+                    # Bloc sans valeur : type établi, en float si des entiers/booléens doivent accueillir NaN
+                    cible = types.get(col, np.dtype("float64"))
+                    if pd.api.types.is_integer_dtype(cible) or pd.api.types.is_bool_dtype(cible):
+                        cible = np.dtype("float64") if pd.api.types.is_integer_dtype(cible) else np.dtype(object)
+                        types[col] = cible
+                else:
+                    cible = _type_commun(types[col], serie.dtype) if col in types else serie.dtype
+                    types[col] = cible
+                if serie.dtype != cible:
+                    serie = serie.astype(cible)
+                if serie.dtype == object and serie.isna().any():
+                    # Cellules vides en NaN, comme pd.read_excel
+                    serie = serie.where(serie.notna(), np.nan)
+                bloc[col] = serie
+            return bloc
+
+        valeurs = []
+        lignes_vides = 0
+        for ligne in lignes:
+            ligne = [_convertir_cellule(ligne[i]) if i < len(ligne) else None for i in indices]
+            if all(v is None for v in ligne):
+                # Gardée seulement si une ligne non vide suit (pas de lignes vides finales)
+                lignes_vides += 1
+                continue
+            for ligne_bloc in [[None] * len(indices)] * lignes_vides + [ligne]:
+                valeurs.append(ligne_bloc)
+                if len(valeurs) >= taille_bloc:
+                    yield construire_bloc(valeurs)
+                    valeurs = []
+            lignes_vides = 0
+
+        if valeurs:
+            yield construire_bloc(valeurs)
+
+    finally:
+        wb.close()
+
+def concatener_blocs(blocs: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatène des blocs traités en conservant les colonnes catégorielles"""
+    if not blocs:
+        return pd.DataFrame()
+
+    colonnes_cat = [
+        col for col in blocs[0].columns
+        if isinstance(blocs[0][col].dtype, pd.CategoricalDtype)
+    ]
+    for col in colonnes_cat:
+        categories = []
+        for bloc in blocs:
+            categories.extend(c for c in bloc[col].cat.categories if c not in categories)
+        # Les catégories à ordre fixe (NICAD, délibération) gardent leur ordre
+        if not all(list(b[col].cat.categories) == categories for b in blocs):
+            categories = sorted(categories, key=str)
+        for bloc in blocs:
+            bloc[col] = bloc[col].cat.set_categories(categories)
+
+    return pd.concat(blocs, ignore_index=True)
+
+def decouper_en_blocs(df: pd.DataFrame, taille_bloc: int = TAILLE_BLOC) -> Iterator[pd.DataFrame]:
+    """Tranches successives de `taille_bloc` lignes d'un DataFrame (au moins une, éventuellement vide)"""
+    for debut in range(0, max(len(df), 1), taille_bloc):
+        yield df.iloc[debut:debut + taille_bloc]
+
+def agreger_par_blocs(blocs, cles: List[str], valeur: Optional[str] = None) -> pd.DataFrame:
+    """Agrégat incrémental (nombre, et somme/min/max de `valeur`) sur un flux de blocs
+
+    Chaque bloc est réduit à ses agrégats partiels, qui sont ensuite combinés :
+    le flux n'est jamais matérialisé en un seul DataFrame.
+    """
+    partiels = []
+    for bloc in blocs:
+        groupes = bloc.groupby(cles, observed=True, dropna=False)
+        partiel = groupes.size().rename('nombre').to_frame()
+        if valeur is not None:
+            partiel = partiel.join(groupes[valeur].agg(['sum', 'min', 'max']).astype("float64"))
+        partiels.append(partiel)
+
+    if not partiels:
+        return pd.DataFrame(columns=cles + ['nombre'])
+
+    combine = pd.concat(partiels)
+    regles = {'nombre': 'sum'}
+    if valeur is not None:
+        regles.update({'sum': 'sum', 'min': 'min', 'max': 'max'})
+    return combine.groupby(level=cles, observed=True, dropna=False).agg(regles).reset_index()
+
+# Version (hash du contenu) de chaque DataFrame déjà vu, indexée par id()
+_versions = {}
+
+def _signature_structure(df: pd.DataFrame) -> tuple:
+    """Colonnes, types et nombre de lignes : détecte à peu de frais un DataFrame modifié depuis son hash"""
+    return (tuple(map(str, df.columns)), tuple(map(str, df.dtypes)), len(df))
+
+def version_dataset(donnees) -> str:
+    """
+    Retourne la version d'un jeu de données : un hash de son contenu
+
+    Accepte un DataFrame ou un dict / une liste de DataFrames (ex: les fichiers
+    genre). Le hash n'est calculé qu'une fois par objet DataFrame : les jeux
+    servis par cache_donnees étant les mêmes objets d'un rerun à l'autre, les
+    appels suivants sont gratuits. Un DataFrame dont les colonnes, les types ou
+    le nombre de lignes ont changé depuis est haché à nouveau.
+    """
+    if isinstance(donnees, dict):
+        parties = [f"{cle}={version_dataset(valeur)}" for cle, valeur in sorted(donnees.items(), key=lambda item: str(item[0]))]
+        return hashlib.sha256("|".join(parties).encode("utf-8")).hexdigest()[:16]
+    if isinstance(donnees, (list, tuple)):
+        parties = [version_dataset(valeur) for valeur in donnees]
+        return hashlib.sha256("|".join(parties).encode("utf-8")).hexdigest()[:16]
+    if not isinstance(donnees, pd.DataFrame):
+        return hashlib.sha256(repr(donnees).encode("utf-8")).hexdigest()[:16]
+
+    cle = id(donnees)
+    entree = _versions.get(cle)
+    if entree is not None and entree[0]() is donnees and entree[2] == _signature_structure(donnees):
+        return entree[1]
+
+    empreinte = hashlib.sha256()
+    empreinte.update(",".join(map(str, donnees.columns)).encode("utf-8"))
+    try:
+        valeurs = pd.util.hash_pandas_object(donnees, index=False)
+    except TypeError:
+        # Cellules non hachables (listes, dicts...) : hash de leur représentation texte
+        valeurs = pd.util.hash_pandas_object(donnees.astype(str), index=False)
+    empreinte.update(valeurs.to_numpy().tobytes())
+    version = empreinte.hexdigest()[:16]
+
+    _memoriser_version(donnees, version)
+    return version
+
+def _memoriser_version(df: pd.DataFrame, version: str) -> None:
+    cle = id(df)
+    _versions[cle] = (weakref.ref(df, lambda _ref, cle=cle: _versions.pop(cle, None)), version,
+                      _signature_structure(df))
+
+def copie_pour_appelant(valeur):
+    """
+    Copie superficielle d'un jeu de données partagé, remise à chaque appelant
+
+    Avec le copy-on-write de pandas, la copie ne coûte rien tant qu'elle n'est
+    pas modifiée, et toute modification (colonne ajoutée, renommée, valeurs
+    converties) reste propre à l'appelant : les autres sessions continuent de
+    voir le jeu de données d'origine. La version (hash) de l'original est
+    reportée sur la copie, qui n'est donc pas hachée à nouveau.
+    Accepte un DataFrame ou un tuple / une liste / un dict de DataFrames.
+    """
+    if isinstance(valeur, pd.DataFrame):
+        copie = valeur.copy(deep=False)
+        _memoriser_version(copie, version_dataset(valeur))
+        return copie
+    if isinstance(valeur, (tuple, list)):
+        return type(valeur)(copie_pour_appelant(element) for element in valeur)
+    if isinstance(valeur, dict):
+        return {cle: copie_pour_appelant(element) for cle, element in valeur.items()}
+    return valeur
+
+class CacheVersionne:
+    """Cache des jeux de données, versionné par l'empreinte de leurs fichiers sources
+
+    Chaque entrée garde l'empreinte (taille + mtime, et hash en option) des
+    fichiers dont elle provient. Quand un fichier change, l'ancienne valeur
+    continue d'être servie pendant que le jeu de données concerné est rechargé
+    en arrière-plan, puis remplacé d'un seul coup (stale-while-revalidate).
+    Les autres entrées ne sont jamais évincées. Chaque appelant reçoit sa
+    propre copie superficielle (copie_pour_appelant) de la valeur partagée.
+    """
+
+    def __init__(self, avec_hash: bool = False):
+        self.avec_hash = avec_hash
+        self.entrees = {}
+        self.en_cours = set()
+        self.verrous = {}
+        self.lock = threading.Lock()
+        # Incrémentée à chaque entrée ajoutée ou rechargée (invalide le registre)
+        self.generation = 0
+
+    def empreinte(self, fichiers) -> tuple:
+        """Empreinte combinée d'une liste de fichiers (None pour un fichier absent)"""
+        resultat = []
+        for fichier in fichiers:
+            try:
+                resultat.append(tuple(DataLoader.empreinte_fichier(fichier, self.avec_hash).values()))
+            except OSError:
+                resultat.append(None)
+        return tuple(resultat)
+
+    def _verrou(self, cle) -> threading.Lock:
+        with self.lock:
+            return self.verrous.setdefault(cle, threading.Lock())
+
+    def obtenir(self, cle, fichiers, loader):
+        """Retourne (une copie de) la valeur en cache, en la chargeant au premier appel"""
+        entree = self.entrees.get(cle)
+        if entree is None:
+            with self._verrou(cle):
+                entree = self.entrees.get(cle)
+                if entree is None:
+                    empreinte = self.empreinte(fichiers)
+                    valeur = loader()
+                    entree = {'empreinte': empreinte, 'valeur': valeur,
+                              'fichiers': list(fichiers), 'loader': loader}
+                    self.entrees[cle] = entree
+                    self.generation += 1
+                    return copie_pour_appelant(valeur)
+
+        if self.empreinte(entree['fichiers']) != entree['empreinte']:
+            self.revalider(cle)
+        return copie_pour_appelant(entree['valeur'])
+
+    def contient(self, cle) -> bool:
+        return cle in self.entrees
+
+    def revalider(self, cle) -> None:
+        """Relance en arrière-plan le chargement d'une entrée (une seule fois à la fois)"""
+        with self.lock:
+            if cle in self.en_cours or cle not in self.entrees:
+                return
+            self.en_cours.add(cle)
+        threading.Thread(target=self._recharger, args=(cle,), name=f"revalidation-{cle}", daemon=True).start()
+
+    def _recharger(self, cle) -> None:
+        entree = self.entrees[cle]
+        try:
+            empreinte = self.empreinte(entree['fichiers'])
+            valeur = entree['loader']()
+            # Remplacement atomique : les lecteurs voient l'ancienne ou la nouvelle entrée
+            self.entrees[cle] = {**entree, 'empreinte': empreinte, 'valeur': valeur}
+            self.generation += 1
+            logger.info(f"Jeu de données {cle} rechargé après modification de ses fichiers")
+        except Exception as e:
+            logger.error(f"Échec du rechargement de {cle}, ancienne version conservée: {e}")
+        finally:
+            with self.lock:
+                self.en_cours.discard(cle)
+
+    def verifier(self) -> None:
+        """Compare les empreintes de toutes les entrées et revalide celles qui ont changé"""
+        for cle, entree in list(self.entrees.items()):
+            if self.empreinte(entree['fichiers']) != entree['empreinte']:
+                self.revalider(cle)
+
+class SurveillanceFichiers:
+    """Thread léger qui interroge périodiquement les empreintes du cache"""
+
+    def __init__(self, cache: CacheVersionne, intervalle: float = 10.0):
+        self.cache = cache
+        self.intervalle = intervalle
+        self.arret = threading.Event()
+        self.thread = None
+
+    def demarrer(self) -> "SurveillanceFichiers":
+        self.thread = threading.Thread(target=self._boucle, name="surveillance-fichiers", daemon=True)
+        self.thread.start()
+        return self
+
+    def arreter(self) -> None:
+        self.arret.set()
+
+    def _boucle(self):
+        while not self.arret.wait(self.intervalle):
+            try:
+                self.cache.verifier()
+            except Exception as e:
+                logger.error(f"Surveillance des fichiers: {e}")
+
+# Plafond mémoire du magasin de jeux de données partagé (en Mo)
+MEMOIRE_MAX_MAGASIN_MO = int(os.environ.get("PROCASEF_MEMOIRE_MAX_MO", "512"))
+# Plafond disque des jeux déversés en Parquet (en Mo)
+DISQUE_MAX_MAGASIN_MO = int(os.environ.get("PROCASEF_DISQUE_MAX_MO", "2048"))
+
+class DatasetStore:
+    """Magasin process-wide de DataFrames partagés en lecture seule entre les sessions
+
+    Les jeux de données sont indexés par le hash de leur contenu : deux sessions
+    qui déposent le même fichier partagent la même instance, et chaque session
+    ne garde dans st.session_state qu'une poignée (le hash). Au-delà du plafond
+    mémoire, les jeux les moins récemment utilisés sont évincés (LRU) et
+    déversés sur disque en Parquet, d'où ils sont relus à la demande.
+
+    Le processus serveur vide le dossier de déversement au démarrage (purger_dossier :
+    ses fichiers ne sont plus indexés), un fichier relu est supprimé et, au-delà de
+    disque_max, les plus anciens fichiers déversés sont supprimés. Les sessions retiennent
+    leur poignée (retenir / relacher) : un jeu que plus aucune session ne
+    retient est retiré de la mémoire et du disque.
+
+    Les DataFrames retournés sont partagés : ne jamais les modifier sur place.
+    """
+
+    def __init__(self, memoire_max: int, dossier_deversement: Path,
+                 disque_max: int = DISQUE_MAX_MAGASIN_MO * 1024 * 1024):
+        self.memoire_max = memoire_max
+        self.disque_max = disque_max
+        self.dossier_deversement = dossier_deversement
+        self.frames = OrderedDict()
+        self.tailles = {}
+        self.deverses = OrderedDict()
+        self.tailles_deverses = {}
+        self.utilisateurs = {}
+        self.lock = threading.RLock()
+
+    def purger_dossier(self) -> None:
+        """Supprime les fichiers déversés par un processus serveur précédent
+
+        À appeler une seule fois, au démarrage du serveur Streamlit : jamais à
+        l'import, que font aussi les processus du pool de préchauffage et
+        prepare_data pendant que le serveur tourne. Les fichiers indexés par ce
+        magasin sont gardés.
+        """
+        if not self.dossier_deversement.is_dir():
+            return
+        with self.lock:
+            indexes = set(self.deverses.values())
+            for chemin in self.dossier_deversement.glob("*.parquet"):
+                if chemin not in indexes:
+                    chemin.unlink(missing_ok=True)
+
+    @staticmethod
+    def hash_contenu(contenu: bytes) -> str:
+        return hashlib.sha256(contenu).hexdigest()
+
+    def memoire_utilisee(self) -> int:
+        return sum(self.tailles.values())
+
+    def disque_utilise(self) -> int:
+        return sum(self.tailles_deverses.values())
+
+    def contient(self, poignee: str) -> bool:
+        with self.lock:
+            return poignee in self.frames or poignee in self.deverses
+
+    def deposer(self, poignee: str, df: pd.DataFrame) -> str:
+        """Ajoute un jeu de données au magasin et retourne sa poignée"""
+        with self.lock:
+            if poignee not in self.frames:
+                self.frames[poignee] = df
+                self.tailles[poignee] = int(df.memory_usage(deep=True).sum())
+            self.frames.move_to_end(poignee)
+            self._evincer()
+        return poignee
+
+    def obtenir(self, poignee: Optional[str]) -> Optional[pd.DataFrame]:
+        """Retourne le jeu de données d'une poignée (relu du disque s'il a été déversé)"""
+        if poignee is None:
+            return None
+
+        with self.lock:
+            if poignee in self.frames:
+                self.frames.move_to_end(poignee)
+                return self.frames[poignee]
+
+            chemin = self.deverses.get(poignee)
+            if chemin is None:
+                return None
+            try:
+                df = pd.read_parquet(chemin)
+            except Exception as e:
+                logger.error(f"Relecture impossible du jeu déversé {poignee[:12]}: {e}")
+                self._supprimer_deverse(poignee)
+                return None
+            # De retour en mémoire : le fichier n'est plus utile (re-déversé si besoin)
+            self._supprimer_deverse(poignee)
+            self.deposer(poignee, df)
+            return df
+
+    def retenir(self, poignee: str) -> None:
+        """Note qu'une session de plus utilise ce jeu de données"""
+        with self.lock:
+            self.utilisateurs[poignee] = self.utilisateurs.get(poignee, 0) + 1
+
+    def relacher(self, poignee: Optional[str]) -> None:
+        """Note qu'une session n'utilise plus ce jeu ; sans utilisateur, il est supprimé"""
+        if poignee is None:
+            return
+        with self.lock:
+            restants = self.utilisateurs.get(poignee, 0) - 1
+            if restants > 0:
+                self.utilisateurs[poignee] = restants
+                return
+            self.utilisateurs.pop(poignee, None)
+            self.frames.pop(poignee, None)
+            self.tailles.pop(poignee, None)
+            self._supprimer_deverse(poignee)
+
+    def _supprimer_deverse(self, poignee: str) -> None:
+        chemin = self.deverses.pop(poignee, None)
+        self.tailles_deverses.pop(poignee, None)
+        if chemin is not None:
+            try:
+                chemin.unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning(f"Suppression impossible de {chemin}: {e}")
+
+    def _evincer(self) -> None:
+        """Évince les jeux les moins récemment utilisés au-delà du plafond mémoire"""
+        while self.memoire_utilisee() > self.memoire_max and len(self.frames) > 1:
+            poignee, df = self.frames.popitem(last=False)
+            taille = self.tailles.pop(poignee)
+            if poignee not in self.deverses and self._deverser(poignee, df):
+                logger.info(f"Magasin: {poignee[:12]} déversé sur disque ({taille / 1e6:.1f} Mo)")
+            elif poignee not in self.deverses:
+                logger.info(f"Magasin: {poignee[:12]} évincé ({taille / 1e6:.1f} Mo)")
+
+    def _deverser(self, poignee: str, df: pd.DataFrame) -> bool:
+        if not PARQUET_DISPONIBLE:
+            return False
+        try:
+            self.dossier_deversement.mkdir(parents=True, exist_ok=True)
+            chemin = self.dossier_deversement / f"{poignee}.parquet"
+            df.to_parquet(chemin, index=False)
+            self.deverses[poignee] = chemin
+            self.tailles_deverses[poignee] = chemin.stat().st_size
+        except Exception as e:
+            logger.warning(f"Déversement impossible de {poignee[:12]}: {e}")
+            return False
+
+        # Plafond disque : suppression des plus anciens fichiers déversés
+        while self.disque_utilise() > self.disque_max and self.deverses:
+            ancienne = next(iter(self.deverses))
+            logger.info(f"Magasin: {ancienne[:12]} supprimé du disque (plafond atteint)")
+            self._supprimer_deverse(ancienne)
+        return poignee in self.deverses
+
+class DataManifest:
+    """Index nom de fichier -> chemins des fichiers de données du projet
+
+    L'index est construit une seule fois par un parcours unique des dossiers du
+    projet. Les recherches suivantes ne touchent plus le disque, sauf pour une
+    vérification peu coûteuse des mtime des dossiers indexés, limitée à une
+    fois toutes les `intervalle_verification` secondes.
+    """
+
+    def __init__(self, racines: List[Path], intervalle_verification: float = 5.0,
+                 profondeur_max: int = 6):
+        self.racines = racines
+        self.intervalle_verification = intervalle_verification
+        self.profondeur_max = profondeur_max
+        self.index = {}
+        self.mtimes_dossiers = {}
+        self.derniere_verification = 0.0
+        self.construit = False
+        # Incrémentée à chaque reconstruction de l'index
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def construire(self) -> None:
+        """Parcourt les racines du projet et reconstruit l'index"""
+        index = {}
+        mtimes_dossiers = {}
+        racines_vues = set()
+
+        for racine in self.racines:
+            racine = racine.resolve()
+            if racine in racines_vues or not racine.is_dir():
+                continue
+            racines_vues.add(racine)
+
+            for dossier, sous_dossiers, fichiers in os.walk(racine):
+                dossier_path = Path(dossier)
+                if str(dossier_path) in mtimes_dossiers:
+                    sous_dossiers[:] = []
+                    continue
+                try:
+                    mtimes_dossiers[str(dossier_path)] = os.stat(dossier).st_mtime_ns
+                except OSError:
+                    continue
+
+                # Élagage : dossiers cachés (.git, .venv...), environnements, caches
+                profondeur = len(dossier_path.relative_to(racine).parts)
+                sous_dossiers[:] = [
+                    d for d in sous_dossiers
+                    if not d.startswith('.') and d not in DOSSIERS_IGNORES
+                    and profondeur < self.profondeur_max
+                ]
+
+                for nom in fichiers:
+                    if Path(nom).suffix.lower() not in EXTENSIONS_MANIFESTE:
+                        continue
+                    chemin = dossier_path / nom
+                    try:
+                        mtime = os.stat(chemin).st_mtime_ns
+                    except OSError:
+                        continue
+                    index.setdefault(nom, []).append({'chemin': chemin, 'mtime_ns': mtime})
+
+        # Priorité : fichiers d'un dossier data/, puis les moins profonds
+        for entrees in index.values():
+            entrees.sort(key=lambda e: (e['chemin'].parent.name != 'data', len(e['chemin'].parts)))
+
+        self.index = index
+        self.mtimes_dossiers = mtimes_dossiers
+        self.derniere_verification = time.monotonic()
+        self.construit = True
+        self.generation += 1
+        logger.info(f"Manifeste construit: {sum(len(e) for e in index.values())} fichiers, "
+                    f"{len(mtimes_dossiers)} dossiers")
+
+    def est_perime(self) -> bool:
+        """Vérifie (au plus une fois par intervalle) si un dossier indexé a changé"""
+        if time.monotonic() - self.derniere_verification < self.intervalle_verification:
+            return False
+        self.derniere_verification = time.monotonic()
+
+        for dossier, mtime in self.mtimes_dossiers.items():
+            try:
+                if os.stat(dossier).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def rafraichir(self, force: bool = False) -> None:
+        """Reconstruit l'index s'il n'existe pas, s'il est périmé ou sur demande"""
+        with self.lock:
+            if force or not self.construit or self.est_perime():
+                self.construire()
+
+    def chercher(self, filename: str) -> Optional[Path]:
+        """Retourne le meilleur chemin pour un nom de fichier (ou un chemin relatif)"""
+        parties = Path(filename).parts
+        for entree in self.index.get(parties[-1], []):
+            chemin = entree['chemin']
+            if tuple(chemin.parts[-len(parties):]) == parties:
+                return chemin
+        return None
+
+    def plus_recent(self, filename: str) -> Optional[Path]:
+        """Retourne le plus récent des fichiers indexés sous ce nom (ex: le dernier rapport écrit)"""
+        entrees = [e for e in self.index.get(filename, []) if e['chemin'].is_file()]
+        if not entrees:
+            return None
+        return max(entrees, key=lambda e: e['chemin'].stat().st_mtime_ns)['chemin']
+
 class DataLoader:
     """Classe pour gérer le chargement des données avec une approche orientée objet"""
     
@@ -21,7 +768,12 @@ class DataLoader:
             'etapes': 'Etat des opérations Boundou-Mai 2025.xlsx',
             'post_traitement': 'Parcelles post traites par geom.xlsx'
         }
-        self.cache = {}
+        self.manifest = DataManifest([Path("."), Path(__file__).resolve().parent])
+        self.sidecar_actif = PARQUET_DISPONIBLE
+        self.cache_donnees = CacheVersionne()
+        # Mesures des derniers chargements (diagnostic)
+        self.mesures = deque(maxlen=200)
+        self.dernieres_mesures = {}
     
     def get_data_path(self) -> Path:
         """Détermine le chemin des données selon l'environnement"""
@@ -45,48 +797,228 @@ class DataLoader:
         return possible_paths[0]
     
     def find_file_in_project(self, filename: str) -> Optional[str]:
-        """Trouve un fichier dans tout le projet avec mise en cache"""
-        if filename in self.cache:
-            return self.cache[filename]
-        
-        # Recherche dans les emplacements prioritaires
-        data_dir = self.get_data_path()
-        priority_locations = [
-            data_dir / filename,
-            Path(".") / filename,
-            Path("./data") / filename
-        ]
-        
-        for path in priority_locations:
-            if path.exists() and path.is_file():
-                self.cache[filename] = str(path)
-                return str(path)
-        
-        # Recherche récursive si pas trouvé
-        for root_dir in [Path("."), Path(__file__).parent]:
-            for path in root_dir.rglob(filename):
-                if path.is_file():
-                    self.cache[filename] = str(path)
-                    return str(path)
-        
-        return None
+        """Trouve un fichier du projet via le manifeste des fichiers de données"""
+        self.manifest.rafraichir()
+        path = self.manifest.chercher(filename)
+
+        # Fichier supprimé depuis la dernière vérification : on reconstruit l'index
+        if path is not None and not path.is_file():
+            self.manifest.rafraichir(force=True)
+            path = self.manifest.chercher(filename)
+
+        return str(path) if path else None
+
+    def find_data_file(self, filename: str) -> Optional[str]:
+        """Trouve un classeur du projet, ou son export Parquet (même nom) s'il est plus récent
+
+        prepare_data écrit parcelles.parquet : déposé dans le projet à côté de
+        (ou à la place de) parcelles.xlsx, il est lu directement.
+        """
+        file_path = self.find_file_in_project(filename)
+        if not PARQUET_DISPONIBLE or Path(filename).suffix.lower() == '.parquet':
+            return file_path
+
+        parquet_path = self.find_file_in_project(str(Path(filename).with_suffix('.parquet')))
+        if parquet_path and (file_path is None or os.path.getmtime(parquet_path) >= os.path.getmtime(file_path)):
+            return parquet_path
+        return file_path
     
-    def load_excel_file(self, filename: str, process_func=None) -> pd.DataFrame:
+    @staticmethod
+    def empreinte_fichier(file_path: str, avec_hash: bool = True) -> Dict[str, Any]:
+        """Calcule l'empreinte d'un fichier (taille, mtime et hash du contenu)"""
+        stat = os.stat(file_path)
+        empreinte = {'taille': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        if avec_hash:
+            sha = hashlib.sha256()
+            with open(file_path, "rb") as f:
+                for bloc in iter(lambda: f.read(1024 * 1024), b""):
+                    sha.update(bloc)
+            empreinte['sha256'] = sha.hexdigest()
+        return empreinte
+
+    @staticmethod
+    def signature_colonnes(usecols=None) -> str:
+        """Identifiant court d'une projection de colonnes (pour nommer les sidecars)"""
+        if not usecols:
+            return "complet"
+        return hashlib.md5("|".join(sorted(usecols)).encode("utf-8")).hexdigest()[:8]
+
+    def chemins_sidecar(self, file_path: str, process_func=None, usecols=None):
+        """Retourne les chemins (parquet, métadonnées) du sidecar d'un classeur"""
+        source = Path(file_path)
+        traitement = getattr(process_func, "__name__", "brut")
+        dossier = source.parent / DOSSIER_SIDECAR
+        base = f"{source.stem}.{traitement}.{self.signature_colonnes(usecols)}"
+        return dossier / f"{base}.parquet", dossier / f"{base}.json"
+
+    def lire_sidecar(self, file_path: str, process_func=None, usecols=None) -> Optional[pd.DataFrame]:
+        """Lit le sidecar Parquet s'il correspond toujours au fichier source"""
+        if not self.sidecar_actif:
+            return None
+
+        parquet_path, meta_path = self.chemins_sidecar(file_path, process_func, usecols)
+        if not parquet_path.exists() or not meta_path.exists():
+            return None
+
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if meta.get('version') != VERSION_SIDECAR:
+                return None
+
+            empreinte = self.empreinte_fichier(file_path, avec_hash=False)
+            if empreinte['taille'] != meta.get('taille'):
+                return None
+
+            if empreinte['mtime_ns'] != meta.get('mtime_ns'):
+                # mtime modifié (copie, checkout git...) : on vérifie le contenu
+                empreinte = self.empreinte_fichier(file_path)
+                if empreinte['sha256'] != meta.get('sha256'):
+                    return None
+                meta['mtime_ns'] = empreinte['mtime_ns']
+                meta_path.write_text(json.dumps(meta), encoding="utf-8")
+
+            return pd.read_parquet(parquet_path)
+
+        except Exception as e:
+            logger.warning(f"Sidecar ignoré pour {file_path}: {e}")
+            return None
+
+    def ecrire_sidecar(self, file_path: str, df: pd.DataFrame, process_func=None, usecols=None) -> bool:
+        """Écrit le sidecar Parquet d'un classeur déjà traité"""
+        if not self.sidecar_actif:
+            return False
+
+        parquet_path, meta_path = self.chemins_sidecar(file_path, process_func, usecols)
+        try:
+            parquet_path.parent.mkdir(parents=True, exist_ok=True)
+            meta = self.empreinte_fichier(file_path)
+            meta['version'] = VERSION_SIDECAR
+            meta['traitement'] = getattr(process_func, "__name__", "brut")
+            meta['colonnes'] = sorted(usecols) if usecols else None
+
+            # Écriture atomique pour ne jamais exposer un fichier partiel
+            tmp_path = parquet_path.with_suffix(f".{os.getpid()}.tmp")
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, parquet_path)
+            meta_path.write_text(json.dumps(meta), encoding="utf-8")
+            return True
+
+        except Exception as e:
+            logger.warning(f"Impossible d'écrire le sidecar de {file_path}: {e}")
+            return False
+
+    @staticmethod
+    def colonnes_parquet(file_path: str, usecols=None) -> Optional[List[str]]:
+        """Colonnes d'un fichier Parquet correspondant à usecols (noms comparés en minuscules)"""
+        if not usecols:
+            return None
+        import pyarrow.parquet as pq
+        noms = set(usecols)
+        return [c for c in pq.read_schema(file_path).names if c.strip().lower() in noms]
+
+    def enregistrer_mesure(self, mesure: Dict[str, Any]) -> None:
+        """Conserve une mesure de chargement et l'émet comme ligne de log structurée"""
+        self.mesures.append(mesure)
+        logger.info(json.dumps({'evenement': 'chargement', **mesure}, ensure_ascii=False, default=str))
+
+    def parse_excel(self, file_path: str, process_func=None, usecols=None,
+                    mesure: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+        """Parse un classeur (son sidecar Parquet, ou un export Parquet) et applique le traitement
+
+        `usecols` limite la lecture aux colonnes listées (noms comparés en
+        minuscules, sans espaces autour) ; None lit toutes les colonnes.
+        Chaque appel enregistre une mesure (temps de parsing, de traitement,
+        taille du résultat), complétée par les champs de `mesure` s'il est fourni.
+        """
+        mesure = {'fichier': str(file_path), 'cache': 'miss', **(mesure or {})}
+        duree_traitement = 0.0
+        debut = time.perf_counter()
+
+        est_parquet = Path(file_path).suffix.lower() == '.parquet'
+        df = None if est_parquet else self.lire_sidecar(file_path, process_func, usecols)
+        if est_parquet:
+            # Export Parquet de prepare_data : lecture directe des seules colonnes utiles
+            mesure['source'] = 'parquet'
+            df = pd.read_parquet(file_path, columns=self.colonnes_parquet(file_path, usecols))
+            if process_func:
+                debut_traitement = time.perf_counter()
+                df = process_func(df)
+                duree_traitement = time.perf_counter() - debut_traitement
+
+        elif df is not None:
+            logger.info(f"Sidecar Parquet utilisé pour {file_path}")
+            mesure['source'] = 'sidecar'
+
+        elif os.path.getsize(file_path) >= SEUIL_LECTURE_PAR_BLOCS:
+            # Gros classeur : lecture en flux, traitement bloc par bloc
+            mesure['source'] = 'excel (flux)'
+            colonnes = set(usecols) if usecols else None
+            blocs = []
+            for bloc in lire_excel_par_blocs(file_path, usecols=colonnes):
+                if process_func:
+                    debut_traitement = time.perf_counter()
+                    bloc = process_func(bloc)
+                    duree_traitement += time.perf_counter() - debut_traitement
+                blocs.append(bloc)
+            df = concatener_blocs(blocs)
+
+        else:
+            mesure['source'] = 'excel'
+            if usecols:
+                colonnes = set(usecols)
+                df = pd.read_excel(file_path, engine="openpyxl",
+                                   usecols=lambda c: str(c).strip().lower() in colonnes)
+            else:
+                df = pd.read_excel(file_path, engine="openpyxl")
+
+            if process_func:
+                debut_traitement = time.perf_counter()
+                df = process_func(df)
+                duree_traitement = time.perf_counter() - debut_traitement
+
+        mesure['duree_parse_s'] = round(time.perf_counter() - debut - duree_traitement, 4)
+        mesure['duree_traitement_s'] = round(duree_traitement, 4)
+
+        if mesure['source'] not in ('sidecar', 'parquet'):
+            self.ecrire_sidecar(file_path, df, process_func, usecols)
+
+        mesure['lignes'], mesure['colonnes'] = df.shape
+        mesure['memoire_mo'] = round(df.memory_usage(deep=True).sum() / 1e6, 2)
+        self.enregistrer_mesure(mesure)
+        self.dernieres_mesures[str(file_path)] = mesure
+        return df
+
+    def load_excel_file(self, filename: str, process_func=None, usecols=None) -> pd.DataFrame:
         """Charge un fichier Excel avec traitement optionnel"""
-        file_path = self.find_file_in_project(filename)
+        debut = time.perf_counter()
+        file_path = self.find_data_file(filename)
+        duree_resolution = round(time.perf_counter() - debut, 4)
         
         if not file_path:
             logger.error(f"Fichier {filename} introuvable")
             return pd.DataFrame()
         
         try:
-            df = pd.read_excel(file_path, engine="openpyxl")
-            
-            if process_func:
-                df = process_func(df)
+            cle = (file_path, getattr(process_func, "__name__", "brut"), self.signature_colonnes(usecols))
+            deja_charge = self.cache_donnees.contient(cle)
+            df = self.cache_donnees.obtenir(
+                cle, [file_path],
+                lambda: self.parse_excel(file_path, process_func, usecols,
+                                         mesure={'duree_resolution_s': duree_resolution})
+            )
             
-            logger.info(f"Fichier {filename} chargé avec succès depuis {file_path}")
-            st.success(f"✅ {filename} chargé depuis: {file_path}")
+            if deja_charge:
+                # Cache mémoire : seule la résolution du chemin a coûté quelque chose
+                derniere = self.dernieres_mesures.get(file_path, {})
+                self.enregistrer_mesure({
+                    'fichier': file_path, 'cache': 'hit', 'source': 'memoire',
+                    'duree_resolution_s': duree_resolution, 'duree_parse_s': 0.0,
+                    'duree_traitement_s': 0.0, 'lignes': df.shape[0], 'colonnes': df.shape[1],
+                    'memoire_mo': derniere.get('memoire_mo')
+                })
+            else:
+                logger.info(f"Fichier {filename} chargé avec succès depuis {file_path}")
+                st.success(f"✅ {filename} chargé depuis: {file_path}")
             return df
             
         except Exception as e:
@@ -97,25 +1029,135 @@ class DataLoader:
 # Instance globale du data loader
 data_loader = DataLoader()
 
+class DataRegistry:
+    """Registre paresseux des jeux de données utilisés par les pages du tableau de bord
+
+    Chaque jeu de données est déclaré avec sa fonction de chargement, mais n'est
+    chargé qu'au moment où une page le demande pour la première fois. La valeur
+    matérialisée est ensuite gardée : les appels suivants n'exécutent plus le
+    loader tant que ni le cache des jeux de données (fichier modifié puis
+    rechargé) ni le manifeste (fichier ajouté ou supprimé) n'ont changé.
+    Un chargement vide ou en échec n'est pas gardé, il sera retenté.
+    """
+
+    def __init__(self, cache: CacheVersionne, manifest: DataManifest):
+        self.cache = cache
+        self.manifest = manifest
+        self.loaders = {}
+        self.valeurs = {}
+
+    def declarer(self, nom: str, loader) -> None:
+        """Déclare un jeu de données et la fonction qui le charge"""
+        self.loaders[nom] = loader
+        self.valeurs.pop(nom, None)
+
+    def generations(self) -> tuple:
+        self.manifest.rafraichir()
+        return (self.cache.generation, self.manifest.generation)
+
+    @staticmethod
+    def chargement_abouti(donnees) -> bool:
+        if donnees is None:
+            return False
+        if isinstance(donnees, pd.DataFrame):
+            return not donnees.empty
+        if isinstance(donnees, (tuple, list)):
+            return all(DataRegistry.chargement_abouti(element) for element in donnees)
+        return True
+
+    def obtenir(self, nom: str):
+        """Retourne (une copie de) un jeu de données, chargé à la première demande puis gardé"""
+        if nom not in self.loaders:
+            raise KeyError(f"Jeu de données non déclaré: {nom}")
+
+        entree = self.valeurs.get(nom)
+        if entree is not None and entree[0] == self.generations():
+            return copie_pour_appelant(entree[1])
+
+        donnees = self.loaders[nom]()
+        if self.chargement_abouti(donnees):
+            if entree is None:
+                logger.info(f"Jeu de données '{nom}' matérialisé")
+            self.valeurs[nom] = (self.generations(), donnees)
+            # La valeur gardée n'est jamais remise telle quelle à un appelant
+            return copie_pour_appelant(donnees)
+        self.valeurs.pop(nom, None)
+        return donnees
+
+    def charger_page(self, noms) -> Dict[str, Any]:
+        """Charge uniquement les jeux de données déclarés par une page"""
+        return {nom: self.obtenir(nom) for nom in noms}
+
+# Magasin partagé entre sessions (fichiers téléchargés par les utilisateurs) ; son
+# dossier de déversement est purgé par le serveur seulement (dashboard.demarrer_magasin)
+magasin_donnees = DatasetStore(
+    MEMOIRE_MAX_MAGASIN_MO * 1024 * 1024,
+    data_loader.get_data_path() / DOSSIER_SIDECAR / "magasin"
+)
+
+# Registre global, alimenté par les charger_* ci-dessous et par les pages
+registre_donnees = DataRegistry(data_loader.cache_donnees, data_loader.manifest)
+
+def lancer_surveillance(intervalle: float = 10.0) -> SurveillanceFichiers:
+    """Démarre la surveillance des fichiers sources du cache de données"""
+    return SurveillanceFichiers(data_loader.cache_donnees, intervalle).demarrer()
+
+# Ordre fixe des catégories des statuts de parcelles
+CATEGORIES_NICAD = ["Avec NICAD", "Sans NICAD"]
+CATEGORIES_DELIBERATION = ["Délibérée", "Non délibérée"]
+
+# Colonnes texte à faible cardinalité stockées en catégories (ordre alphabétique)
+COLONNES_CATEGORIELLES = ['region', 'commune', 'village', 'type_usag', 'type_usa', 'autorite_delib', 'delibere']
+
+def _libelles_depuis_masque(masque: pd.Series, categories) -> pd.Categorical:
+    """Construit une colonne catégorielle (oui/non) à partir d'un masque booléen"""
+    codes = np.where(masque.to_numpy(), 0, 1).astype("int8")
+    return pd.Categorical.from_codes(codes, categories=categories)
+
 def process_parcelles_data(df: pd.DataFrame) -> pd.DataFrame:
-    """Traite les données des parcelles"""
+    """Traite les données des parcelles et produit un schéma compact
+
+    - nicad / statut_deliberation : catégories à ordre fixe, avec les masques
+      booléens a_nicad / deliberee pour les comptages
+    - colonnes texte à faible cardinalité : catégories
+    - superficie : float64 (en float32, les totaux sur des dizaines de milliers
+      de parcelles dérivent), id_parcelle : texte
+    """
+    memoire_avant = df.memory_usage(deep=True).sum()
     df.columns = df.columns.str.lower()
     
     # Traitement NICAD
-    df["nicad"] = df["nicad"].astype(str).str.strip().str.lower() == "oui"
-    df["nicad"] = df["nicad"].map({True: "Avec NICAD", False: "Sans NICAD"})
+    df["a_nicad"] = df["nicad"].astype(str).str.strip().str.lower() == "oui"
+    df["nicad"] = _libelles_depuis_masque(df["a_nicad"], CATEGORIES_NICAD)
     
-    # Traitement délibération
-    if "deliberee" in df.columns:
-        df["deliberee"] = df["deliberee"].astype(str).str.strip().str.lower() == "oui"
-        df["statut_deliberation"] = df["deliberee"].map({True: "Délibérée", False: "Non délibérée"})
+    # Traitement délibération (colonne "delibere" dans les exports de prepare_data)
+    colonne_delib = next((c for c in ("deliberee", "delibere") if c in df.columns), None)
+    if colonne_delib:
+        df["deliberee"] = df[colonne_delib].astype(str).str.strip().str.lower() == "oui"
     else:
-        df["statut_deliberation"] = "Non délibérée"
+        df["deliberee"] = False
+    df["statut_deliberation"] = _libelles_depuis_masque(df["deliberee"], CATEGORIES_DELIBERATION)
     
     # Nettoyage des données
-    df["superficie"] = pd.to_numeric(df["superficie"], errors="coerce")
-    df["village"] = df["village"].fillna("Non spécifié").replace("", "Non spécifié")
-    df["commune"] = df["commune"].fillna("Non spécifié").replace("", "Non spécifié")
+    df["superficie"] = pd.to_numeric(df["superficie"], errors="coerce").astype("float64")
+    for col in ("village", "commune"):
+        if col in df.columns:
+            df[col] = df[col].fillna("Non spécifié").replace("", "Non spécifié")
+    
+    if "id_parcelle" in df.columns:
+        df["id_parcelle"] = df["id_parcelle"].astype(str)
+    
+    for col in COLONNES_CATEGORIELLES:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            valeurs = df[col].astype(str).where(df[col].notna())
+            categories = sorted(valeurs.dropna().unique())
+            df[col] = valeurs.astype(pd.CategoricalDtype(categories))
+    
+    memoire_apres = df.memory_usage(deep=True).sum()
+    logger.info(
+        f"Parcelles: mémoire {memoire_avant / 1e6:.1f} Mo -> {memoire_apres / 1e6:.1f} Mo "
+        f"({(memoire_avant - memoire_apres) / 1e6:.1f} Mo économisés)"
+    )
     
     return df
 
@@ -138,12 +1180,128 @@ def process_post_traitement_data(df: pd.DataFrame) -> pd.DataFrame:
     df.columns = df.columns.str.strip().str.lower()
     return df
 
-@st.cache_data
-def charger_parcelles():
-    """Charge les données des parcelles depuis le fichier Excel"""
+def process_projections_data(df: pd.DataFrame) -> pd.DataFrame:
+    """Traite les données de projections"""
+    df.columns = df.columns.str.strip().str.lower()
+    return df
+
+def colonnes_par_defaut(dataset: str, colonnes_optionnelles=()) -> Optional[List[str]]:
+    """Colonnes à lire pour un jeu de données : requises + optionnelles demandées"""
+    schema = SCHEMAS_COLONNES.get(dataset)
+    if schema is None:
+        return None
+    optionnelles = [c for c in colonnes_optionnelles if c in schema['optionnelles']]
+    return schema['requises'] + optionnelles
+
+# --- PRÉCHAUFFAGE PARALLÈLE DES CLASSEURS ---
+def sources_prechauffage() -> List[tuple]:
+    """Liste (chemin, process_func, usecols) de tous les classeurs lus par le tableau de bord"""
+    traitements = {
+        'parcelles': process_parcelles_data,
+        'levee_commune': process_levee_commune_data,
+        'parcelles_terrain': process_parcelles_terrain_data,
+        'etapes': None,
+        'post_traitement': process_post_traitement_data
+    }
+
+    sources = []
+    for key, filename in data_loader.data_files.items():
+        file_path = data_loader.find_data_file(filename)
+        if file_path:
+            sources.append((file_path, traitements.get(key), colonnes_par_defaut(key)))
+        else:
+            logger.warning(f"Préchauffage: {filename} introuvable")
+
+    for file_path in FICHIERS_GENRE.values():
+        sources.append((file_path, None, None))
+    sources.append((FICHIER_PROJECTIONS, process_projections_data, None))
+    return sources
+
+def _prechauffer_fichier(file_path: str, process_func=None, usecols=None) -> Dict[str, Any]:
+    """Parse un classeur dans un processus du pool et écrit son sidecar Parquet"""
+    debut = time.perf_counter()
+    loader = DataLoader()
+
+    df = loader.lire_sidecar(file_path, process_func, usecols)
+    source = 'sidecar'
+    if df is None:
+        df = loader.parse_excel(file_path, process_func, usecols)
+        source = 'excel'
+
+    return {
+        'fichier': file_path,
+        'source': source,
+        'lignes': len(df),
+        'duree_s': round(time.perf_counter() - debut, 3)
+    }
+
+class Prechauffage:
+    """Préchauffe tous les classeurs en parallèle, sans bloquer le thread de l'interface
+
+    Le parsing openpyxl étant limité par le GIL, chaque classeur est parsé dans un
+    processus séparé. Le résultat est partagé via les sidecars Parquet : le premier
+    visiteur lit directement le sidecar au lieu de parser le fichier Excel.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers
+        self.rapport = []
+        self.termine = threading.Event()
+        self.thread = None
+
+    def demarrer(self) -> "Prechauffage":
+        """Lance le préchauffage dans un thread d'arrière-plan"""
+        self.thread = threading.Thread(target=self._executer, name="prechauffage", daemon=True)
+        self.thread.start()
+        return self
+
+    def _executer(self):
+        debut = time.perf_counter()
+        sources = sources_prechauffage()
+
+        try:
+            # "spawn" évite de dupliquer par fork les threads du serveur Streamlit
+            contexte = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=contexte) as pool:
+                futures = {
+                    pool.submit(_prechauffer_fichier, file_path, process_func, usecols): file_path
+                    for file_path, process_func, usecols in sources
+                }
+                for future in as_completed(futures):
+                    try:
+                        resultat = future.result()
+                    except Exception as e:
+                        resultat = {'fichier': futures[future], 'source': 'erreur', 'erreur': str(e)}
+                    self.rapport.append(resultat)
+                    logger.info(f"Préchauffage: {resultat}")
+
+        except Exception as e:
+            logger.error(f"Préchauffage interrompu: {e}")
+
+        finally:
+            logger.info(f"Préchauffage terminé en {time.perf_counter() - debut:.2f}s "
+                        f"({len(self.rapport)}/{len(sources)} fichiers)")
+            self.termine.set()
+
+def lancer_prechauffage(max_workers: Optional[int] = None) -> Prechauffage:
+    """Démarre le préchauffage des classeurs et retourne l'objet de suivi"""
+    if not data_loader.sidecar_actif:
+        logger.warning("Préchauffage désactivé: pyarrow n'est pas installé")
+        prechauffage = Prechauffage(max_workers)
+        prechauffage.termine.set()
+        return prechauffage
+    return Prechauffage(max_workers).demarrer()
+
+def charger_parcelles(colonnes_optionnelles: tuple = ()):
+    """Charge les données des parcelles depuis le fichier Excel
+
+    Seules les colonnes utilisées par les pages sont lues ; les colonnes de
+    SCHEMAS_COLONNES['parcelles']['optionnelles'] sont ajoutées sur demande.
+    """
     df = data_loader.load_excel_file(
         data_loader.data_files['parcelles'], 
-        process_parcelles_data
+        process_parcelles_data,
+        usecols=colonnes_par_defaut('parcelles', colonnes_optionnelles)
     )
     
     if df.empty:
@@ -154,7 +1312,6 @@ def charger_parcelles():
     
     return df
 
-@st.cache_data
 def charger_levee_par_commune():
     """Charge les données des levées par commune"""
     df = data_loader.load_excel_file(
@@ -172,7 +1329,6 @@ def charger_levee_par_commune():
     
     return df
 
-@st.cache_data
 def charger_parcelles_terrain_periode():
     """Charge les données des parcelles terrain et leur période"""
     df = data_loader.load_excel_file(
@@ -190,7 +1346,6 @@ def charger_parcelles_terrain_periode():
     
     return df
 
-@st.cache_data
 def charger_etapes():
     """Charge les données des étapes"""
     df = data_loader.load_excel_file(data_loader.data_files['etapes'])
@@ -206,7 +1361,6 @@ def charger_etapes():
     
     return df
 
-@st.cache_data
 def charger_parcelles_post_traitement():
     """Charge les données des parcelles post-traitées"""
     df = data_loader.load_excel_file(
@@ -224,6 +1378,42 @@ def charger_parcelles_post_traitement():
     
     return df
 
+registre_donnees.declarer('parcelles', charger_parcelles)
+registre_donnees.declarer('levee_commune', charger_levee_par_commune)
+registre_donnees.declarer('parcelles_terrain', charger_parcelles_terrain_periode)
+registre_donnees.declarer('etapes', charger_etapes)
+registre_donnees.declarer('post_traitement', charger_parcelles_post_traitement)
+
+# Formats acceptés au téléchargement (CSV et Parquet se lisent bien plus vite que xlsx)
+FORMATS_TELECHARGEMENT = ['xlsx', 'xls', 'csv', 'parquet']
+
+def lire_fichier_televerse(nom: str, contenu: bytes) -> pd.DataFrame:
+    """Parse un fichier téléchargé selon son extension"""
+    extension = Path(nom).suffix.lower()
+    tampon = io.BytesIO(contenu)
+
+    if extension == '.parquet':
+        return pd.read_parquet(tampon)
+
+    if extension == '.csv':
+        df = pd.read_csv(tampon)
+        # Export Excel français : séparateur ";"
+        if df.shape[1] == 1 and ';' in str(df.columns[0]):
+            df = pd.read_csv(io.BytesIO(contenu), sep=';')
+        return df
+
+    if extension == '.xls':
+        return pd.read_excel(tampon)
+    return pd.read_excel(tampon, engine="openpyxl")
+
+def poignee_fichier_televerse(uploaded_file) -> str:
+    """Hash du contenu d'un fichier téléchargé, calculé une seule fois par fichier et par session"""
+    hashes = st.session_state.setdefault('hashes_televersements', {})
+    identifiant = getattr(uploaded_file, 'file_id', None) or f"{uploaded_file.name}:{uploaded_file.size}"
+    if identifiant not in hashes:
+        hashes[identifiant] = DatasetStore.hash_contenu(uploaded_file.getvalue())
+    return hashes[identifiant]
+
 def interface_telechargement_fichier():
     """Interface pour le téléchargement de fichier avec diagnostic amélioré"""
     
@@ -254,31 +1444,53 @@ def interface_telechargement_fichier():
                 st.write("- ❌ Dossier 'data' introuvable")
         
         # Vérification des fichiers requis
+        if st.button("🔄 Rafraîchir l'index des fichiers"):
+            data_loader.manifest.rafraichir(force=True)
+
         st.write("**État des fichiers requis:**")
         for key, filename in data_loader.data_files.items():
-            file_path = data_loader.find_file_in_project(filename)
+            file_path = data_loader.find_data_file(filename)
             if file_path:
                 st.write(f"- ✅ {filename}")
             else:
                 st.write(f"- ❌ {filename}")
+        
+        # Mesures de chargement : résolution, parsing, traitement, taille, cache
+        st.write("**Mesures de chargement:**")
+        if data_loader.mesures:
+            df_mesures = pd.DataFrame(list(data_loader.mesures)[::-1])
+            st.dataframe(df_mesures, use_container_width=True)
+        else:
+            st.write("- Aucun chargement enregistré")
     
     # Interface de téléchargement
     st.markdown("---")
     st.subheader("📤 Télécharger le fichier des parcelles")
     
     uploaded_file = st.file_uploader(
-        "Choisissez votre fichier Excel",
-        type=['xlsx', 'xls'],
+        "Choisissez votre fichier (Excel, CSV ou Parquet)",
+        type=FORMATS_TELECHARGEMENT,
         help="Le fichier doit contenir les colonnes nécessaires pour l'analyse"
     )
     
     if uploaded_file is not None:
         try:
-            df = pd.read_excel(uploaded_file, engine="openpyxl")
-            df = process_parcelles_data(df)
+            # Hashé à l'arrivée, parsé une seule fois : un fichier déjà déposé
+            # (par cette session ou une autre) est servi directement par le magasin
+            poignee = poignee_fichier_televerse(uploaded_file)
+            df = magasin_donnees.obtenir(poignee)
+            if df is None:
+                df = lire_fichier_televerse(uploaded_file.name, uploaded_file.getvalue())
+                df = process_parcelles_data(df)
+                magasin_donnees.deposer(poignee, df)
             
             st.success("✅ Fichier chargé avec succès!")
-            st.session_state['df_parcelles_uploaded'] = df
+            ancienne = st.session_state.get('parcelles_uploaded_handle')
+            if ancienne != poignee:
+                # Le jeu précédent de la session est relâché (supprimé s'il n'est plus utilisé)
+                magasin_donnees.retenir(poignee)
+                magasin_donnees.relacher(ancienne)
+                st.session_state['parcelles_uploaded_handle'] = poignee
             
             # Afficher un aperçu
             col1, col2, col3 = st.columns(3)
@@ -316,7 +1528,7 @@ def verifier_structure_fichiers():
     fichiers_presents = []
     
     for filename, description in fichiers_requis.items():
-        file_path = data_loader.find_file_in_project(filename)
+        file_path = data_loader.find_data_file(filename)
         if file_path:
             fichiers_presents.append(filename)
             st.success(f"✅ {filename}")
@@ -371,7 +1583,7 @@ def get_data_info():
     }
     
     for key, filename in data_loader.data_files.items():
-        file_path = data_loader.find_file_in_project(filename)
+        file_path = data_loader.find_data_file(filename)
         if file_path:
             info['files_found'][key] = file_path
         else:
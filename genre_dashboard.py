@@ -5,6 +5,12 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import numpy as np
 
+from data_loader import registre_donnees, data_loader, FICHIERS_GENRE
+from cache_figures import figure_en_cache
+
+# Jeux de données du registre utilisés par cette page
+DATASETS_REQUIS = ('genre',)
+
 # CSS personnalisé pour un look moderne
 st.markdown("""
 <style>
@@ -73,14 +79,19 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data
+def _lire_fichiers_genre():
+    """Lit les trois classeurs genre (ou leurs sidecars Parquet)"""
+    df_genre_trimestre = data_loader.parse_excel(FICHIERS_GENRE['trimestre'])
+    df_repartition_genre = data_loader.parse_excel(FICHIERS_GENRE['repartition'])
+    df_genre_commune = data_loader.parse_excel(FICHIERS_GENRE['commune'])
+    return df_genre_trimestre, df_repartition_genre, df_genre_commune
+
 def charger_donnees_genre():
-    """Chargement des données avec gestion d'erreurs"""
+    """Chargement des données avec gestion d'erreurs (rechargées si un fichier change)"""
     try:
-        df_genre_trimestre = pd.read_excel("genre/Genre par trimestre.xlsx", engine="openpyxl")
-        df_repartition_genre = pd.read_excel("genre/Repartition genre.xlsx", engine="openpyxl")
-        df_genre_commune = pd.read_excel("genre/Genre par Commune.xlsx", engine="openpyxl")
-        return df_genre_trimestre, df_repartition_genre, df_genre_commune
+        return data_loader.cache_donnees.obtenir(
+            'genre', list(FICHIERS_GENRE.values()), _lire_fichiers_genre
+        )
     except FileNotFoundError as e:
         st.error(f"Fichiers de données non trouvés: {e}")
         st.info("Veuillez vérifier que les fichiers suivants existent:")
@@ -92,6 +103,8 @@ def charger_donnees_genre():
         st.error(f"Erreur lors du chargement des données: {e}")
         return None, None, None
 
+registre_donnees.declarer('genre', charger_donnees_genre)
+
 def create_modern_metric_card(title, value, color_class=""):
     """Création d'une carte métrique moderne"""
     return f"""
@@ -277,13 +290,16 @@ def afficher_repartition_genre():
     """Fonction principale pour afficher l'analyse genre (appelée depuis dashboard.py)"""
     
     # Chargement des données
-    df_genre_trimestre, df_repartition_genre, df_genre_commune = charger_donnees_genre()
+    df_genre_trimestre, df_repartition_genre, df_genre_commune = registre_donnees.charger_page(DATASETS_REQUIS)['genre']
     
     if df_genre_trimestre is None or df_repartition_genre is None or df_genre_commune is None:
         st.error("🚨 Impossible de charger les données de genre")
         st.info("Veuillez vous assurer que les fichiers Excel sont présents dans le dossier 'genre/'")
         return
     
+    # Les figures sont mises en cache par version de ces trois jeux de données
+    donnees_genre = (df_genre_trimestre, df_repartition_genre, df_genre_commune)
+    
     # Titre principal avec style
     st.markdown("""
     <h2 style="color: #f39c12; text-align: center; margin-bottom: 2rem;">
@@ -352,18 +368,22 @@ def afficher_repartition_genre():
         col1, col2 = st.columns([1, 1])
         
         with col1:
-            fig_gauge = create_gauge_chart(pourcentage_femmes, "Pourcentage de femmes", objectif_femmes)
+            fig_gauge = figure_en_cache(
+                donnees_genre, "genre.jauge_globale",
+                lambda: create_gauge_chart(pourcentage_femmes, "Pourcentage de femmes", objectif_femmes),
+                objectif=objectif_femmes
+            )
             st.plotly_chart(fig_gauge, use_container_width=True)
         
         with col2:
             colors = ['#3498db', '#e91e63']
-            fig_pie = create_modern_pie_chart(
+            fig_pie = figure_en_cache(donnees_genre, "genre.repartition_globale", lambda: create_modern_pie_chart(
                 df_repartition_genre,
                 names="Genre",
                 values="Total_Nombre",
                 title="Répartition Globale Hommes/Femmes",
                 colors=colors
-            )
+            ))
             st.plotly_chart(fig_pie, use_container_width=True)
     
     elif vue_selectionnee == "Analyse par commune":
@@ -409,40 +429,50 @@ def afficher_repartition_genre():
         col1, col2 = st.columns(2)
         
         with col1:
-            fig_gauge_commune = create_gauge_chart(pourcentage_femmes_c, f"% Femmes - {commune_selectionnee}", objectif_femmes)
+            fig_gauge_commune = figure_en_cache(
+                donnees_genre, "genre.jauge_commune",
+                lambda: create_gauge_chart(pourcentage_femmes_c, f"% Femmes - {commune_selectionnee}", objectif_femmes),
+                commune=commune_selectionnee, objectif=objectif_femmes
+            )
             st.plotly_chart(fig_gauge_commune, use_container_width=True)
         
         with col2:
-            df_temp = pd.DataFrame({
-                "Genre": ["Homme", "Femme"],
-                "Nombre": [hommes_c, femmes_c]
-            })
-            fig_pie_commune = create_modern_pie_chart(
-                df_temp,
-                names="Genre",
-                values="Nombre",
-                title=f"Répartition - {commune_selectionnee}",
-                colors=['#3498db', '#e91e63']
+            def _figure_repartition_commune():
+                df_temp = pd.DataFrame({
+                    "Genre": ["Homme", "Femme"],
+                    "Nombre": [hommes_c, femmes_c]
+                })
+                return create_modern_pie_chart(
+                    df_temp,
+                    names="Genre",
+                    values="Nombre",
+                    title=f"Répartition - {commune_selectionnee}",
+                    colors=['#3498db', '#e91e63']
+                )
+            fig_pie_commune = figure_en_cache(
+                donnees_genre, "genre.repartition_commune", _figure_repartition_commune,
+                commune=commune_selectionnee
             )
             st.plotly_chart(fig_pie_commune, use_container_width=True)
         
         # Vue globale par commune
         st.markdown("### 🌍 Vue d'ensemble - Toutes les communes")
-        df_long = df_genre_commune.melt(
-            id_vars=["communeSenegal"],
-            value_vars=["Femme", "Homme"],
-            var_name="Genre",
-            value_name="Nombre"
-        )
-        
-        fig_communes = create_stacked_bar_chart(
-            df_long,
-            x="communeSenegal",
-            y="Nombre",
-            color="Genre",
-            title="Répartition du genre par commune",
-            color_map={"Homme": "#3498db", "Femme": "#e91e63"}
-        )
+        def _figure_communes():
+            df_long = df_genre_commune.melt(
+                id_vars=["communeSenegal"],
+                value_vars=["Femme", "Homme"],
+                var_name="Genre",
+                value_name="Nombre"
+            )
+            return create_stacked_bar_chart(
+                df_long,
+                x="communeSenegal",
+                y="Nombre",
+                color="Genre",
+                title="Répartition du genre par commune",
+                color_map={"Homme": "#3498db", "Femme": "#e91e63"}
+            )
+        fig_communes = figure_en_cache(donnees_genre, "genre.communes", _figure_communes)
         st.plotly_chart(fig_communes, use_container_width=True)
     
     elif vue_selectionnee == "Analyse par type de parcelle":
@@ -454,14 +484,14 @@ def afficher_repartition_genre():
         col_nb = f"{type_selectionne}_Nombre"
         
         if col_nb in df_repartition_genre.columns:
-            fig_type = create_modern_bar_chart(
+            fig_type = figure_en_cache(donnees_genre, "genre.type_parcelle", lambda: create_modern_bar_chart(
                 df_repartition_genre,
                 x="Genre",
                 y=col_nb,
                 color="Genre",
                 title=f"Répartition par genre - {type_selectionne}",
                 color_map={"Homme": "#3498db", "Femme": "#e91e63"}
-            )
+            ), type_parcelle=type_selectionne)
             st.plotly_chart(fig_type, use_container_width=True)
             
             # Affichage des statistiques pour ce type
@@ -478,20 +508,21 @@ def afficher_repartition_genre():
         
         # Comparaison de tous les types
         st.markdown("### 📊 Comparaison tous types")
-        comparison_data = []
-        for type_p in types_parcelles:
-            col_nb = f"{type_p}_Nombre"
-            if col_nb in df_repartition_genre.columns:
-                for _, row in df_repartition_genre.iterrows():
-                    comparison_data.append({
-                        "Type": type_p,
-                        "Genre": row["Genre"],
-                        "Nombre": row[col_nb]
-                    })
-        
-        if comparison_data:
+        def _figure_comparaison():
+            comparison_data = []
+            for type_p in types_parcelles:
+                col_nb = f"{type_p}_Nombre"
+                if col_nb in df_repartition_genre.columns:
+                    for _, row in df_repartition_genre.iterrows():
+                        comparison_data.append({
+                            "Type": type_p,
+                            "Genre": row["Genre"],
+                            "Nombre": row[col_nb]
+                        })
+            if not comparison_data:
+                return None
             df_comparison = pd.DataFrame(comparison_data)
-            fig_comparison = create_stacked_bar_chart(
+            return create_stacked_bar_chart(
                 df_comparison,
                 x="Type",
                 y="Nombre",
@@ -499,6 +530,9 @@ def afficher_repartition_genre():
                 title="Comparaison par type de parcelle",
                 color_map={"Homme": "#3498db", "Femme": "#e91e63"}
             )
+        
+        fig_comparison = figure_en_cache(donnees_genre, "genre.comparaison_types", _figure_comparaison)
+        if fig_comparison is not None:
             st.plotly_chart(fig_comparison, use_container_width=True)
     
     elif vue_selectionnee == "Évolution temporelle":
@@ -512,13 +546,13 @@ def afficher_repartition_genre():
                 return
             
             # Graphique d'évolution
-            fig_evol = create_area_chart(
+            fig_evol = figure_en_cache(donnees_genre, "genre.evolution", lambda: create_area_chart(
                 df_genre_trimestre,
                 x="PeriodeTrimestrielle",
                 y_cols=["Femme", "Homme"],
                 title="Évolution trimestrielle par genre",
                 color_map={"Homme": "#3498db", "Femme": "#e91e63"}
-            )
+            ))
             st.plotly_chart(fig_evol, use_container_width=True)
             
             # Tableau de données
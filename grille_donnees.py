@@ -0,0 +1,128 @@
+import io
+import logging
+
+import streamlit as st
+import pandas as pd
+import numpy as np
+
+from data_loader import version_dataset
+
+logger = logging.getLogger(__name__)
+
+# Tailles de page proposées et taille des blocs convertis lors d'un export CSV
+TAILLES_PAGE = [25, 50, 100, 250]
+TAILLE_BLOC_EXPORT = 20000
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _positions_recherche(version, texte, _df):
+    """Positions des lignes dont une colonne texte contient la recherche (insensible à la casse)"""
+    masque = np.zeros(len(_df), dtype=bool)
+    for colonne in _df.columns:
+        serie = _df[colonne]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            # Recherche sur les seules catégories, puis report sur les codes
+            categories = serie.cat.categories.astype(str)
+            trouvees = np.flatnonzero(categories.str.contains(texte, case=False, regex=False))
+            masque |= np.isin(serie.cat.codes.to_numpy(), trouvees)
+        elif serie.dtype == object or pd.api.types.is_string_dtype(serie.dtype):
+            masque |= serie.astype(str).str.contains(texte, case=False, regex=False, na=False).to_numpy()
+    return np.flatnonzero(masque)
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _ordre_tri(version, colonne, croissant, _df):
+    """Permutation (positions) qui trie le DataFrame sur une colonne, valeurs manquantes en fin"""
+    serie = _df[colonne].reset_index(drop=True)
+    return serie.sort_values(ascending=croissant, kind="stable", na_position="last").index.to_numpy()
+
+
+def positions_vue(df, recherche="", colonne_tri=None, croissant=True):
+    """
+    Positions des lignes de la vue courante (recherche puis tri), sans copier le DataFrame
+
+    Les résultats de recherche et les ordres de tri sont mis en cache par
+    version du jeu de données : changer de page ne recalcule rien.
+    """
+    version = version_dataset(df)
+    if colonne_tri is not None:
+        positions = _ordre_tri(version, colonne_tri, croissant, df)
+    else:
+        positions = np.arange(len(df))
+
+    recherche = recherche.strip()
+    if recherche:
+        retenues = _positions_recherche(version, recherche, df)
+        positions = positions[np.isin(positions, retenues)]
+    return positions
+
+
+def export_csv_par_blocs(df, positions, taille_bloc: int = TAILLE_BLOC_EXPORT) -> bytes:
+    """
+    Contenu CSV de la vue, converti bloc par bloc
+
+    Seul un bloc de lignes est copié et converti en texte à la fois : ni la
+    vue complète ni sa représentation texte ne sont matérialisées, seul le
+    CSV final (que st.download_button envoie en une fois) est en mémoire.
+    """
+    with io.BytesIO() as tampon:
+        for debut in range(0, max(len(positions), 1), taille_bloc):
+            bloc = df.iloc[positions[debut:debut + taille_bloc]]
+            tampon.write(bloc.to_csv(index=False, header=(debut == 0)).encode("utf-8"))
+        return tampon.getvalue()
+
+
+def afficher_grille_paginee(df, cle: str, nom_fichier: str = "donnees.csv"):
+    """
+    Grille de données paginée : recherche, tri et découpage côté serveur
+
+    Seule la page visible est envoyée à st.dataframe ; le bouton de
+    téléchargement exporte la vue filtrée et triée, dont le CSV n'est
+    construit qu'au clic (data appelable).
+
+    Args:
+        df (DataFrame): Jeu de données (partagé, jamais modifié)
+        cle (str): Préfixe unique des clés de widgets de la grille
+        nom_fichier (str): Nom du fichier CSV téléchargé
+    """
+    if df is None or df.empty:
+        st.info("Aucune donnée à afficher")
+        return
+
+    col_recherche, col_tri, col_ordre, col_taille = st.columns([3, 2, 1, 1])
+    recherche = col_recherche.text_input("🔎 Rechercher", key=f"{cle}_recherche")
+    colonne_tri = col_tri.selectbox("Trier par", ["(aucun)"] + [str(col) for col in df.columns], key=f"{cle}_tri")
+    croissant = col_ordre.selectbox("Ordre", ["Croissant", "Décroissant"], key=f"{cle}_ordre") == "Croissant"
+    taille_page = col_taille.selectbox("Lignes", TAILLES_PAGE, index=1, key=f"{cle}_taille")
+
+    colonne = None
+    if colonne_tri != "(aucun)":
+        colonne = next(col for col in df.columns if str(col) == colonne_tri)
+    positions = positions_vue(df, recherche, colonne, croissant)
+
+    nb_pages = max(1, -(-len(positions) // taille_page))
+    vue = (recherche, colonne_tri, croissant, taille_page)
+    if st.session_state.get(f"{cle}_vue") != vue:
+        # Nouvelle recherche, nouveau tri ou nouvelle taille de page : retour à la première page
+        st.session_state[f"{cle}_vue"] = vue
+        st.session_state[f"{cle}_page"] = 1
+    elif st.session_state.get(f"{cle}_page", 1) > nb_pages:
+        st.session_state[f"{cle}_page"] = nb_pages
+    col_page, col_info, col_export = st.columns([1, 2, 2])
+    page = col_page.number_input("Page", min_value=1, max_value=nb_pages, step=1, key=f"{cle}_page")
+    debut = (int(page) - 1) * taille_page
+    col_info.caption(
+        f"Lignes {min(debut + 1, len(positions)):,} à {min(debut + taille_page, len(positions)):,} "
+        f"sur {len(positions):,} ({len(df):,} au total) — page {int(page)}/{nb_pages}"
+    )
+
+    st.dataframe(df.iloc[positions[debut:debut + taille_page]], use_container_width=True)
+
+    with col_export:
+        st.download_button(
+            label=f"📥 Télécharger la vue ({len(positions):,} lignes, CSV)",
+            data=lambda: export_csv_par_blocs(df, positions),
+            file_name=nom_fichier,
+            mime="text/csv",
+            key=f"{cle}_export"
+        )
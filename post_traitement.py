@@ -5,21 +5,23 @@ import plotly.graph_objects as go
 from datetime import datetime
 
 # Import depuis le module data_loader pour éviter les imports circulaires
-from data_loader import (
-    charger_levee_par_commune,
-    charger_parcelles_terrain_periode,
-    charger_parcelles_post_traitement
-)
+from data_loader import registre_donnees
+from cache_figures import figure_en_cache
+from grille_donnees import afficher_grille_paginee
+
+# Jeux de données du registre utilisés par cette page
+DATASETS_REQUIS = ('levee_commune', 'parcelles_terrain', 'post_traitement')
 
 def afficher_analyse_parcelles():
     """Module d'analyse des parcelles et levées pour le tableau de bord PROCASEF"""
     
     st.header("📊 Analyse des Parcelles et Levées")
     
-    # Chargement des données
-    df_levee = charger_levee_par_commune()
-    df_parcelles = charger_parcelles_terrain_periode()
-    df_post_traitement = charger_parcelles_post_traitement()
+    # Chargement des données (uniquement celles de cette page)
+    donnees = registre_donnees.charger_page(DATASETS_REQUIS)
+    df_levee = donnees['levee_commune']
+    df_parcelles = donnees['parcelles_terrain']
+    df_post_traitement = donnees['post_traitement']
     
     # Création de 3 onglets pour l'analyse
     tab1, tab2, tab3 = st.tabs(["🏘️ Levées par Commune/Région", "📆 Évolution Temporelle", "📊 Post-traitement"])
@@ -30,7 +32,8 @@ def afficher_analyse_parcelles():
         
         if not df_levee.empty:
             # Normalisation des noms de colonnes
-            df_levee.columns = df_levee.columns.str.lower().str.strip()
+            # set_axis : nouveau DataFrame, le jeu de données partagé n'est pas modifié
+            df_levee = df_levee.set_axis(df_levee.columns.str.lower().str.strip(), axis=1)
             
             # Mapping des colonnes possibles - mise à jour avec les vraies colonnes
             column_mapping = {
@@ -67,32 +70,35 @@ def afficher_analyse_parcelles():
                     st.subheader("📊 Comparaison des Parcelles par Commune")
                     
                     # Création d'un graphique à barres groupées
-                    fig = go.Figure()
+                    def _figure_levees_communes():
+                        fig = go.Figure()
                     
-                    if 'parcelles terrain' in actual_columns:
-                        fig.add_trace(go.Bar(
-                            x=df_filtre['commune'],
-                            y=df_filtre[actual_columns['parcelles terrain']],
-                            name='Parcelles Terrain',
-                            marker_color='royalblue'
-                        ))
+                        if 'parcelles terrain' in actual_columns:
+                            fig.add_trace(go.Bar(
+                                x=df_filtre['commune'],
+                                y=df_filtre[actual_columns['parcelles terrain']],
+                                name='Parcelles Terrain',
+                                marker_color='royalblue'
+                            ))
                     
-                    if 'parcelles urm' in actual_columns:
-                        fig.add_trace(go.Bar(
-                            x=df_filtre['commune'],
-                            y=df_filtre[actual_columns['parcelles urm']],
-                            name='Parcelles URM',
-                            marker_color='firebrick'
-                        ))
+                        if 'parcelles urm' in actual_columns:
+                            fig.add_trace(go.Bar(
+                                x=df_filtre['commune'],
+                                y=df_filtre[actual_columns['parcelles urm']],
+                                name='Parcelles URM',
+                                marker_color='firebrick'
+                            ))
 
-                    fig.update_layout(
-                        title='Comparaison des Parcelles Terrain vs URM par Commune',
-                        xaxis_tickangle=-45,
-                        xaxis_title='Commune',
-                        yaxis_title='Nombre de Parcelles',
-                        barmode='group',
-                        height=600
-                    )
+                        fig.update_layout(
+                            title='Comparaison des Parcelles Terrain vs URM par Commune',
+                            xaxis_tickangle=-45,
+                            xaxis_title='Commune',
+                            yaxis_title='Nombre de Parcelles',
+                            barmode='group',
+                            height=600
+                        )
+                        return fig
+                    fig = figure_en_cache(df_levee, "post_traitement.levees_communes", _figure_levees_communes, region=region_sel)
 
                     st.plotly_chart(fig, use_container_width=True)
                     
@@ -105,35 +111,38 @@ def afficher_analyse_parcelles():
                         
                         if agg_cols:
                             # Agrégation par région
-                            df_region = df_levee.groupby('region')[agg_cols].sum().reset_index()
+                            def _figure_levees_regions():
+                                df_region = df_levee.groupby('region')[agg_cols].sum().reset_index()
                             
-                            # Création du graphique par région
-                            fig_region = go.Figure()
+                                # Création du graphique par région
+                                fig_region = go.Figure()
                             
-                            if 'parcelles terrain' in actual_columns and actual_columns['parcelles terrain'] in df_region.columns:
-                                fig_region.add_trace(go.Bar(
-                                    x=df_region['region'],
-                                    y=df_region[actual_columns['parcelles terrain']],
-                                    name='Parcelles Terrain',
-                                    marker_color='royalblue'
-                                ))
+                                if 'parcelles terrain' in actual_columns and actual_columns['parcelles terrain'] in df_region.columns:
+                                    fig_region.add_trace(go.Bar(
+                                        x=df_region['region'],
+                                        y=df_region[actual_columns['parcelles terrain']],
+                                        name='Parcelles Terrain',
+                                        marker_color='royalblue'
+                                    ))
                             
-                            if 'parcelles urm' in actual_columns and actual_columns['parcelles urm'] in df_region.columns:
-                                fig_region.add_trace(go.Bar(
-                                    x=df_region['region'],
-                                    y=df_region[actual_columns['parcelles urm']],
-                                    name='Parcelles URM',
-                                    marker_color='firebrick'
-                                ))
+                                if 'parcelles urm' in actual_columns and actual_columns['parcelles urm'] in df_region.columns:
+                                    fig_region.add_trace(go.Bar(
+                                        x=df_region['region'],
+                                        y=df_region[actual_columns['parcelles urm']],
+                                        name='Parcelles URM',
+                                        marker_color='firebrick'
+                                    ))
 
-                            fig_region.update_layout(
-                                title='Comparaison des Parcelles Terrain vs URM par Région',
-                                xaxis_tickangle=-45,
-                                xaxis_title='Région',
-                                yaxis_title='Nombre de Parcelles',
-                                barmode='group',
-                                height=500
-                            )
+                                fig_region.update_layout(
+                                    title='Comparaison des Parcelles Terrain vs URM par Région',
+                                    xaxis_tickangle=-45,
+                                    xaxis_title='Région',
+                                    yaxis_title='Nombre de Parcelles',
+                                    barmode='group',
+                                    height=500
+                                )
+                                return fig_region
+                            fig_region = figure_en_cache(df_levee, "post_traitement.levees_regions", _figure_levees_regions)
 
                             st.plotly_chart(fig_region, use_container_width=True)
                 else:
@@ -142,7 +151,7 @@ def afficher_analyse_parcelles():
                 
                 # Afficher la table de données
                 with st.expander("📋 Voir les données"):
-                    st.dataframe(df_filtre)
+                    afficher_grille_paginee(df_filtre, "grille_levees", "levees_par_commune.csv")
         else:
             st.error("Aucune donnée disponible pour l'analyse des levées par commune.")
 
@@ -152,7 +161,7 @@ def afficher_analyse_parcelles():
         
         if not df_parcelles.empty:
             # Normalisation des noms de colonnes
-            df_parcelles.columns = df_parcelles.columns.str.lower().str.strip()
+            df_parcelles = df_parcelles.set_axis(df_parcelles.columns.str.lower().str.strip(), axis=1)
             
             # Vérification des colonnes
             required_cols = ['date de debut', 'date de fin']
@@ -183,8 +192,10 @@ def afficher_analyse_parcelles():
                 if 'date de debut' in df_parcelles.columns and 'date de fin' in df_parcelles.columns:
                     # Conversion sécurisée des dates
                     try:
-                        df_parcelles['date de debut'] = pd.to_datetime(df_parcelles['date de debut'], errors='coerce')
-                        df_parcelles['date de fin'] = pd.to_datetime(df_parcelles['date de fin'], errors='coerce')
+                        df_parcelles = df_parcelles.assign(**{
+                            'date de debut': pd.to_datetime(df_parcelles['date de debut'], errors='coerce'),
+                            'date de fin': pd.to_datetime(df_parcelles['date de fin'], errors='coerce')
+                        })
                         
                         # Filtrer les lignes avec des dates valides
                         df_valid_dates = df_parcelles.dropna(subset=['date de debut', 'date de fin'])
@@ -234,19 +245,22 @@ def afficher_analyse_parcelles():
                                     evolution = df_filtre.groupby('periode')['levee'].sum().reset_index(name='quantite_levees')
                                     
                                     if not evolution.empty:
-                                        fig = px.line(
-                                            evolution, 
-                                            x='periode', 
-                                            y='quantite_levees',
-                                            markers=True,
-                                            title="Évolution de la quantité de levées par période"
-                                        )
+                                        def _figure_evolution():
+                                            fig = px.line(
+                                                evolution, 
+                                                x='periode', 
+                                                y='quantite_levees',
+                                                markers=True,
+                                                title="Évolution de la quantité de levées par période"
+                                            )
                                         
-                                        fig.update_layout(
-                                            xaxis_title="Période",
-                                            yaxis_title="Quantité de levées",
-                                            height=500
-                                        )
+                                            fig.update_layout(
+                                                xaxis_title="Période",
+                                                yaxis_title="Quantité de levées",
+                                                height=500
+                                            )
+                                            return fig
+                                        fig = figure_en_cache(df_parcelles, "post_traitement.evolution_levees", _figure_evolution, commune=commune_sel, lot=lot_sel, periode=date_range)
                                         
                                         st.plotly_chart(fig, use_container_width=True)
                                         
@@ -266,19 +280,22 @@ def afficher_analyse_parcelles():
                                     evolution = df_filtre.groupby('periode').size().reset_index(name='nombre_enregistrements')
                                     
                                     if not evolution.empty:
-                                        fig = px.line(
-                                            evolution, 
-                                            x='periode', 
-                                            y='nombre_enregistrements',
-                                            markers=True,
-                                            title="Évolution du nombre d'enregistrements par période"
-                                        )
+                                        def _figure_enregistrements():
+                                            fig = px.line(
+                                                evolution, 
+                                                x='periode', 
+                                                y='nombre_enregistrements',
+                                                markers=True,
+                                                title="Évolution du nombre d'enregistrements par période"
+                                            )
                                         
-                                        fig.update_layout(
-                                            xaxis_title="Période",
-                                            yaxis_title="Nombre d'enregistrements",
-                                            height=500
-                                        )
+                                            fig.update_layout(
+                                                xaxis_title="Période",
+                                                yaxis_title="Nombre d'enregistrements",
+                                                height=500
+                                            )
+                                            return fig
+                                        fig = figure_en_cache(df_parcelles, "post_traitement.evolution_enregistrements", _figure_enregistrements, commune=commune_sel, lot=lot_sel, periode=date_range)
                                         
                                         st.plotly_chart(fig, use_container_width=True)
                                     else:
@@ -288,7 +305,7 @@ def afficher_analyse_parcelles():
                                 
                                 # Afficher la table de données
                                 with st.expander("📋 Voir les données"):
-                                    st.dataframe(df_filtre)
+                                    afficher_grille_paginee(df_filtre, "grille_evolution", "levees_par_periode.csv")
                     except Exception as e:
                         st.error(f"Erreur lors du traitement des dates: {str(e)}")
                         st.write("Veuillez vérifier le format des dates dans le fichier.")
@@ -303,7 +320,7 @@ def afficher_analyse_parcelles():
         
         if not df_post_traitement.empty:
             # Normalisation des noms de colonnes
-            df_post_traitement.columns = df_post_traitement.columns.str.lower().str.strip()
+            df_post_traitement = df_post_traitement.set_axis(df_post_traitement.columns.str.lower().str.strip(), axis=1)
             
             #st.write("Colonnes disponibles dans le fichier de post-traitement:", df_post_traitement.columns.tolist())
             
@@ -367,23 +384,26 @@ def afficher_analyse_parcelles():
                         df_agg[category_col] = "Sélection actuelle"
                     
                     # Graphique de comparaison
-                    fig = go.Figure()
+                    def _figure_comparaison():
+                        fig = go.Figure()
                     
-                    for col in num_cols:
-                        fig.add_trace(go.Bar(
-                            x=df_agg[category_col],
-                            y=df_agg[col],
-                            name=col.replace('_', ' ').title(),
-                        ))
+                        for col in num_cols:
+                            fig.add_trace(go.Bar(
+                                x=df_agg[category_col],
+                                y=df_agg[col],
+                                name=col.replace('_', ' ').title(),
+                            ))
                     
-                    fig.update_layout(
-                        title=f"Comparaison des parcelles par {category_col}",
-                        xaxis_tickangle=-45,
-                        xaxis_title=category_col.replace('_', ' ').title(),
-                        yaxis_title="Nombre de parcelles",
-                        barmode='group',
-                        height=600
-                    )
+                        fig.update_layout(
+                            title=f"Comparaison des parcelles par {category_col}",
+                            xaxis_tickangle=-45,
+                            xaxis_title=category_col.replace('_', ' ').title(),
+                            yaxis_title="Nombre de parcelles",
+                            barmode='group',
+                            height=600
+                        )
+                        return fig
+                    fig = figure_en_cache(df_post_traitement, "post_traitement.comparaison", _figure_comparaison, csig=geom_sel, commune=commune_sel)
                     
                     st.plotly_chart(fig, use_container_width=True)
                     
@@ -403,14 +423,17 @@ def afficher_analyse_parcelles():
                         pie_data = pie_data[pie_data['Valeur'] > 0]
                         
                         if not pie_data.empty:
-                            fig_pie = px.pie(
-                                pie_data,
-                                values='Valeur',
-                                names='Type',
-                                title="Répartition par type de parcelle"
-                            )
+                            def _figure_types():
+                                fig_pie = px.pie(
+                                    pie_data,
+                                    values='Valeur',
+                                    names='Type',
+                                    title="Répartition par type de parcelle"
+                                )
                             
-                            fig_pie.update_traces(textposition='inside', textinfo='percent+label')
+                                fig_pie.update_traces(textposition='inside', textinfo='percent+label')
+                                return fig_pie
+                            fig_pie = figure_en_cache(df_post_traitement, "post_traitement.types_parcelles", _figure_types, csig=geom_sel, commune=commune_sel)
                             
                             st.plotly_chart(fig_pie, use_container_width=True)
                     
@@ -430,29 +453,32 @@ def afficher_analyse_parcelles():
                     if received_col and processed_col:
                         if 'lot' in df_filtre.columns:
                             # Par lot
-                            df_lot = df_filtre.groupby('lot')[[received_col, processed_col]].sum().reset_index()
+                            def _figure_recues_par_lot():
+                                df_lot = df_filtre.groupby('lot')[[received_col, processed_col]].sum().reset_index()
                             
-                            fig_comp = go.Figure()
+                                fig_comp = go.Figure()
                             
-                            fig_comp.add_trace(go.Bar(
-                                x=df_lot['lot'],
-                                y=df_lot[received_col],
-                                name='Parcelles Reçues'
-                            ))
+                                fig_comp.add_trace(go.Bar(
+                                    x=df_lot['lot'],
+                                    y=df_lot[received_col],
+                                    name='Parcelles Reçues'
+                                ))
                             
-                            fig_comp.add_trace(go.Bar(
-                                x=df_lot['lot'],
-                                y=df_lot[processed_col],
-                                name='Parcelles Post-traitées'
-                            ))
+                                fig_comp.add_trace(go.Bar(
+                                    x=df_lot['lot'],
+                                    y=df_lot[processed_col],
+                                    name='Parcelles Post-traitées'
+                                ))
                             
-                            fig_comp.update_layout(
-                                title="Comparaison par lot",
-                                xaxis_title="Lot",
-                                yaxis_title="Nombre de parcelles",
-                                barmode='group',
-                                height=500
-                            )
+                                fig_comp.update_layout(
+                                    title="Comparaison par lot",
+                                    xaxis_title="Lot",
+                                    yaxis_title="Nombre de parcelles",
+                                    barmode='group',
+                                    height=500
+                                )
+                                return fig_comp
+                            fig_comp = figure_en_cache(df_post_traitement, "post_traitement.recues_par_lot", _figure_recues_par_lot, csig=geom_sel, commune=commune_sel)
                             
                             st.plotly_chart(fig_comp, use_container_width=True)
                         
@@ -472,41 +498,44 @@ def afficher_analyse_parcelles():
                             agg_col = None
                         
                         if agg_col:
-                            df_eff = df_filtre_calc.groupby(agg_col).agg({
-                                received_col: 'sum',
-                                processed_col: 'sum'
-                            }).reset_index()
+                            def _figure_efficacite():
+                                df_eff = df_filtre_calc.groupby(agg_col).agg({
+                                    received_col: 'sum',
+                                    processed_col: 'sum'
+                                }).reset_index()
                             
-                            # Éviter la division par zéro
-                            df_eff['taux_traitement'] = df_eff.apply(
-                                lambda row: (row[processed_col] / row[received_col] * 100) if row[received_col] > 0 else 0, 
-                                axis=1
-                            )
+                                # Éviter la division par zéro
+                                df_eff['taux_traitement'] = df_eff.apply(
+                                    lambda row: (row[processed_col] / row[received_col] * 100) if row[received_col] > 0 else 0, 
+                                    axis=1
+                                )
                             
-                            # Arrondir les pourcentages pour un affichage propre
-                            df_eff['taux_affichage'] = df_eff['taux_traitement'].round(1)
+                                # Arrondir les pourcentages pour un affichage propre
+                                df_eff['taux_affichage'] = df_eff['taux_traitement'].round(1)
                             
-                            fig_eff = go.Figure()
+                                fig_eff = go.Figure()
                             
-                            fig_eff.add_trace(go.Bar(
-                                x=df_eff[agg_col],
-                                y=df_eff['taux_traitement'],
-                                text=df_eff['taux_affichage'].astype(str) + '%',
-                                textposition='outside',
-                                marker_color='lightcoral'
-                            ))
+                                fig_eff.add_trace(go.Bar(
+                                    x=df_eff[agg_col],
+                                    y=df_eff['taux_traitement'],
+                                    text=df_eff['taux_affichage'].astype(str) + '%',
+                                    textposition='outside',
+                                    marker_color='lightcoral'
+                                ))
                             
-                            fig_eff.update_layout(
-                                title=f"Taux de traitement par {agg_col} (%)",
-                                xaxis_title=agg_col.replace('_', ' ').title(),
-                                yaxis_title="Taux de traitement (%)",
-                                height=500,
-                                showlegend=False
-                            )
+                                fig_eff.update_layout(
+                                    title=f"Taux de traitement par {agg_col} (%)",
+                                    xaxis_title=agg_col.replace('_', ' ').title(),
+                                    yaxis_title="Taux de traitement (%)",
+                                    height=500,
+                                    showlegend=False
+                                )
                             
-                            # Améliorer l'affichage des axes
-                            fig_eff.update_xaxes(tickangle=-45)
-                            fig_eff.update_yaxes(range=[0, max(df_eff['taux_traitement']) * 1.1])
+                                # Améliorer l'affichage des axes
+                                fig_eff.update_xaxes(tickangle=-45)
+                                fig_eff.update_yaxes(range=[0, max(df_eff['taux_traitement']) * 1.1])
+                                return fig_eff
+                            fig_eff = figure_en_cache(df_post_traitement, "post_traitement.efficacite", _figure_efficacite, csig=geom_sel, commune=commune_sel)
                             
                             st.plotly_chart(fig_eff, use_container_width=True)
                 else:
@@ -514,15 +543,7 @@ def afficher_analyse_parcelles():
                 
                 # Afficher la table de données
                 with st.expander("📋 Voir les données"):
-                    st.dataframe(df_filtre)
-                    
-                    # Option de téléchargement
-                    csv = df_filtre.to_csv(index=False)
-                    st.download_button(
-                        label="Télécharger les données filtrées (CSV)",
-                        data=csv,
-                        file_name="parcelles_post_traitees_filtrees.csv",
-                        mime="text/csv",
-                    )
+                    # Le téléchargement de la grille exporte la vue filtrée
+                    afficher_grille_paginee(df_filtre, "grille_post_traitement", "parcelles_post_traitees_filtrees.csv")
         else:
             st.error("Aucune donnée disponible pour l'analyse du post-traitement géométrique.")
@@ -1,10 +1,37 @@
 import pandas as pd
+import numpy as np
 import os
+import sys
+import re
+import json
+import time
+import hashlib
+import logging
+import argparse
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path, PureWindowsPath
+
+from data_loader import (
+    lire_excel_par_blocs,
+    DataLoader,
+    PARQUET_DISPONIBLE,
+    TAILLE_BLOC,
+    FICHIER_RAPPORT_PREPARATION
+)
+
+logger = logging.getLogger("prepare_data")
 
 
 # === Chargement Excel avec dtypes forcés ===
 def charger_fichier(fichier):
-    return pd.read_excel(fichier, dtype={'Num_parcel': str, 'Num_parcel_2': str, 'Nicad': str})
+    # Lecture en flux (openpyxl read_only) : l'arbre complet de la feuille n'est jamais construit.
+    # Les blocs sont réunis en un DataFrame : les rapprochements indexés portent sur la table entière.
+    blocs = list(lire_excel_par_blocs(fichier, dtype={'Num_parcel': str, 'Num_parcel_2': str, 'Nicad': str}))
+    return pd.concat(blocs, ignore_index=True) if blocs else pd.DataFrame()
 
 
 # === Harmoniser les noms de colonnes ===
@@ -28,71 +55,82 @@ def harmoniser_colonnes(df):
     if 'Village' not in df.columns:
         df['Village'] = "Non spécifié"
 
-    # IMPORTANT : Examiner toutes les colonnes potentiellement contenant des NICADs
+    # Colonnes pouvant contenir des NICADs (détail visible avec --verbeux)
     nicad_candidates = [col for col in df.columns if 'nicad' in col.lower() or 'nica' in col.lower()]
     if nicad_candidates:
-        print(f"   ➤ Colonnes potentiellement NICAD trouvées: {nicad_candidates}")
+        logger.debug(f"Colonnes potentiellement NICAD: {nicad_candidates}")
 
     return df
 
 
-# === Marquer la correspondance URM (NICAD oui/non) ===
-def ajouter_nicad(df_kobo, df_urm):
-    df_kobo['id_parcelle'] = df_kobo['id_parcelle'].astype(str)
-    df_urm['id_parcelle'] = df_urm['id_parcelle'].astype(str)
+# === Rapprochement enquête / référence URM ou Ndoga (NICAD et attributs) ===
+def rapprocher_reference(df_enquete, df_reference, attributs, mapping_cols=None):
+    """
+    Marque les NICADs et complète les attributs d'une enquête en une seule jointure indexée
 
-    # Compter les correspondances pour le débogage
-    nb_matches = sum(df_kobo["id_parcelle"].isin(df_urm["id_parcelle"]))
-    print(f"   ➤ Nombre de correspondances trouvées: {nb_matches}")
+    Un seul index (pd.Index sur id_parcelle) est construit par table de
+    référence : get_indexer donne, pour chaque parcelle de l'enquête, la position
+    de sa ligne de référence (-1 si absente), réutilisée pour hasNicad, Nicad et
+    tous les attributs. Les valeurs de la référence priment, celles de l'enquête
+    servent de repli. Pour un identifiant dupliqué dans la référence, la dernière
+    ligne est retenue : l'enquête n'est jamais dupliquée.
 
-    # CORRECTION: Renommer pour clarifier - indique si la parcelle a un NICAD
-    df_kobo["hasNicad"] = df_kobo["id_parcelle"].isin(df_urm["id_parcelle"]).map({True: "Oui", False: "Non"})
+    Args:
+        df_enquete (DataFrame): Parcelles de l'enquête (Kobo ou Ndoga initial), harmonisées
+        df_reference (DataFrame): Table de référence (URM ou Ndoga NICAD), harmonisée
+        attributs (list): Attributs à compléter depuis la référence
+        mapping_cols (dict): Nom de la colonne de référence pour un attribut, si différent
 
-    # IMPORTANT: Essayer d'extraire les vraies valeurs de NICAD depuis df_urm
-    if "Nicad" in df_urm.columns:
-        # Créer un dictionnaire de mapping id_parcelle -> Nicad
-        nicad_mapping = df_urm.set_index('id_parcelle')['Nicad'].to_dict()
-        print(f"   ➤ Nombre de NICADs dans le mapping: {len(nicad_mapping)}")
-        print(f"   ➤ Exemples de NICADs du mapping: {list(nicad_mapping.values())[:5]}")
-
-        # Appliquer le mapping pour ajouter les NICADs
-        df_kobo['Nicad'] = df_kobo['id_parcelle'].map(nicad_mapping)
+    Returns:
+        tuple: (DataFrame de l'enquête complété, statistiques de rapprochement)
+    """
+    if mapping_cols is None:
+        mapping_cols = {}
 
-        # Compter combien de NICADs ont été ajoutés
-        nb_nicads_added = df_kobo['Nicad'].notna().sum()
-        print(f"   ➤ NICADs ajoutés: {nb_nicads_added}")
+    ids_enquete = df_enquete['id_parcelle'].astype(str)
+    ids_reference = df_reference['id_parcelle'].astype(str)
+    uniques = ~ids_reference.duplicated(keep='last')
+    reference = df_reference.loc[uniques.to_numpy()]
 
-    return df_kobo
+    positions = pd.Index(ids_reference[uniques]).get_indexer(ids_enquete)
+    trouvees = positions >= 0
 
+    def valeurs_reference(colonne):
+        valeurs = pd.api.extensions.take(reference[colonne].array, positions, allow_fill=True)
+        return pd.Series(valeurs, index=df_enquete.index)
 
-# === Ajouter les attributs depuis URM avec fallback sur Kobo ===
-def completer_attributs(df_kobo, df_urm, attributs, mapping_cols=None):
-    if mapping_cols is None:
-        mapping_cols = {}
-    df_urm_subset = df_urm[['id_parcelle'] + [mapping_cols.get(a, a) for a in attributs if
-                                              mapping_cols.get(a, a) in df_urm.columns]].copy()
+    df_enquete['id_parcelle'] = ids_enquete
+    df_enquete['hasNicad'] = np.where(trouvees, "Oui", "Non")
 
-    # Ajouter Nicad si présent pour le transfert
-    if 'Nicad' in df_urm.columns and 'Nicad' not in attributs:
-        df_urm_subset['Nicad'] = df_urm['Nicad']
+    stats = {
+        'lignes_enquete': len(df_enquete),
+        'lignes_reference': len(df_reference),
+        'doublons_reference': int(len(df_reference) - len(reference)),
+        'correspondances': int(trouvees.sum()),
+        'taux_correspondance': round(float(trouvees.mean()), 4) if len(df_enquete) else 0.0,
+        'nicads_ajoutes': 0,
+        'attributs_completes': {}
+    }
 
-    df_merge = df_kobo.merge(df_urm_subset, on='id_parcelle', how='left', suffixes=('', '_urm'))
+    if 'Nicad' in reference.columns:
+        nicad = valeurs_reference('Nicad')
+        stats['nicads_ajoutes'] = int(nicad.notna().sum())
+        df_enquete['Nicad'] = nicad.fillna("")
 
     for attr in attributs:
         col_source = mapping_cols.get(attr, attr)
-        col_urm = f"{col_source}_urm"
-        if col_urm in df_merge.columns:
-            df_merge[attr] = df_merge[col_urm].combine_first(df_merge.get(attr)).fillna("Non spécifié")
-            df_merge.drop(columns=[col_urm], inplace=True)
+        repli = df_enquete[attr] if attr in df_enquete.columns else None
+        if col_source in reference.columns:
+            valeurs = valeurs_reference(col_source)
+            stats['attributs_completes'][attr] = int(valeurs.notna().sum())
+            if repli is not None:
+                valeurs = valeurs.combine_first(repli)
         else:
-            df_merge[attr] = df_merge.get(attr, "Non spécifié").fillna("Non spécifié")
-
-    # Transférer également Nicad si disponible
-    if 'Nicad_urm' in df_merge.columns:
-        df_merge['Nicad'] = df_merge['Nicad_urm'].combine_first(df_merge.get('Nicad')).fillna("")
-        df_merge.drop(columns=['Nicad_urm'], inplace=True)
+            stats['attributs_completes'][attr] = 0
+            valeurs = repli if repli is not None else pd.Series(None, index=df_enquete.index, dtype=object)
+        df_enquete[attr] = valeurs.fillna("Non spécifié")
 
-    return df_merge
+    return df_enquete, stats
 
 
 # === Fonction de normalisation de NICAD ===
@@ -108,203 +146,439 @@ def normaliser_nicad(nicad_series):
     return nicad_series
 
 
-# === Afficher des informations de debug sur les NICADs ===
-def debug_nicad(df, nom_df):
-    print(f"\n🔍 Debug NICAD pour {nom_df}:")
-    if 'Nicad' in df.columns:
-        print(f"   ➤ Nombre de NICADs non-null: {df['Nicad'].notna().sum()}")
-        print(f"   ➤ Exemples de NICADs (premiers 5): {df['Nicad'].dropna().head(5).tolist()}")
-    else:
-        print(f"   ❌ Colonne 'Nicad' absente!")
-
-    # Examiner toutes les colonnes contenant des NICADs potentiels
-    nicad_candidates = [col for col in df.columns if 'nicad' in col.lower() or 'nica' in col.lower()]
-    for col in nicad_candidates:
-        if col != 'Nicad':
-            print(f"   ➤ Colonne potentielle '{col}': {df[col].notna().sum()} valeurs non-null")
-            print(f"   ➤ Exemples (premiers 5): {df[col].dropna().head(5).tolist()}")
-
-
-# === Examiner les colonnes d'un DataFrame ===
-def examiner_colonnes(df, nom_df):
-    print(f"\n📋 Colonnes de {nom_df}:")
-    print(f"   ➤ Nombre total de colonnes: {len(df.columns)}")
-    print(f"   ➤ Liste des colonnes: {df.columns.tolist()}")
-
-    # Extraire quelques statistiques sur les colonnes
-    for col in df.columns:
-        nb_not_null = df[col].notna().sum()
-        pct_not_null = 100 * nb_not_null / len(df) if len(df) > 0 else 0
-        print(f"   ➤ {col}: {nb_not_null}/{len(df)} valeurs non-null ({pct_not_null:.1f}%)")
-        if nb_not_null > 0:
-            # Afficher les premières valeurs non-null
-            values = df[col].dropna().head(3).tolist()
-            print(f"      Exemples: {values}")
-
-
-try:
-    # === Chemins des fichiers ===
-    print("🔍 Chargement des fichiers source...")
-    kobo_individuels = charger_fichier(
-        r"C:\Users\ASUS\Downloads\Enquete_Foncière-Parcelles_Individuelles_05052025.xlsx")
-    kobo_collectifs = charger_fichier(r"C:\Users\ASUS\Downloads\Enquete_Foncière-Parcelles_Collectives_05052025.xlsx")
-    urm_individuels = charger_fichier(
-        r"C:\Users\ASUS\Downloads\3.a Validation par URM\3.a Validation par URM\All NICADS\GPKG Merged\parcelles_individuelles_nicad_Lot5_32.xlsx")
-    urm_collectifs = charger_fichier(
-        r"C:\Users\ASUS\Downloads\3.a Validation par URM\3.a Validation par URM\All NICADS\GPKG Merged\parcelles_collectives_nicad_Lot5_32.xlsx")
-
-    ndoga_init_ind = charger_fichier(
-        r"C:\Users\ASUS\Downloads\VALIDATION_NICAD_BND Bon (1)\1.a.Topologie avec jointure (2)\parcelles_individuelles_1234.xlsx")
-    ndoga_init_col = charger_fichier(
-        r"C:\Users\ASUS\Downloads\VALIDATION_NICAD_BND Bon (1)\1.a.Topologie avec jointure (2)\parcelles_collectives_1234.xlsx")
-    ndoga_nicad_ind = charger_fichier(
-        r"C:\Users\ASUS\Downloads\VALIDATION_NICAD_BND Bon (1)\VALIDATION_NICAD\Ndoga_Individuelles_NICAD_LOT1_2_3_4.xlsx")
-    ndoga_nicad_col = charger_fichier(
-        r"C:\Users\ASUS\Downloads\VALIDATION_NICAD_BND Bon (1)\VALIDATION_NICAD\Ndoga_Collectives_NICAD_LOT1_2_3_4.xlsx")
-
-    # === Analyse des structures de fichiers ===
-    print("\n🔍 Analyse des structures de fichiers pour trouver les NICADs...")
-    examiner_colonnes(urm_individuels, "urm_individuels")
-    examiner_colonnes(urm_collectifs, "urm_collectifs")
-    examiner_colonnes(ndoga_nicad_ind, "ndoga_nicad_ind")
-    examiner_colonnes(ndoga_nicad_col, "ndoga_nicad_col")
-
-    # === Harmonisation des colonnes ===
-    print("\n🔍 Harmonisation des colonnes...")
-    df_kobo_ind = harmoniser_colonnes(kobo_individuels)
-    df_kobo_col = harmoniser_colonnes(kobo_collectifs)
-    df_urm_ind = harmoniser_colonnes(urm_individuels)
-    df_urm_col = harmoniser_colonnes(urm_collectifs)
-    df_ndoga_init_ind = harmoniser_colonnes(ndoga_init_ind)
-    df_ndoga_init_col = harmoniser_colonnes(ndoga_init_col)
-    df_ndoga_nicad_ind = harmoniser_colonnes(ndoga_nicad_ind)
-    df_ndoga_nicad_col = harmoniser_colonnes(ndoga_nicad_col)
-
-    print("\n🔍 Traitement des parcelles individuelles Kobo...")
-    df_kobo_ind = ajouter_nicad(df_kobo_ind, df_urm_ind)
-    df_kobo_ind = completer_attributs(df_kobo_ind, df_urm_ind, ['superficie', 'type_usag'])
-    df_kobo_ind['type_usa'] = "Non applicable"
-
-    print("\n🔍 Traitement des parcelles collectives Kobo...")
-    df_kobo_col = ajouter_nicad(df_kobo_col, df_urm_col)
-    df_kobo_col = completer_attributs(df_kobo_col, df_urm_col, ['superficie', 'type_usa'])
-    df_kobo_col['type_usag'] = "Non applicable"
-
-    print("\n🔍 Traitement des parcelles individuelles Ndoga...")
-    df_ndoga_init_ind = ajouter_nicad(df_ndoga_init_ind, df_ndoga_nicad_ind)
-    df_ndoga_init_ind = completer_attributs(
-        df_ndoga_init_ind, df_ndoga_nicad_ind,
-        ['superficie', 'type_usag'],
-        mapping_cols={'type_usag': 'typ_usage'}
-    )
-    df_ndoga_init_ind['type_usa'] = "Non applicable"
-
-    print("\n🔍 Traitement des parcelles collectives Ndoga...")
-    df_ndoga_init_col = ajouter_nicad(df_ndoga_init_col, df_ndoga_nicad_col)
-    df_ndoga_init_col = completer_attributs(
-        df_ndoga_init_col, df_ndoga_nicad_col,
-        ['superficie', 'type_usa'],
-        mapping_cols={'type_usa': 'typ_usage'}
+# === Profil des colonnes d'un DataFrame (optionnel, --profil-colonnes) ===
+def profiler_colonnes(df, nb_exemples=3, lignes_exemples=1000):
+    """
+    Taux de remplissage et quelques exemples de valeurs pour chaque colonne
+
+    Les comptes de valeurs non nulles sont vectorisés ; les exemples sont pris
+    dans les lignes_exemples premières lignes seulement.
+    """
+    non_nulles = df.notna().sum().to_numpy()
+    apercu = df.head(lignes_exemples)
+    colonnes = {}
+    for i, col in enumerate(df.columns):
+        exemples = apercu.iloc[:, i].dropna().head(nb_exemples).tolist()
+        colonnes[str(col)] = {
+            'non_nulles': int(non_nulles[i]),
+            'taux_remplissage': round(float(non_nulles[i]) / len(df), 4) if len(df) else 0.0,
+            'exemples': [str(valeur) for valeur in exemples]
+        }
+    return {'lignes': len(df), 'colonnes': colonnes}
+
+
+# === Configuration du pipeline ===
+CONFIG_DEFAUT = "prepare_data.json"
+CLES_LOT = ('nom', 'groupe', 'enquete', 'reference', 'attributs')
+# Variable d'environnement donnant la racine des classeurs sources (remplace la clé "racine")
+VARIABLE_RACINE_SOURCES = "PROCASEF_RACINE_SOURCES"
+
+
+def chemin_local(chemin) -> Path:
+    """Chemin de la configuration pour le système courant : / et \\ sont acceptés comme séparateurs"""
+    chemin = str(chemin)
+    if not PureWindowsPath(chemin).drive:
+        chemin = chemin.replace("\\", "/")
+    return Path(chemin).expanduser()
+
+
+def charger_config(chemin_config, racine=None):
+    """
+    Lit la configuration JSON du pipeline (sources, lots, dossier de sortie)
+
+    Les chemins relatifs des sources sont résolus par rapport à la racine :
+    l'argument racine (option --racine), sinon la variable d'environnement
+    PROCASEF_RACINE_SOURCES, sinon la clé "racine", sinon le dossier du fichier
+    de configuration (une racine relative l'est aussi par rapport à ce dossier).
+    dossier_sortie et dossier_cache (par défaut .cache dans le dossier de
+    sortie) restent relatifs au dossier courant.
+    """
+    chemin_config = Path(chemin_config)
+    config = json.loads(chemin_config.read_text(encoding="utf-8"))
+
+    for cle in ('lots', 'deliberations'):
+        if not config.get(cle):
+            raise ValueError(f"Configuration {chemin_config}: clé '{cle}' absente ou vide")
+    for lot in config['lots']:
+        manquantes = [cle for cle in CLES_LOT if cle not in lot]
+        if manquantes:
+            raise ValueError(f"Configuration {chemin_config}: lot {lot.get('nom', '?')} incomplet ({manquantes})")
+
+    racine = racine or os.environ.get(VARIABLE_RACINE_SOURCES) or config.get('racine')
+    racine = chemin_config.parent / chemin_local(racine) if racine else chemin_config.parent
+    config['racine'] = str(racine)
+
+    def resoudre(chemin):
+        return str(racine / chemin_local(chemin))
+
+    for lot in config['lots']:
+        lot['enquete'] = resoudre(lot['enquete'])
+        lot['reference'] = resoudre(lot['reference'])
+        lot.setdefault('mapping_colonnes', {})
+    config['deliberations'] = [resoudre(chemin) for chemin in config['deliberations']]
+    config['dossier_sortie'] = os.path.abspath(config.get('dossier_sortie', "resultat_export"))
+    config['dossier_cache'] = os.path.abspath(
+        config.get('dossier_cache') or os.path.join(config['dossier_sortie'], DOSSIER_CACHE_ETAPES)
     )
-    df_ndoga_init_col['type_usag'] = "Non applicable"
-
-    # === Fusions ===
-    print("\n🔍 Fusion des DataFrames...")
-    df_kobo_final = pd.concat([df_kobo_ind, df_kobo_col], ignore_index=True)
-    df_ndoga_final = pd.concat([df_ndoga_init_ind, df_ndoga_init_col], ignore_index=True)
-    df_global_final = pd.concat([df_kobo_final, df_ndoga_final], ignore_index=True)
-
-    # Debug après fusion
-    debug_nicad(df_global_final, "df_global_final après fusion")
-
-    # === Chargement des délibérations avec Nicad et Autorité ===
-    print("\n🔍 Chargement des fichiers de délibération...")
-    delib_indiv = pd.read_excel(r"C:\Users\ASUS\Downloads\Deliberation_bandafassi\Delib_Individuel.xlsx",
-                                dtype={'Nicad': str})
-    delib_collec = pd.read_excel(r"C:\Users\ASUS\Downloads\Deliberation_bandafassi\Delib_Collectif.xlsx",
-                                 dtype={'Nicad': str})
-
-    # Afficher les en-têtes pour vérifier les noms de colonnes
-    print(f"Colonnes dans delib_indiv: {delib_indiv.columns.tolist()}")
-    print(f"Colonnes dans delib_collec: {delib_collec.columns.tolist()}")
-
-    # Nombre de lignes dans chaque fichier de délibération
-    print(f"Nombre d'entrées delib_indiv: {len(delib_indiv)}")
-    print(f"Nombre d'entrées delib_collec: {len(delib_collec)}")
-
-    # Rechercher et afficher explicitement la colonne NICAD
-    nicad_col_indiv = [col for col in delib_indiv.columns if 'nicad' in col.lower()]
-    nicad_col_collec = [col for col in delib_collec.columns if 'nicad' in col.lower()]
-    print(f"Colonnes potentielles pour NICAD dans delib_indiv: {nicad_col_indiv}")
-    print(f"Colonnes potentielles pour NICAD dans delib_collec: {nicad_col_collec}")
-
-    # Trouver la colonne d'autorité
-    autorite_col_indiv = [col for col in delib_indiv.columns if 'autorit' in col.lower() or 'autor' in col.lower()]
-    autorite_col_collec = [col for col in delib_collec.columns if 'autorit' in col.lower() or 'autor' in col.lower()]
-    print(f"Colonnes potentielles pour Autorité dans delib_indiv: {autorite_col_indiv}")
-    print(f"Colonnes potentielles pour Autorité dans delib_collec: {autorite_col_collec}")
-
-    # Adaptation pour utiliser les bonnes colonnes trouvées
-    nicad_col_name_indiv = 'Nicad' if 'Nicad' in delib_indiv.columns else (
-        nicad_col_indiv[0] if nicad_col_indiv else None)
-    nicad_col_name_collec = 'Nicad' if 'Nicad' in delib_collec.columns else (
-        nicad_col_collec[0] if nicad_col_collec else None)
-    autorite_col_name_indiv = 'Autorité' if 'Autorité' in delib_indiv.columns else (
-        autorite_col_indiv[0] if autorite_col_indiv else None)
-    autorite_col_name_collec = 'Autorité' if 'Autorité' in delib_collec.columns else (
-        autorite_col_collec[0] if autorite_col_collec else None)
-
-    # Vérifier si nous avons trouvé les colonnes nécessaires
-    if not nicad_col_name_indiv or not nicad_col_name_collec:
-        print("❌ ERREUR: Impossible de trouver les colonnes NICAD dans les fichiers de délibération!")
-
-    if not autorite_col_name_indiv or not autorite_col_name_collec:
-        print("⚠️ AVERTISSEMENT: Impossible de trouver les colonnes Autorité dans les fichiers de délibération.")
-        autorite_col_name_indiv = autorite_col_name_indiv or "Autorité"  # Valeur par défaut
-        autorite_col_name_collec = autorite_col_name_collec or "Autorité"  # Valeur par défaut
-
-    # Renommer les colonnes pour standardisation
-    if nicad_col_name_indiv and nicad_col_name_indiv != 'Nicad':
-        delib_indiv = delib_indiv.rename(columns={nicad_col_name_indiv: 'Nicad'})
-    if nicad_col_name_collec and nicad_col_name_collec != 'Nicad':
-        delib_collec = delib_collec.rename(columns={nicad_col_name_collec: 'Nicad'})
-
-    if autorite_col_name_indiv and autorite_col_name_indiv != 'Autorité':
-        delib_indiv = delib_indiv.rename(columns={autorite_col_name_indiv: 'Autorité'})
-    if autorite_col_name_collec and autorite_col_name_collec != 'Autorité':
-        delib_collec = delib_collec.rename(columns={autorite_col_name_collec: 'Autorité'})
-
-    # Fusionner les délibérations
-    delib_global = pd.concat([delib_indiv, delib_collec], ignore_index=True)
-
-    # Debug des NICADs
-    debug_nicad(delib_global, "delib_global avant normalisation")
-    debug_nicad(df_global_final, "df_global_final avant normalisation")
+    return config
+
+
+# === Rapport d'exécution ===
+# À incrémenter quand la structure du rapport JSON change
+VERSION_RAPPORT = 1
+
+
+class CollecteurAvertissements(logging.Handler):
+    """Handler logging qui copie avertissements et erreurs dans le rapport, avec l'étape en cours"""
+
+    def __init__(self, rapport):
+        super().__init__(level=logging.WARNING)
+        self.rapport = rapport
+
+    def emit(self, record):
+        self.rapport.donnees['avertissements'].append({
+            'niveau': record.levelname,
+            'module': record.name,
+            'etape': self.rapport.pile[-1]['etape'] if self.rapport.pile else None,
+            'message': record.getMessage()
+        })
+
+
+class RapportExecution:
+    """Rapport structuré d'une exécution du pipeline, écrit en JSON
+
+    Chaque étape y consigne sa durée, son pic mémoire, ses lignes en entrée et
+    en sortie et son origine (calcul ou cache) ; les étapes imbriquées indiquent
+    leur parent. Les avertissements émis via logging pendant l'exécution sont
+    collectés automatiquement.
+
+    Le pic mémoire est mesuré sur demande par tracemalloc, dans le processus
+    principal seulement (les processus du pool n'y figurent pas) : tracer
+    chaque allocation ralentit nettement les étapes pandas et openpyxl.
+    """
+
+    def __init__(self, profil_colonnes: bool = False, mesurer_memoire: bool = False):
+        self.profil_colonnes = profil_colonnes
+        self.mesurer_memoire = mesurer_memoire
+        self.pile = []
+        self.pic_global = 0
+        self.debut = time.perf_counter()
+        self.collecteur = CollecteurAvertissements(self)
+        self.tracemalloc_demarre = False
+        self.donnees = {
+            'version': VERSION_RAPPORT,
+            'debut': datetime.now().isoformat(timespec='seconds'),
+            'fin': None,
+            'duree_s': None,
+            'statut': 'en_cours',
+            'erreur': None,
+            'etapes': [],
+            'rapprochements': {},
+            'deliberations': {},
+            'exports': {},
+            'controles': {},
+            'avertissements': [],
+            'memoire_pic_mo': None,
+            'profil_colonnes': {} if profil_colonnes else None
+        }
+
+    def demarrer(self, **contexte) -> "RapportExecution":
+        """Commence la collecte (avertissements, mémoire) et note le contexte d'exécution"""
+        self.donnees.update(contexte)
+        logging.getLogger().addHandler(self.collecteur)
+        if self.mesurer_memoire and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracemalloc_demarre = True
+        return self
+
+    def terminer(self, statut: str, erreur=None) -> None:
+        """Clôt le rapport et arrête la collecte"""
+        logging.getLogger().removeHandler(self.collecteur)
+        if tracemalloc.is_tracing():
+            self.pic_global = max(self.pic_global, tracemalloc.get_traced_memory()[1])
+            self.donnees['memoire_pic_mo'] = round(self.pic_global / 1e6, 1)
+        if self.tracemalloc_demarre:
+            tracemalloc.stop()
+        self.donnees.update({
+            'fin': datetime.now().isoformat(timespec='seconds'),
+            'duree_s': round(time.perf_counter() - self.debut, 3),
+            'statut': statut,
+            'erreur': str(erreur) if erreur else None
+        })
+
+    @staticmethod
+    def pic_memoire() -> int:
+        return tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+
+    @contextmanager
+    def etape(self, nom):
+        """Mesure une étape : durée, pic mémoire (étapes imbriquées comprises) et lignes"""
+        if self.pile:
+            self.pile[-1]['_pic'] = max(self.pile[-1]['_pic'], self.pic_memoire())
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+
+        mesure = {
+            'etape': nom,
+            'parent': self.pile[-1]['etape'] if self.pile else None,
+            'origine': 'calcul',
+            'lignes_entree': None,
+            'lignes_sortie': None,
+            '_pic': 0
+        }
+        self.pile.append(mesure)
+        debut = time.perf_counter()
+        try:
+            yield mesure
+        finally:
+            self.pile.pop()
+            pic = max(mesure.pop('_pic'), self.pic_memoire())
+            mesure['duree_s'] = round(time.perf_counter() - debut, 3)
+            mesure['memoire_pic_mo'] = round(pic / 1e6, 1) if tracemalloc.is_tracing() else None
+            self.donnees['etapes'].append(mesure)
+            self.pic_global = max(self.pic_global, pic)
+            if self.pile:
+                self.pile[-1]['_pic'] = max(self.pile[-1]['_pic'], pic)
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            logger.info(f"Étape {nom}: {mesure['origine']} en {mesure['duree_s']:.2f}s")
+
+    def noter_lignes(self, entree=None, sortie=None) -> None:
+        """Renseigne les lignes en entrée / en sortie de l'étape en cours"""
+        if not self.pile:
+            return
+        if entree is not None:
+            self.pile[-1]['lignes_entree'] = int(entree)
+        if sortie is not None:
+            self.pile[-1]['lignes_sortie'] = int(sortie)
+
+    def profiler(self, nom, df) -> None:
+        """Profil des colonnes d'une source, calculé seulement si le profilage est demandé"""
+        if self.profil_colonnes:
+            self.donnees['profil_colonnes'][nom] = profiler_colonnes(df)
+
+    def ecrire(self, chemin) -> None:
+        """Écrit le rapport JSON (écriture atomique)"""
+        chemin = Path(chemin)
+        chemin.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = chemin.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(self.donnees, indent=1, ensure_ascii=False, default=str), encoding="utf-8")
+        os.replace(tmp_path, chemin)
+
+
+def lignes(resultat):
+    """Nombre de lignes d'un résultat d'étape (DataFrame, ou tuple commençant par un DataFrame)"""
+    if isinstance(resultat, tuple) and resultat:
+        resultat = resultat[0]
+    return len(resultat) if isinstance(resultat, pd.DataFrame) else None
+
+
+# === Cache des étapes du pipeline ===
+# À incrémenter quand le traitement d'une étape change (invalide tout le cache)
+VERSION_ETAPES = 3
+DOSSIER_CACHE_ETAPES = ".cache"
+FICHIER_INDEX_SOURCES = "sources.json"
+FICHIER_ETAT_EXPORT = ".export.json"
+
+
+def cle_etape(*parties):
+    """Clé d'une étape : hash de ses entrées (empreintes, clés amont) et de ses paramètres"""
+    contenu = json.dumps([VERSION_ETAPES, *parties], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(contenu.encode("utf-8")).hexdigest()
+
+
+class CacheEtapes:
+    """Cache disque des résultats d'étapes, indexé par le hash de leurs entrées
+
+    Chaque étape est identifiée par un nom et une clé (cle_etape) qui dépend du
+    contenu des classeurs sources et des clés des étapes amont : modifier un seul
+    fichier de délibération ne relance que les étapes qui en dépendent.
+
+    Les résultats sont écrits en pickle plutôt qu'en Parquet : les colonnes
+    objet issues d'Excel mélangent souvent nombres et textes, et le pickle
+    restitue les DataFrames à l'identique. Le cache est local et jetable.
+    """
+
+    def __init__(self, dossier, actif: bool = True, rapport: RapportExecution = None):
+        self.dossier = Path(dossier)
+        self.actif = actif
+        self.rapport = rapport or RapportExecution()
+        self.index_sources = {}
+        if self.actif:
+            self.dossier.mkdir(parents=True, exist_ok=True)
+            chemin_index = self.dossier / FICHIER_INDEX_SOURCES
+            if chemin_index.exists():
+                try:
+                    self.index_sources = json.loads(chemin_index.read_text(encoding="utf-8"))
+                except ValueError:
+                    self.index_sources = {}
+
+    def empreinte_source(self, chemin):
+        """
+        Hash du contenu d'un classeur source
+
+        Le hash n'est recalculé que si la taille ou la date de modification du
+        fichier a changé depuis le dernier passage (comme les sidecars du tableau de bord).
+        """
+        empreinte = DataLoader.empreinte_fichier(chemin, avec_hash=False)
+        connue = self.index_sources.get(chemin)
+        if connue and connue['taille'] == empreinte['taille'] and connue['mtime_ns'] == empreinte['mtime_ns']:
+            return connue['sha256']
+
+        empreinte = DataLoader.empreinte_fichier(chemin)
+        self.index_sources[chemin] = empreinte
+        if self.actif:
+            (self.dossier / FICHIER_INDEX_SOURCES).write_text(json.dumps(self.index_sources, indent=1),
+                                                             encoding="utf-8")
+        return empreinte['sha256']
+
+    def chemin(self, nom, cle):
+        return self.dossier / f"{nom}.{cle[:16]}.pkl"
+
+    def contient(self, nom, cle):
+        return self.actif and self.chemin(nom, cle).exists()
+
+    def executer(self, nom, cle, calculer):
+        """
+        Retourne le résultat en cache de l'étape, ou le calcule avec calculer() et l'écrit
+
+        L'étape est mesurée dans le rapport d'exécution (origine cache ou calcul).
+        """
+        with self.rapport.etape(nom) as mesure:
+            if self.contient(nom, cle):
+                try:
+                    resultat = pd.read_pickle(self.chemin(nom, cle))
+                    mesure['origine'] = 'cache'
+                    self.rapport.noter_lignes(sortie=lignes(resultat))
+                    return resultat
+                except Exception as e:
+                    logger.warning(f"Cache illisible pour l'étape {nom}, recalcul: {e}")
+
+            resultat = calculer()
+            if self.actif:
+                # Écriture atomique, puis suppression des versions précédentes de l'étape
+                chemin = self.chemin(nom, cle)
+                tmp_path = chemin.with_suffix(f".{os.getpid()}.tmp")
+                pd.to_pickle(resultat, tmp_path)
+                os.replace(tmp_path, chemin)
+                for ancien in self.dossier.glob(f"{nom}.*.pkl"):
+                    if ancien != chemin:
+                        ancien.unlink(missing_ok=True)
+            self.rapport.noter_lignes(sortie=lignes(resultat))
+            return resultat
+
+
+def nom_etape_lot(lot):
+    return "lot_" + re.sub(r"\W+", "_", lot['nom']).strip("_").lower()
+
+
+# === Chargement parallèle des classeurs sources ===
+def charger_sources(chemins, max_workers=None):
+    """
+    Charge tous les classeurs sources en parallèle, un processus par classeur
+
+    Le parsing openpyxl étant limité par le GIL, seul un pool de processus
+    permet de lire plusieurs classeurs à la fois. Avec max_workers=1, les
+    classeurs sont lus à la suite dans le processus courant.
+
+    Returns:
+        dict: chemin -> DataFrame
+    """
+    chemins = list(dict.fromkeys(chemins))
+    if max_workers == 1 or len(chemins) <= 1:
+        return {chemin: charger_fichier(chemin) for chemin in chemins}
+
+    sources = {}
+    # "spawn" : même comportement sous Windows et Linux
+    contexte = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=contexte) as pool:
+        futures = {pool.submit(charger_fichier, chemin): chemin for chemin in chemins}
+        for future in as_completed(futures):
+            chemin = futures[future]
+            try:
+                sources[chemin] = future.result()
+            except Exception as e:
+                raise RuntimeError(f"Échec du chargement de {chemin}: {e}") from e
+            logger.info(f"Chargé {os.path.basename(chemin)}: {len(sources[chemin])} lignes")
+    return sources
+
+
+# === Traitement d'un lot enquête / référence ===
+def traiter_lot(lot, df_enquete, df_reference):
+    """
+    Harmonise un lot, marque les NICADs et complète ses attributs depuis la référence
+
+    Returns:
+        tuple: (DataFrame du lot, statistiques de rapprochement)
+    """
+    logger.info(f"Traitement du lot {lot['nom']}")
+    df_enquete = harmoniser_colonnes(df_enquete)
+    df_reference = harmoniser_colonnes(df_reference)
+
+    df_lot, stats = rapprocher_reference(df_enquete, df_reference, lot['attributs'],
+                                         mapping_cols=lot['mapping_colonnes'])
+    if lot.get('non_applicable'):
+        df_lot[lot['non_applicable']] = "Non applicable"
+    df_lot['_groupe'] = lot['groupe']
+    return df_lot, stats
+
+
+
+# === Préparation des délibérations ===
+def preparer_deliberations(deliberations):
+    """Standardise les colonnes Nicad / Autorité des fichiers de délibération et les concatène"""
+    standardisees = []
+    for chemin, delib in deliberations:
+        nom = os.path.basename(chemin)
+
+        # Rechercher explicitement les colonnes NICAD et Autorité
+        nicad_cols = [col for col in delib.columns if 'nicad' in col.lower()]
+        autorite_cols = [col for col in delib.columns if 'autorit' in col.lower() or 'autor' in col.lower()]
+        logger.debug(f"{nom}: {len(delib)} entrées, colonnes NICAD {nicad_cols}, colonnes Autorité {autorite_cols}")
+
+        nicad_col = 'Nicad' if 'Nicad' in delib.columns else (nicad_cols[0] if nicad_cols else None)
+        autorite_col = 'Autorité' if 'Autorité' in delib.columns else (autorite_cols[0] if autorite_cols else None)
+
+        if not nicad_col:
+            logger.error(f"Colonne NICAD introuvable dans le fichier de délibération {nom}")
+        if not autorite_col:
+            logger.warning(f"Colonne Autorité introuvable dans le fichier de délibération {nom}")
+
+        # Renommer les colonnes pour standardisation
+        renommage = {}
+        if nicad_col and nicad_col != 'Nicad':
+            renommage[nicad_col] = 'Nicad'
+        if autorite_col and autorite_col != 'Autorité':
+            renommage[autorite_col] = 'Autorité'
+        standardisees.append(delib.rename(columns=renommage))
+
+    delib_global = pd.concat(standardisees, ignore_index=True)
+    for col in ('Nicad', 'Autorité'):
+        if col not in delib_global.columns:
+            delib_global[col] = None
+    return delib_global
+
+
+# === Marquage des parcelles délibérées ===
+def marquer_deliberations(df_global_final, delib_global):
+    """
+    Ajoute les colonnes delibere / autorite_delib par jointure sur le NICAD normalisé
+
+    Returns:
+        tuple: (DataFrame marqué, statistiques de délibération)
+    """
+    nicads_renseignes_avant = int(df_global_final['Nicad'].notna().sum())
 
     # Normaliser les NICADs pour éviter les problèmes de correspondance
     delib_global['Nicad'] = normaliser_nicad(delib_global['Nicad'])
     df_global_final['Nicad'] = normaliser_nicad(df_global_final['Nicad'])
 
-    # Debug après normalisation
-    debug_nicad(delib_global, "delib_global après normalisation")
-    debug_nicad(df_global_final, "df_global_final après normalisation")
-
-    # Vérifier les NICADs communs pour débogage
-    nicads_delib = set(delib_global['Nicad'].dropna().unique())
-    nicads_global = set(df_global_final['Nicad'].dropna().unique())
-    nicads_communs = nicads_delib.intersection(nicads_global)
-    print(f"\n🧩 Analyse NICAD:")
-    print(f"   ➤ Nombre de NICADs uniques dans les délibérations: {len(nicads_delib)}")
-    print(f"   ➤ Nombre de NICADs uniques dans les parcelles: {len(nicads_global)}")
-    print(f"   ➤ Nombre de NICADs communs: {len(nicads_communs)}")
-
-    # Liste des NICADs communs (limité pour ne pas surcharger la sortie)
-    if nicads_communs:
-        print(f"   ➤ Exemples de NICADs communs: {list(nicads_communs)[:10]}")
+    # NICADs communs aux délibérations et aux parcelles
+    nicads_delib = pd.Index(delib_global['Nicad'].dropna().unique())
+    nicads_global = pd.Index(df_global_final['Nicad'].dropna().unique())
+    nb_communs = len(nicads_delib.intersection(nicads_global))
 
     # === CORRECTION: Double méthode pour marquer les parcelles délibérées ===
-    print("\n🔍 Ajout des informations de délibération...")
-
     # 1. Méthode 1: Par jointure sur NICAD (identique à avant, pour les parcelles avec NICAD)
     delib_subset = delib_global[['Nicad', 'Autorité']].dropna(subset=['Nicad']).rename(
         columns={'Autorité': 'autorite_delib'}
@@ -321,122 +595,438 @@ try:
     # Initialiser la colonne 'delibere' avec 'Non' par défaut
     df_merged['delibere'] = 'Non'
     # Marquer les parcelles trouvées dans la jointure comme 'Oui'
-    df_merged.loc[df_merged['merge_nicad'] == 'both', 'delibere'] = 'Oui'
+    par_jointure = df_merged['merge_nicad'] == 'both'
+    df_merged.loc[par_jointure, 'delibere'] = 'Oui'
 
     # 2. Méthode 2: Marquer également les parcelles ayant hasNicad="Oui" comme délibérées
     # CORRECTION MAJEURE: Prendre en compte les parcelles avec hasNicad="Oui"
+    par_has_nicad = pd.Series(False, index=df_merged.index)
     if 'hasNicad' in df_merged.columns:
-        print("   ➤ Utilisation de la colonne hasNicad pour les parcelles sans NICAD...")
         # Si pas déjà marqué comme délibéré ET a hasNicad="Oui", alors marquer comme délibéré
-        df_merged.loc[(df_merged['delibere'] == 'Non') & (df_merged['hasNicad'] == 'Oui'), 'delibere'] = 'Oui'
+        par_has_nicad = (df_merged['delibere'] == 'Non') & (df_merged['hasNicad'] == 'Oui')
+        df_merged.loc[par_has_nicad, 'delibere'] = 'Oui'
 
     # Supprimer la colonne indicatrice temporaire
-    if 'merge_nicad' in df_merged.columns:
-        df_merged.drop(columns=['merge_nicad'], inplace=True)
+    df_merged.drop(columns=['merge_nicad'], inplace=True)
 
     # Remplir les valeurs manquantes d'autorité
-    if 'autorite_delib' not in df_merged.columns:
-        df_merged['autorite_delib'] = "Non spécifié"
-    else:
-        df_merged['autorite_delib'] = df_merged['autorite_delib'].fillna("Non spécifié")
-
-    # === Afficher les stats des délibérations ===
-    parcelles_deliberees = df_merged[df_merged['delibere'] == 'Oui'].shape[0]
-    print(f"   ➤ Nombre de parcelles délibérées: {parcelles_deliberees}")
+    df_merged['autorite_delib'] = df_merged['autorite_delib'].fillna("Non spécifié")
+
+    # === Statistiques des délibérations ===
+    deliberees = df_merged['delibere'] == 'Oui'
+    stats = {
+        'entrees_deliberations': len(delib_global),
+        'nicads_deliberations': len(nicads_delib),
+        'nicads_parcelles': len(nicads_global),
+        'nicads_communs': nb_communs,
+        'taux_rapprochement_nicad': round(nb_communs / len(nicads_delib), 4) if len(nicads_delib) else 0.0,
+        'nicads_invalides_parcelles': nicads_renseignes_avant - int(df_global_final['Nicad'].notna().sum()),
+        'lignes_dupliquees_jointure': len(df_merged) - len(df_global_final),
+        'parcelles_deliberees': int(deliberees.sum()),
+        'deliberees_par_jointure': int(par_jointure.sum()),
+        'deliberees_par_has_nicad': int(par_has_nicad.sum()),
+        'deliberees_avec_nicad': int((deliberees & df_merged['Nicad'].notna()).sum()),
+        'deliberees_sans_nicad': int((deliberees & df_merged['Nicad'].isna()).sum())
+    }
+    logger.info(f"Délibérations: {stats['nicads_communs']}/{stats['nicads_deliberations']} NICADs rapprochés, "
+                f"{stats['parcelles_deliberees']} parcelles délibérées")
+    if stats['lignes_dupliquees_jointure']:
+        logger.warning(f"{stats['lignes_dupliquees_jointure']} lignes dupliquées par la jointure "
+                       f"(NICADs en double dans les délibérations)")
+
+    return df_merged, stats
+
+
+# === Colonnes finales à exporter ===
+COLONNES_FINALES = ["id_parcelle", "commune", "Village", "hasNicad", "superficie", "type_usag", "type_usa",
+                    "delibere", "autorite_delib", "Nicad"]
+
+
+# === Sortie principale Parquet, lue directement par le tableau de bord ===
+FICHIER_PARQUET = "parcelles.parquet"
+# Noms de colonnes attendus par data_loader.process_parcelles_data
+RENOMMAGE_TABLEAU_DE_BORD = {'hasNicad': 'nicad', 'Nicad': 'Numero Cadastral'}
+# Groupe de lots d'origine (kobo / ndoga), ajouté à la sortie Parquet
+COLONNE_SOURCE = 'source'
+# Texte d'origine des superficies non numériques (vides dans la colonne superficie du
+# Parquet), recopié tel quel dans les classeurs Excel
+COLONNE_SUPERFICIE_TEXTE = 'superficie_texte'
+
+# === Classeurs Excel livrés : fichier et filtre (colonne, valeur) sur la sortie Parquet ===
+EXPORTS_EXCEL = {
+    'kobo': ("parcelles_kobo.xlsx", (COLONNE_SOURCE, 'kobo')),
+    'ndoga': ("parcelles_ndoga.xlsx", (COLONNE_SOURCE, 'ndoga')),
+    'global': ("parcelles_fusionnées.xlsx", None),
+    'delib': ("parcelles_delibérées.xlsx", ('delibere', 'Oui'))
+}
+# Valeurs écrites dans les classeurs à la place des cellules vides
+VALEURS_MANQUANTES_EXCEL = {'superficie': "Non spécifié"}
+
+FICHIERS_EXPORT = {'parquet': FICHIER_PARQUET, **{cle: fichier for cle, (fichier, _) in EXPORTS_EXCEL.items()}}
+
+
+def export_a_jour(output_dir, cle_export):
+    """
+    Vrai si tous les fichiers exportés existent et correspondent à cle_export
+
+    Avec cle_export=None, vérifie seulement que tous les fichiers existent.
+    """
+    if not all(os.path.exists(os.path.join(output_dir, fichier)) for fichier in FICHIERS_EXPORT.values()):
+        return False
+    if cle_export is None:
+        return True
+    try:
+        etat = json.loads((Path(output_dir) / FICHIER_ETAT_EXPORT).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return False
+    return etat.get('cle') == cle_export
+
+
+def table_tableau_de_bord(df_export, groupes):
+    """
+    Parcelles au schéma du tableau de bord (colonnes nicad et Numero Cadastral)
+
+    La superficie est rendue numérique (les "Non spécifié" deviennent vides) et
+    les autres colonnes texte sont homogénéisées en chaînes pour Parquet. Les
+    autres superficies non numériques sont comptées dans les avertissements et
+    gardées dans COLONNE_SUPERFICIE_TEXTE pour être exportées telles quelles.
+    """
+    df = df_export.rename(columns=RENOMMAGE_TABLEAU_DE_BORD)
+    if 'superficie' in df.columns:
+        superficie = pd.to_numeric(df['superficie'], errors='coerce')
+        textes = (df['superficie'].notna() & superficie.isna()
+                  & (df['superficie'] != VALEURS_MANQUANTES_EXCEL['superficie'])).to_numpy()
+        if textes.any():
+            exemples = df['superficie'][textes].astype(str).drop_duplicates().head(5).tolist()
+            logger.warning(f"{int(textes.sum())} superficies non numériques (ex: {exemples}): "
+                           f"vides dans le Parquet, exportées telles quelles dans les classeurs")
+            df[COLONNE_SUPERFICIE_TEXTE] = df['superficie'].astype(str).where(textes)
+        df['superficie'] = superficie
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].astype(str).where(df[col].notna())
+    df[COLONNE_SOURCE] = groupes
+    return df
 
-    # Statistiques détaillées
-    parcelles_deliberees_avec_nicad = df_merged[(df_merged['delibere'] == 'Oui') & (df_merged['Nicad'].notna())].shape[
-        0]
-    parcelles_deliberees_sans_nicad = df_merged[(df_merged['delibere'] == 'Oui') & (df_merged['Nicad'].isna())].shape[0]
-    print(f"   ➤ Parcelles délibérées avec NICAD: {parcelles_deliberees_avec_nicad}")
-    print(f"   ➤ Parcelles délibérées sans NICAD: {parcelles_deliberees_sans_nicad}")
 
-    # === Colonnes finales à exporter ===
-    colonnes_finales = ["id_parcelle", "commune", "Village", "hasNicad", "superficie", "type_usag", "type_usa",
-                        "delibere", "autorite_delib", "Nicad"]
+def blocs_export(source, colonnes, filtre=None, taille_bloc=TAILLE_BLOC):
+    """
+    Blocs de lignes d'un classeur à exporter, lus dans la sortie Parquet
 
+    Le Parquet est lu par lots de taille_bloc lignes (un groupe de lignes à la
+    fois) ; source peut aussi être le DataFrame lui-même, sans pyarrow.
+    """
+    lues = colonnes + [filtre[0]] if filtre and filtre[0] not in colonnes else colonnes
+    if isinstance(source, pd.DataFrame):
+        blocs = (source.iloc[debut:debut + taille_bloc] for debut in range(0, len(source), taille_bloc))
+    else:
+        import pyarrow.parquet as pq
+        blocs = (lot.to_pandas() for lot in pq.ParquetFile(source).iter_batches(batch_size=taille_bloc, columns=lues))
+
+    for bloc in blocs:
+        if filtre:
+            bloc = bloc[bloc[filtre[0]] == filtre[1]]
+        yield bloc[colonnes]
+
+
+def ecrire_excel_flux(source, chemin, colonnes, filtre=None):
+    """
+    Écrit un classeur en mode write_only d'openpyxl, bloc par bloc, à mémoire constante
+
+    Les colonnes reprennent leurs noms d'origine (hasNicad, Nicad) ; les
+    superficies non numériques reprennent leur texte d'origine.
+
+    Returns:
+        int: nombre de lignes écrites
+    """
+    import openpyxl
+
+    noms_excel = {nouveau: ancien for ancien, nouveau in RENOMMAGE_TABLEAU_DE_BORD.items()}
+    classeur = openpyxl.Workbook(write_only=True)
+    feuille = classeur.create_sheet()
+    feuille.append([noms_excel.get(col, col) for col in colonnes if col != COLONNE_SUPERFICIE_TEXTE])
+
+    nb_lignes = 0
+    for bloc in blocs_export(source, colonnes, filtre):
+        if COLONNE_SUPERFICIE_TEXTE in bloc.columns:
+            textes = bloc.pop(COLONNE_SUPERFICIE_TEXTE)
+            bloc['superficie'] = bloc['superficie'].astype(object).where(textes.isna(), textes)
+        bloc = bloc.fillna({col: valeur for col, valeur in VALEURS_MANQUANTES_EXCEL.items() if col in bloc.columns})
+        for ligne in bloc.itertuples(index=False, name=None):
+            feuille.append([None if pd.isna(valeur) else valeur for valeur in ligne])
+        nb_lignes += len(bloc)
+
+    # Écriture atomique : un classeur partiel ne remplace jamais le précédent
+    tmp_path = f"{chemin}.{os.getpid()}.tmp"
+    classeur.save(tmp_path)
+    os.replace(tmp_path, chemin)
+    return nb_lignes
+
+
+# === Export Parquet et Excel ===
+def exporter(df_merged, output_dir, max_workers=None):
+    """
+    Écrit la sortie Parquet puis les classeurs kobo, ndoga, fusionné et délibéré
+
+    Les quatre classeurs sont des vues filtrées de la même sortie Parquet :
+    chaque processus du pool relit le fichier par blocs et écrit son classeur
+    en flux, sans copie des sous-ensembles dans le processus principal.
+
+    Returns:
+        tuple: (DataFrame exporté, lignes écrites par fichier)
+    """
     # Utiliser seulement les colonnes qui existent dans le dataframe
-    colonnes_disponibles = [col for col in colonnes_finales if col in df_merged.columns]
-    df_export = df_merged[colonnes_disponibles].copy()
+    colonnes_disponibles = [col for col in COLONNES_FINALES if col in df_merged.columns]
+    df_export = df_merged[colonnes_disponibles]
 
     # Créer les dossiers de destination si nécessaires
-    output_dir = os.path.join(os.getcwd(), "resultat_export")
     os.makedirs(output_dir, exist_ok=True)
+    # Invalider l'état du dernier export tant que les nouveaux fichiers ne sont pas écrits
+    Path(output_dir, FICHIER_ETAT_EXPORT).unlink(missing_ok=True)
+
+    df_tableau = table_tableau_de_bord(df_export, df_merged['_groupe'].to_numpy())
+    colonnes = [col for col in df_tableau.columns if col != COLONNE_SOURCE]
+
+    # Sortie principale : groupes de lignes de TAILLE_BLOC pour la relecture par blocs
+    source = df_tableau
+    parquet_path = os.path.join(output_dir, FICHIER_PARQUET)
+    if PARQUET_DISPONIBLE:
+        try:
+            tmp_path = f"{parquet_path}.{os.getpid()}.tmp"
+            df_tableau.to_parquet(tmp_path, index=False, row_group_size=TAILLE_BLOC)
+            os.replace(tmp_path, parquet_path)
+            source = parquet_path
+            logger.info(f"Fichier exporté: {parquet_path} ({len(df_tableau)} lignes)")
+        except Exception as e:
+            logger.error(f"Échec d'export de {parquet_path}: {e}")
+    else:
+        logger.warning(f"pyarrow absent: {parquet_path} non écrit")
+
+    taches = {
+        os.path.join(output_dir, fichier): filtre
+        for fichier, filtre in EXPORTS_EXCEL.values()
+    }
+    resultats = {}
+    if isinstance(source, str) and max_workers != 1:
+        # "spawn" : même comportement sous Windows et Linux ; seul le chemin du Parquet est transmis
+        contexte = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=contexte) as pool:
+            futures = {
+                pool.submit(ecrire_excel_flux, source, chemin, colonnes, filtre): chemin
+                for chemin, filtre in taches.items()
+            }
+            for future in as_completed(futures):
+                try:
+                    resultats[futures[future]] = future.result()
+                except Exception as e:
+                    resultats[futures[future]] = e
+    else:
+        for chemin, filtre in taches.items():
+            try:
+                resultats[chemin] = ecrire_excel_flux(source, chemin, colonnes, filtre)
+            except Exception as e:
+                resultats[chemin] = e
+
+    # Compte rendu pour chaque fichier
+    lignes_exportees = {FICHIER_PARQUET: len(df_tableau)} if isinstance(source, str) else {}
+    for chemin in taches:
+        if isinstance(resultats[chemin], Exception):
+            logger.error(f"Échec d'export de {chemin}: {resultats[chemin]}")
+        else:
+            logger.info(f"Fichier exporté: {chemin} ({resultats[chemin]} lignes)")
+            lignes_exportees[os.path.basename(chemin)] = resultats[chemin]
+
+    return df_export, lignes_exportees
+
+
+def controler_export(df_export):
+    """
+    Répartition NICAD / délibération de l'export, avec avertissement en cas d'incohérence
+
+    Returns:
+        dict: comptes par valeur de hasNicad, de delibere et par combinaison des deux
+    """
+    controles = {'delibere': {str(k): int(v) for k, v in df_export['delibere'].value_counts().items()}}
+    if 'hasNicad' not in df_export.columns:
+        return controles
+
+    controles['hasNicad'] = {str(k): int(v) for k, v in df_export['hasNicad'].value_counts().items()}
+    croisement = df_export.groupby(['hasNicad', 'delibere']).size()
+    controles['croisement'] = {f"hasNicad={n}, delibere={d}": int(v) for (n, d), v in croisement.items()}
+
+    # Incohérences potentielles
+    avec_nicad_non_delibere = int(croisement.get(('Oui', 'Non'), 0))
+    sans_nicad_delibere = int(croisement.get(('Non', 'Oui'), 0))
+    if avec_nicad_non_delibere > 0:
+        logger.warning(f"{avec_nicad_non_delibere} parcelles ont un NICAD mais ne sont pas marquées comme délibérées")
+    if sans_nicad_delibere > 0:
+        logger.warning(f"{sans_nicad_delibere} parcelles sans NICAD sont marquées comme délibérées")
+    return controles
+
+
+# === Pipeline complet ===
+def executer(config, max_workers=None, cache=None):
+    """
+    Exécute le pipeline décrit par la configuration et retourne le DataFrame exporté
+
+    Le pipeline est découpé en étapes nommées (un lot par paire enquête /
+    référence, les délibérations, le marquage puis l'export), mises en cache
+    par CacheEtapes. Les clés de toutes les étapes sont calculées d'abord, à
+    partir du contenu des classeurs : seuls les classeurs nécessaires aux
+    étapes à recalculer sont chargés, en parallèle.
+
+    Durées, lignes, taux de rapprochement et contrôles sont consignés dans le
+    rapport d'exécution du cache (cache.rapport).
+    """
+    lots = config['lots']
+    if cache is None:
+        cache = CacheEtapes(config['dossier_cache'])
+    rapport = cache.rapport
+
+    # === Clés des étapes ===
+    with rapport.etape('empreintes'):
+        cles_lots = {
+            lot['nom']: cle_etape('lot', lot, cache.empreinte_source(lot['enquete']),
+                                  cache.empreinte_source(lot['reference']))
+            for lot in lots
+        }
+        cle_deliberations = cle_etape('deliberations',
+                                      [cache.empreinte_source(chemin) for chemin in config['deliberations']])
+        cle_marquage = cle_etape('marquage', [cles_lots[lot['nom']] for lot in lots], cle_deliberations)
+        cle_export = cle_etape('export', cle_marquage, COLONNES_FINALES, FICHIERS_EXPORT)
+
+    # === Chargement des seuls fichiers source nécessaires ===
+    chemins = []
+    if not cache.contient('marquage', cle_marquage):
+        for lot in lots:
+            if not cache.contient(nom_etape_lot(lot), cles_lots[lot['nom']]):
+                chemins += [lot['enquete'], lot['reference']]
+        if not cache.contient('deliberations', cle_deliberations):
+            chemins += config['deliberations']
+
+    sources = {}
+    if chemins:
+        with rapport.etape('chargement'):
+            sources = charger_sources(chemins, max_workers=max_workers)
+            rapport.noter_lignes(sortie=sum(len(df) for df in sources.values()))
+            for chemin, df in sources.items():
+                rapport.profiler(os.path.basename(chemin), df)
+
+    def source(chemin):
+        # Un résultat en cache illisible est recalculé : ses classeurs n'ont pas été préchargés
+        if chemin not in sources:
+            logger.info(f"Chargement de {os.path.basename(chemin)} pour une étape recalculée")
+            sources.update(charger_sources([chemin], max_workers=1))
+            rapport.profiler(os.path.basename(chemin), sources[chemin])
+        return sources[chemin]
+
+    # === Harmonisation et traitement des lots ===
+    def calculer_lot(lot):
+        # Copies : un même classeur peut servir à plusieurs lots
+        df_enquete, df_reference = source(lot['enquete']), source(lot['reference'])
+        rapport.noter_lignes(entree=len(df_enquete) + len(df_reference))
+        return traiter_lot(lot, df_enquete.copy(), df_reference.copy())
+
+    def traiter_lots():
+        lots_traites = {
+            lot['nom']: cache.executer(nom_etape_lot(lot), cles_lots[lot['nom']],
+                                       lambda lot=lot: calculer_lot(lot))
+            for lot in lots
+        }
+        df_global_final = pd.concat([df_lot for df_lot, _ in lots_traites.values()], ignore_index=True)
+        return df_global_final, {nom: stats for nom, (_, stats) in lots_traites.items()}
 
-    # === Export Excel avec gestion des chemins ===
-    # Identifier les lignes de df_kobo_final et df_ndoga_final dans df_merged
-    kobo_indices = df_kobo_final.index
-    ndoga_indices = df_ndoga_final.index
-
-    # Extraire les sous-ensembles correspondants de df_merged
-    df_kobo_export = df_export[df_export.index.isin(kobo_indices)]
-    df_ndoga_export = df_export[df_export.index.isin(ndoga_indices)]
-
-    # Chemins de sortie
-    kobo_path = os.path.join(output_dir, "parcelles_kobo.xlsx")
-    ndoga_path = os.path.join(output_dir, "parcelles_ndoga.xlsx")
-    global_path = os.path.join(output_dir, "parcelles_fusionnées.xlsx")
-    delib_path = os.path.join(output_dir, "parcelles_delibérées.xlsx")
-
-    # Export avec try/except pour chaque fichier
-    try:
-        df_kobo_export.to_excel(kobo_path, index=False)
-        print(f"✅ Fichier exporté: {kobo_path}")
-    except Exception as e:
-        print(f"❌ Échec d'export de {kobo_path}: {e}")
+    # === Chargement des délibérations avec Nicad et Autorité ===
+    def traiter_deliberations():
+        deliberations = [(chemin, source(chemin)) for chemin in config['deliberations']]
+        rapport.noter_lignes(entree=sum(len(delib) for _, delib in deliberations))
+        return preparer_deliberations(deliberations)
+
+    # Les statistiques sont gardées avec le résultat du marquage : elles
+    # restent disponibles pour le rapport quand l'étape vient du cache
+    def calculer_marquage():
+        df_global_final, stats_lots = traiter_lots()
+        delib_global = cache.executer('deliberations', cle_deliberations, traiter_deliberations)
+        rapport.noter_lignes(entree=len(df_global_final))
+        df_merged, stats_delib = marquer_deliberations(df_global_final, delib_global)
+        return df_merged, {'rapprochements': stats_lots, 'deliberations': stats_delib}
+
+    df_merged, stats = cache.executer('marquage', cle_marquage, calculer_marquage)
+    rapport.donnees['rapprochements'] = stats['rapprochements']
+    rapport.donnees['deliberations'] = stats['deliberations']
+
+    # === Export ===
+    with rapport.etape('export') as mesure:
+        rapport.noter_lignes(entree=len(df_merged))
+        etat_export = Path(config['dossier_sortie']) / FICHIER_ETAT_EXPORT
+        if cache.actif and export_a_jour(config['dossier_sortie'], cle_export):
+            logger.info("Exports déjà à jour, aucun fichier réécrit")
+            mesure['origine'] = 'cache'
+            df_export = df_merged[[col for col in COLONNES_FINALES if col in df_merged.columns]]
+            lignes_exportees = json.loads(etat_export.read_text(encoding="utf-8")).get('lignes', {})
+        else:
+            df_export, lignes_exportees = exporter(df_merged, config['dossier_sortie'], max_workers=max_workers)
+            if cache.actif and export_a_jour(config['dossier_sortie'], None):
+                etat_export.write_text(json.dumps({'cle': cle_export, 'lignes': lignes_exportees}),
+                                       encoding="utf-8")
+        rapport.noter_lignes(sortie=len(df_export))
+        rapport.donnees['exports'] = lignes_exportees
 
-    try:
-        df_ndoga_export.to_excel(ndoga_path, index=False)
-        print(f"✅ Fichier exporté: {ndoga_path}")
-    except Exception as e:
-        print(f"❌ Échec d'export de {ndoga_path}: {e}")
+    rapport.donnees['controles'] = controler_export(df_export)
+    return df_export
 
-    try:
-        df_export.to_excel(global_path, index=False)
-        print(f"✅ Fichier exporté: {global_path}")
-    except Exception as e:
-        print(f"❌ Échec d'export de {global_path}: {e}")
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Prépare les exports de parcelles (Kobo, Ndoga, délibérations) pour le tableau de bord"
+    )
+    parser.add_argument("-c", "--config", default=CONFIG_DEFAUT,
+                        help=f"Fichier de configuration JSON (défaut: {CONFIG_DEFAUT})")
+    parser.add_argument("-o", "--sortie", help="Dossier de sortie (remplace dossier_sortie de la configuration)")
+    parser.add_argument("-r", "--racine",
+                        help=f"Dossier des classeurs sources (remplace {VARIABLE_RACINE_SOURCES} et la clé racine)")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="Nombre de processus de chargement (1 = séquentiel, défaut: nombre de cœurs)")
+    parser.add_argument("--sans-cache", action="store_true",
+                        help="Recalcule toutes les étapes sans lire ni écrire le cache")
+    parser.add_argument("--rapport",
+                        help=f"Rapport d'exécution JSON (défaut: <dossier_sortie>/{FICHIER_RAPPORT_PREPARATION})")
+    parser.add_argument("--profil-colonnes", action="store_true",
+                        help="Ajoute au rapport le profil des colonnes des classeurs chargés")
+    parser.add_argument("--memoire", action="store_true",
+                        help="Mesure le pic mémoire de chaque étape (tracemalloc, ralentit l'exécution)")
+    parser.add_argument("-v", "--verbeux", action="store_true", help="Affiche les messages de débogage")
+    args = parser.parse_args(argv)
+
+    # force : data_loader configure déjà le logging à son import
+    logging.basicConfig(level=logging.DEBUG if args.verbeux else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s", force=True)
+
+    rapport = RapportExecution(profil_colonnes=args.profil_colonnes, mesurer_memoire=args.memoire)
+    rapport.demarrer(config=os.path.abspath(args.config), workers=args.workers, cache=not args.sans_cache)
+    chemin_rapport = args.rapport
+    statut, erreur = 'echec', None
     try:
-        df_export[df_export["delibere"] == "Oui"].to_excel(delib_path, index=False)
-        print(f"✅ Fichier exporté: {delib_path}")
+        config = charger_config(args.config, racine=args.racine)
+        if args.sortie:
+            config['dossier_sortie'] = os.path.abspath(args.sortie)
+            config['dossier_cache'] = os.path.join(config['dossier_sortie'], DOSSIER_CACHE_ETAPES)
+        chemin_rapport = chemin_rapport or os.path.join(config['dossier_sortie'], FICHIER_RAPPORT_PREPARATION)
+        rapport.donnees['dossier_sortie'] = config['dossier_sortie']
+        rapport.donnees['racine_sources'] = config['racine']
+        executer(config, max_workers=args.workers,
+                 cache=CacheEtapes(config['dossier_cache'], actif=not args.sans_cache, rapport=rapport))
+        statut = 'succes'
     except Exception as e:
-        print(f"❌ Échec d'export de {delib_path}: {e}")
-
-    # === Résumé ===
-    print("\n✅ Export terminé !")
-    print(f"   ➤ parcelles_kobo.xlsx : {len(df_kobo_export)} lignes")
-    print(f"   ➤ parcelles_ndoga.xlsx : {len(df_ndoga_export)} lignes")
-    print(f"   ➤ parcelles_fusionnées.xlsx : {len(df_export)} lignes")
-    print(f"   ➤ parcelles_delibérées.xlsx : {len(df_export[df_export['delibere'] == 'Oui'])} lignes")
-
-    if 'hasNicad' in df_export.columns:
-        print(f"   Répartition NICAD (hasNicad) :\n{df_export['hasNicad'].value_counts().to_string()}")
-
-    print(f"   Répartition DELIBERE :\n{df_export['delibere'].value_counts().to_string()}")
-
-    # Vérification finale
-    if 'hasNicad' in df_export.columns:
-        avec_nicad_delibere = df_export[(df_export['hasNicad'] == 'Oui') & (df_export['delibere'] == 'Oui')].shape[0]
-        avec_nicad_non_delibere = df_export[(df_export['hasNicad'] == 'Oui') & (df_export['delibere'] == 'Non')].shape[
-            0]
-        sans_nicad_delibere = df_export[(df_export['hasNicad'] == 'Non') & (df_export['delibere'] == 'Oui')].shape[0]
-        sans_nicad_non_delibere = df_export[(df_export['hasNicad'] == 'Non') & (df_export['delibere'] == 'Non')].shape[
-            0]
-
-        print("\n🔍 Répartition détaillée:")
-        print(f"   ➤ hasNicad=Oui et delibere=Oui : {avec_nicad_delibere}")
-        print(f"   ➤ hasNicad=Oui et delibere=Non : {avec_nicad_non_delibere}")
-        print(f"   ➤ hasNicad=Non et delibere=Oui : {sans_nicad_delibere}")
-        print(f"   ➤ hasNicad=Non et delibere=Non : {sans_nicad_non_delibere}")
-
-        # Incohérences potentielles
-        if avec_nicad_non_delibere > 0:
-            print(f"\n⚠️ AVERTISSEMENT: {avec_nicad_non_delibere} parcelles ont un NICAD mais ne sont pas marquées comme délibérées!")
-        if sans_nicad_delibere > 0:
-            print(f"\n⚠️ AVERTISSEMENT: {sans_nicad_delibere} parcelles sans NICAD sont marquées comme délibérées!")
-
-except Exception as e:
-    print(f"\n❌ ERREUR: {str(e)}")
-    import traceback
-    traceback.print_exc()
\ No newline at end of file
+        logger.exception(f"Échec de la préparation des données: {e}")
+        erreur = e
+    finally:
+        rapport.terminer(statut, erreur)
+        if chemin_rapport:
+            rapport.ecrire(chemin_rapport)
+            logger.info(f"Rapport d'exécution écrit: {chemin_rapport}")
+    return 0 if statut == 'succes' else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,12 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import time
 
+from data_loader import registre_donnees
+from cache_figures import figure_en_cache
+
+# Jeux de données du registre (data_loader.registre_donnees) utilisés par cette page
+DATASETS_REQUIS = ('etapes',)
+
 
 def afficher_etat_avancement(df_etapes=None):
     """
@@ -139,10 +145,10 @@ def afficher_etat_avancement(df_etapes=None):
     with st.spinner("🔄 Chargement des données..."):
         time.sleep(0.5)
         if df_etapes is None:
-            df_etapes = charger_donnees_etapes()
-        else:
-            if "Progrès (%)" not in df_etapes.columns:
-                df_etapes["Progrès (%)"] = df_etapes["Progrès des étapes"].apply(evaluer_progres)
+            df_etapes = registre_donnees.charger_page(DATASETS_REQUIS)['etapes']
+        if "Progrès (%)" not in df_etapes.columns:
+            # assign : le DataFrame reçu est partagé entre les sessions, on n'y ajoute rien
+            df_etapes = df_etapes.assign(**{"Progrès (%)": df_etapes["Progrès des étapes"].apply(evaluer_progres)})
 
     region_sel, commune_sel, csig_sel, df_etapes_filtre = filtrer_donnees_moderne(df_etapes)
     afficher_legende_moderne()
@@ -155,24 +161,6 @@ def afficher_etat_avancement(df_etapes=None):
         afficher_details_communes_moderne(df_etapes_filtre)
 
 
-@st.cache_data
-def charger_donnees_etapes():
-    """
-    Charge et prépare les données d'état d'avancement
-    """
-    try:
-        df_etapes = pd.read_excel("data/Etat des opérations Boundou-Mai 2025.xlsx", engine="openpyxl")
-        df_etapes.fillna("", inplace=True)
-        df_etapes["Progrès (%)"] = df_etapes["Progrès des étapes"].apply(evaluer_progres)
-        return df_etapes
-    except FileNotFoundError:
-        st.error("Le fichier 'data/Etat des opérations Boundou-Mai 2025.xlsx' n'a pas été trouvé.")
-        return pd.DataFrame()
-    except Exception as e:
-        st.error(f"Erreur lors du chargement des données : {str(e)}")
-        return pd.DataFrame()
-
-
 def evaluer_progres(etapes):
     """
     Évalue le progrès d'une commune basé sur les étapes décrites
@@ -328,73 +316,80 @@ def afficher_graphiques_modernises(df_etapes):
     with col1:
         # Graphique d'avancement par région
         if "Région" in df_etapes.columns:
-            region_progress = df_etapes.groupby("Région")["Progrès (%)"].mean().reset_index()
+            def _figure_regions():
+                region_progress = df_etapes.groupby("Région")["Progrès (%)"].mean().reset_index()
             
-            fig_regions = px.bar(
-                region_progress,
-                x="Région",
-                y="Progrès (%)",
-                title="🌍 Progression par région",
-                color="Progrès (%)",
-                color_continuous_scale=["#FF6B6B", "#FF9500", "#FFD93D", "#6BCF7F"],
-                template="plotly_white"
-            )
+                fig_regions = px.bar(
+                    region_progress,
+                    x="Région",
+                    y="Progrès (%)",
+                    title="🌍 Progression par région",
+                    color="Progrès (%)",
+                    color_continuous_scale=["#FF6B6B", "#FF9500", "#FFD93D", "#6BCF7F"],
+                    template="plotly_white"
+                )
             
-            fig_regions.update_layout(
-                height=400,
-                title_font_size=16,
-                title_x=0.5,
-                showlegend=False,
-                xaxis_title="Région",
-                yaxis_title="Progrès (%)",
-                yaxis=dict(range=[0, 100])
-            )
+                fig_regions.update_layout(
+                    height=400,
+                    title_font_size=16,
+                    title_x=0.5,
+                    showlegend=False,
+                    xaxis_title="Région",
+                    yaxis_title="Progrès (%)",
+                    yaxis=dict(range=[0, 100])
+                )
             
-            fig_regions.update_traces(
-                hovertemplate="<b>%{x}</b><br>Progrès: %{y:.1f}%<extra></extra>",
-                texttemplate="%{y:.1f}%",
-                textposition="outside"
-            )
+                fig_regions.update_traces(
+                    hovertemplate="<b>%{x}</b><br>Progrès: %{y:.1f}%<extra></extra>",
+                    texttemplate="%{y:.1f}%",
+                    textposition="outside"
+                )
+                return fig_regions
+            fig_regions = figure_en_cache(df_etapes, "progression.regions", _figure_regions)
             
             st.plotly_chart(fig_regions, use_container_width=True)
     
     with col2:
         # Graphique en secteurs modernisé
-        df_etapes["Catégorie"] = pd.cut(
-            df_etapes["Progrès (%)"],
-            bins=[0, 0.1, 25, 50, 75, 100],
-            labels=["Non débutées", "Débutées", "En cours", "Avancées", "Terminées"]
-        )
+        def _figure_etats():
+            # Catégories calculées à part : le DataFrame est partagé via le cache
+            categories = pd.cut(
+                df_etapes["Progrès (%)"],
+                bins=[0, 0.1, 25, 50, 75, 100],
+                labels=["Non débutées", "Débutées", "En cours", "Avancées", "Terminées"]
+            )
         
-        resume = df_etapes["Catégorie"].value_counts().reset_index()
-        resume.columns = ["État", "Nombre"]
+            resume = categories.value_counts().reset_index()
+            resume.columns = ["État", "Nombre"]
         
-        fig_pie = px.pie(
-            resume,
-            values="Nombre",
-            names="État",
-            title="📈 Répartition des états",
-            color_discrete_map={
-                "Non débutées": "#FF6B6B",
-                "Débutées": "#FF9500",
-                "En cours": "#FFD93D",
-                "Avancées": "#6BCF7F",
-                "Terminées": "#4ECDC4"
-            },
-            template="plotly_white"
-        )
+            fig_pie = px.pie(
+                resume,
+                values="Nombre",
+                names="État",
+                title="📈 Répartition des états",
+                color_discrete_map={
+                    "Non débutées": "#FF6B6B",
+                    "Débutées": "#FF9500",
+                    "En cours": "#FFD93D",
+                    "Avancées": "#6BCF7F",
+                    "Terminées": "#4ECDC4"
+                },
+                template="plotly_white"
+            )
         
-        fig_pie.update_layout(
-            height=400,
-            title_font_size=16,
-            title_x=0.5
-        )
+            fig_pie.update_layout(
+                height=400,
+                title_font_size=16,
+                title_x=0.5
+            )
         
-        fig_pie.update_traces(
-            textposition="inside",
-            textinfo="percent+label",
-            hovertemplate="<b>%{label}</b><br>Nombre: %{value}<br>Pourcentage: %{percent}<extra></extra>"
-        )
+            fig_pie.update_traces(
+                textposition="inside",
+                textinfo="percent+label",
+                hovertemplate="<b>%{label}</b><br>Nombre: %{value}<br>Pourcentage: %{percent}<extra></extra>"
+            )
+            return fig_pie
+        fig_pie = figure_en_cache(df_etapes, "progression.etats", _figure_etats)
         
         st.plotly_chart(fig_pie, use_container_width=True)
 
@@ -501,39 +496,43 @@ def afficher_details_communes_moderne(df_etapes_filtre):
             
             with col1:
                 # Jauge de progrès modernisée
-                fig = go.Figure(go.Indicator(
-                    mode="gauge+number+delta",
-                    value=progress,
-                    domain={"x": [0, 1], "y": [0, 1]},
-                    title={"text": "Progrès", "font": {"size": 16}},
-                    delta={"reference": 100, "suffix": "%"},
-                    gauge={
-                        "axis": {"range": [None, 100], "tickwidth": 1},
-                        "bar": {"color": get_color_for_progress(progress)},
-                        "bgcolor": "white",
-                        "borderwidth": 2,
-                        "bordercolor": "gray",
-                        "steps": [
-                            {"range": [0, 25], "color": "rgba(255, 107, 107, 0.3)"},
-                            {"range": [25, 50], "color": "rgba(255, 149, 0, 0.3)"},
-                            {"range": [50, 75], "color": "rgba(255, 217, 61, 0.3)"},
-                            {"range": [75, 100], "color": "rgba(107, 207, 127, 0.3)"}
-                        ],
-                        "threshold": {
-                            "line": {"color": "red", "width": 4},
-                            "thickness": 0.75,
-                            "value": 90
+                def _figure_jauge():
+                    fig = go.Figure(go.Indicator(
+                        mode="gauge+number+delta",
+                        value=progress,
+                        domain={"x": [0, 1], "y": [0, 1]},
+                        title={"text": "Progrès", "font": {"size": 16}},
+                        delta={"reference": 100, "suffix": "%"},
+                        gauge={
+                            "axis": {"range": [None, 100], "tickwidth": 1},
+                            "bar": {"color": get_color_for_progress(progress)},
+                            "bgcolor": "white",
+                            "borderwidth": 2,
+                            "bordercolor": "gray",
+                            "steps": [
+                                {"range": [0, 25], "color": "rgba(255, 107, 107, 0.3)"},
+                                {"range": [25, 50], "color": "rgba(255, 149, 0, 0.3)"},
+                                {"range": [50, 75], "color": "rgba(255, 217, 61, 0.3)"},
+                                {"range": [75, 100], "color": "rgba(107, 207, 127, 0.3)"}
+                            ],
+                            "threshold": {
+                                "line": {"color": "red", "width": 4},
+                                "thickness": 0.75,
+                                "value": 90
+                            }
                         }
-                    }
-                ))
+                    ))
                 
-                fig.update_layout(
-                    height=300,
-                    margin=dict(l=20, r=20, t=50, b=20),
-                    paper_bgcolor="rgba(0,0,0,0)",
-                    plot_bgcolor="rgba(0,0,0,0)",
-                    font={"color": "#2c3e50", "family": "Arial"}
-                )
+                    fig.update_layout(
+                        height=300,
+                        margin=dict(l=20, r=20, t=50, b=20),
+                        paper_bgcolor="rgba(0,0,0,0)",
+                        plot_bgcolor="rgba(0,0,0,0)",
+                        font={"color": "#2c3e50", "family": "Arial"}
+                    )
+                    return fig
+                # La jauge ne dépend que du progrès : partagée entre communes au même niveau
+                fig = figure_en_cache(None, "progression.jauge_commune", _figure_jauge, progres=progress)
                 
                 st.plotly_chart(fig, use_container_width=True, key=f"gauge_{idx}")
             
@@ -7,13 +7,28 @@ import plotly.express as px
 from plotly.subplots import make_subplots
 import numpy as np
 
+from data_loader import (
+    registre_donnees,
+    data_loader,
+    process_projections_data,
+    FICHIER_PROJECTIONS
+)
+from cache_figures import figure_en_cache
+
+# Jeux de données du registre utilisés par cette page
+DATASETS_REQUIS = ('projections',)
+
 
-@st.cache_data
 def charger_projections():
-    df = pd.read_excel("projections/Projections 2025.xlsx", engine="openpyxl")
-    # Nettoyage des noms de colonnes
-    df.columns = df.columns.str.strip().str.lower()
-    return df
+    # Nettoyage des noms de colonnes dans process_projections_data ;
+    # rechargé en arrière-plan quand le classeur change
+    return data_loader.cache_donnees.obtenir(
+        'projections', [FICHIER_PROJECTIONS],
+        lambda: data_loader.parse_excel(FICHIER_PROJECTIONS, process_projections_data)
+    )
+
+
+registre_donnees.declarer('projections', charger_projections)
 
 
 def afficher_projections_2025():
@@ -263,7 +278,8 @@ def afficher_projections_2025():
     </div>
     """, unsafe_allow_html=True)
 
-    df = charger_projections()
+    # Jeu de données source : son empreinte sert de clé au cache de figures
+    df_source = registre_donnees.charger_page(DATASETS_REQUIS)['projections']
 
     # Tentative intelligente de renommage automatique
     colonnes_cibles = {
@@ -277,13 +293,13 @@ def afficher_projections_2025():
     }
 
     colonnes_renommees = {}
-    for col in df.columns:
+    for col in df_source.columns:
         for cle in colonnes_cibles:
             if cle in col:
                 colonnes_renommees[col] = colonnes_cibles[cle]
                 break
 
-    df = df.rename(columns=colonnes_renommees)
+    df = df_source.rename(columns=colonnes_renommees)
 
     colonnes_obligatoires = ["mois", "realises", "objectif_mensuel", "objectif_total"]
     for col in colonnes_obligatoires:
@@ -341,96 +357,102 @@ def afficher_projections_2025():
     
     with col1:
         # Graphique de progression moderne
-        fig_progress = go.Figure()
+        def _figure_progression():
+            fig_progress = go.Figure()
         
-        # Barre de progression de base
-        fig_progress.add_trace(go.Bar(
-            y=['Progression'],
-            x=[100],
-            orientation='h',
-            marker_color='rgba(108, 123, 138, 0.2)',
-            showlegend=False,
-            name='Objectif'
-        ))
+            # Barre de progression de base
+            fig_progress.add_trace(go.Bar(
+                y=['Progression'],
+                x=[100],
+                orientation='h',
+                marker_color='rgba(108, 123, 138, 0.2)',
+                showlegend=False,
+                name='Objectif'
+            ))
         
-        # Barre de progression actuelle
-        fig_progress.add_trace(go.Bar(
-            y=['Progression'],
-            x=[min(progression_pct, 100)],
-            orientation='h',
-            marker_color='rgba(255, 215, 0, 0.9)',
-            showlegend=False,
-            name='Réalisé'
-        ))
+            # Barre de progression actuelle
+            fig_progress.add_trace(go.Bar(
+                y=['Progression'],
+                x=[min(progression_pct, 100)],
+                orientation='h',
+                marker_color='rgba(255, 215, 0, 0.9)',
+                showlegend=False,
+                name='Réalisé'
+            ))
         
-        # Annotations
-        fig_progress.add_annotation(
-            x=progression_pct/2,
-            y=0,
-            text=f"<b>{progression_pct:.1f}%</b>",
-            showarrow=False,
-            font=dict(size=18, color='#0F1B2E', family='Poppins'),
-            bgcolor='rgba(255,255,255,0.8)',
-            bordercolor='#FFD700',
-            borderwidth=2
-        )
+            # Annotations
+            fig_progress.add_annotation(
+                x=progression_pct/2,
+                y=0,
+                text=f"<b>{progression_pct:.1f}%</b>",
+                showarrow=False,
+                font=dict(size=18, color='#0F1B2E', family='Poppins'),
+                bgcolor='rgba(255,255,255,0.8)',
+                bordercolor='#FFD700',
+                borderwidth=2
+            )
         
-        fig_progress.update_layout(
-            title=dict(
-                text="<b>Progression vers l'Objectif 2025</b>",
-                font=dict(size=20, color='#FFD700', family='Poppins')
-            ),
-            xaxis=dict(
-                range=[0, 100],
-                showgrid=False,
-                showticklabels=True,
-                tickfont=dict(color='#FFD700'),
-                title=dict(text="Pourcentage (%)", font=dict(color='#FFD700'))
-            ),
-            yaxis=dict(
-                showgrid=False,
-                showticklabels=False
-            ),
-            height=200,
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            margin=dict(l=10, r=10, t=60, b=40)
-        )
+            fig_progress.update_layout(
+                title=dict(
+                    text="<b>Progression vers l'Objectif 2025</b>",
+                    font=dict(size=20, color='#FFD700', family='Poppins')
+                ),
+                xaxis=dict(
+                    range=[0, 100],
+                    showgrid=False,
+                    showticklabels=True,
+                    tickfont=dict(color='#FFD700'),
+                    title=dict(text="Pourcentage (%)", font=dict(color='#FFD700'))
+                ),
+                yaxis=dict(
+                    showgrid=False,
+                    showticklabels=False
+                ),
+                height=200,
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                margin=dict(l=10, r=10, t=60, b=40)
+            )
+            return fig_progress
+        fig_progress = figure_en_cache(df_source, "projections.progression", _figure_progression)
         
         st.plotly_chart(fig_progress, use_container_width=True)
     
     with col2:
         # Jauge circulaire moderne
-        fig_gauge = go.Figure(go.Indicator(
-            mode = "gauge+number+delta",
-            value = progression_pct,
-            delta = {'reference': 100, 'increasing': {'color': "#28a745"}},
-            gauge = {
-                'axis': {'range': [None, 100], 'tickcolor': "#FFD700"},
-                'bar': {'color': "#FFD700"},
-                'bgcolor': "rgba(255,255,255,0.1)",
-                'borderwidth': 2,
-                'bordercolor': "#FFD700",
-                'steps': [
-                    {'range': [0, 50], 'color': 'rgba(220, 53, 69, 0.3)'},
-                    {'range': [50, 80], 'color': 'rgba(255, 193, 7, 0.3)'},
-                    {'range': [80, 100], 'color': 'rgba(40, 167, 69, 0.3)'}
-                ],
-                'threshold': {
-                    'line': {'color': "red", 'width': 4},
-                    'thickness': 0.75,
-                    'value': 90
-                }
-            },
-            title = {'text': "<b>Performance</b>", 'font': {'color': '#FFD700', 'size': 16}}
-        ))
+        def _figure_jauge():
+            fig_gauge = go.Figure(go.Indicator(
+                mode = "gauge+number+delta",
+                value = progression_pct,
+                delta = {'reference': 100, 'increasing': {'color': "#28a745"}},
+                gauge = {
+                    'axis': {'range': [None, 100], 'tickcolor': "#FFD700"},
+                    'bar': {'color': "#FFD700"},
+                    'bgcolor': "rgba(255,255,255,0.1)",
+                    'borderwidth': 2,
+                    'bordercolor': "#FFD700",
+                    'steps': [
+                        {'range': [0, 50], 'color': 'rgba(220, 53, 69, 0.3)'},
+                        {'range': [50, 80], 'color': 'rgba(255, 193, 7, 0.3)'},
+                        {'range': [80, 100], 'color': 'rgba(40, 167, 69, 0.3)'}
+                    ],
+                    'threshold': {
+                        'line': {'color': "red", 'width': 4},
+                        'thickness': 0.75,
+                        'value': 90
+                    }
+                },
+                title = {'text': "<b>Performance</b>", 'font': {'color': '#FFD700', 'size': 16}}
+            ))
         
-        fig_gauge.update_layout(
-            height=300,
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font={'color': "#FFD700", 'family': "Poppins"}
-        )
+            fig_gauge.update_layout(
+                height=300,
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                font={'color': "#FFD700", 'family': "Poppins"}
+            )
+            return fig_gauge
+        fig_gauge = figure_en_cache(df_source, "projections.jauge", _figure_jauge)
         
         st.plotly_chart(fig_gauge, use_container_width=True)
 
@@ -457,70 +479,73 @@ def afficher_projections_2025():
     # Graphique en barres avec design moderne
     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
     
-    fig_bar = go.Figure()
-    
-    # Couleurs inspirées du logo
-    colors_realises = ['#FFD700', '#FFA500', '#FF8C00', '#FF6B35', '#E55100']
-    colors_objectif = ['#1A2B47', '#243B5C', '#2E4A71', '#385986', '#42689B']
-    
-    fig_bar.add_trace(go.Bar(
-        x=df["mois"],
-        y=df["realises"],
-        name="Inventaires Réalisés",
-        marker_color=colors_realises[0],
-        text=df["realises"],
-        textposition='auto',
-        textfont=dict(color='white', size=12, family='Poppins'),
-        hovertemplate='<b>%{x}</b><br>Réalisés: %{y:,}<br><extra></extra>',
-        marker_line_color='white',
-        marker_line_width=2
-    ))
-    
-    fig_bar.add_trace(go.Bar(
-        x=df["mois"],
-        y=df["objectif_mensuel"],
-        name="Objectif Technique",
-        marker_color=colors_objectif[0],
-        text=df["objectif_mensuel"],
-        textposition='auto',
-        textfont=dict(color='white', size=12, family='Poppins'),
-        hovertemplate='<b>%{x}</b><br>Objectif: %{y:,}<br><extra></extra>',
-        marker_line_color='white',
-        marker_line_width=2
-    ))
-    
-    fig_bar.update_layout(
-        title=dict(
-            text="<b>Performance Mensuelle des Inventaires Techniques</b>",
-            font=dict(size=20, color='#1A2B47', family='Poppins'),
-            x=0.5
-        ),
-        xaxis=dict(
-            title=dict(text="<b>Période</b>", font=dict(color='#1A2B47', size=14)),
-            tickfont=dict(color='#1A2B47', size=12),
-            gridcolor='rgba(26, 43, 71, 0.1)'
-        ),
-        yaxis=dict(
-            title=dict(text="<b>Nombre d'Inventaires</b>", font=dict(color='#1A2B47', size=14)),
-            tickfont=dict(color='#1A2B47', size=12),
-            gridcolor='rgba(26, 43, 71, 0.1)'
-        ),
-        barmode='group',
-        height=500,
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        font=dict(family="Poppins", color='#1A2B47'),
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="center",
-            x=0.5,
-            bgcolor='rgba(255,255,255,0.8)',
-            bordercolor='rgba(255,215,0,0.5)',
-            borderwidth=1
+    def _figure_performance():
+        fig_bar = go.Figure()
+    
+        # Couleurs inspirées du logo
+        colors_realises = ['#FFD700', '#FFA500', '#FF8C00', '#FF6B35', '#E55100']
+        colors_objectif = ['#1A2B47', '#243B5C', '#2E4A71', '#385986', '#42689B']
+    
+        fig_bar.add_trace(go.Bar(
+            x=df["mois"],
+            y=df["realises"],
+            name="Inventaires Réalisés",
+            marker_color=colors_realises[0],
+            text=df["realises"],
+            textposition='auto',
+            textfont=dict(color='white', size=12, family='Poppins'),
+            hovertemplate='<b>%{x}</b><br>Réalisés: %{y:,}<br><extra></extra>',
+            marker_line_color='white',
+            marker_line_width=2
+        ))
+    
+        fig_bar.add_trace(go.Bar(
+            x=df["mois"],
+            y=df["objectif_mensuel"],
+            name="Objectif Technique",
+            marker_color=colors_objectif[0],
+            text=df["objectif_mensuel"],
+            textposition='auto',
+            textfont=dict(color='white', size=12, family='Poppins'),
+            hovertemplate='<b>%{x}</b><br>Objectif: %{y:,}<br><extra></extra>',
+            marker_line_color='white',
+            marker_line_width=2
+        ))
+    
+        fig_bar.update_layout(
+            title=dict(
+                text="<b>Performance Mensuelle des Inventaires Techniques</b>",
+                font=dict(size=20, color='#1A2B47', family='Poppins'),
+                x=0.5
+            ),
+            xaxis=dict(
+                title=dict(text="<b>Période</b>", font=dict(color='#1A2B47', size=14)),
+                tickfont=dict(color='#1A2B47', size=12),
+                gridcolor='rgba(26, 43, 71, 0.1)'
+            ),
+            yaxis=dict(
+                title=dict(text="<b>Nombre d'Inventaires</b>", font=dict(color='#1A2B47', size=14)),
+                tickfont=dict(color='#1A2B47', size=12),
+                gridcolor='rgba(26, 43, 71, 0.1)'
+            ),
+            barmode='group',
+            height=500,
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)',
+            font=dict(family="Poppins", color='#1A2B47'),
+            legend=dict(
+                orientation="h",
+                yanchor="bottom",
+                y=1.02,
+                xanchor="center",
+                x=0.5,
+                bgcolor='rgba(255,255,255,0.8)',
+                bordercolor='rgba(255,215,0,0.5)',
+                borderwidth=1
+            )
         )
-    )
+        return fig_bar
+    fig_bar = figure_en_cache(df_source, "projections.performance_mensuelle", _figure_performance)
     
     st.plotly_chart(fig_bar, use_container_width=True)
     st.markdown('</div>', unsafe_allow_html=True)
@@ -528,53 +553,56 @@ def afficher_projections_2025():
     # Graphique d'évolution cumulative
     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
     
-    fig_area = go.Figure()
-    
-    # Zone d'objectif avec gradient
-    fig_area.add_trace(go.Scatter(
-        x=df["mois"],
-        y=df["objectif_total"],
-        fill='tozeroy',
-        mode='lines+markers',
-        name='Objectif Cumulé',
-        line=dict(color='#1A2B47', width=4),
-        fillcolor='rgba(26, 43, 71, 0.2)',
-        marker=dict(size=8, color='#1A2B47', line=dict(width=2, color='white')),
-        hovertemplate='<b>%{x}</b><br>Objectif: %{y:,}<br><extra></extra>'
-    ))
-    
-    # Ligne des réalisés
-    fig_area.add_hline(
-        y=realises_total,
-        line_dash="dash",
-        line_color="#FFD700",
-        line_width=4,
-        annotation_text=f"<b>Réalisés: {realises_total:,}</b>",
-        annotation_position="top right",
-        annotation_font=dict(size=14, color='#FFD700', family='Poppins')
-    )
+    def _figure_evolution():
+        fig_area = go.Figure()
+    
+        # Zone d'objectif avec gradient
+        fig_area.add_trace(go.Scatter(
+            x=df["mois"],
+            y=df["objectif_total"],
+            fill='tozeroy',
+            mode='lines+markers',
+            name='Objectif Cumulé',
+            line=dict(color='#1A2B47', width=4),
+            fillcolor='rgba(26, 43, 71, 0.2)',
+            marker=dict(size=8, color='#1A2B47', line=dict(width=2, color='white')),
+            hovertemplate='<b>%{x}</b><br>Objectif: %{y:,}<br><extra></extra>'
+        ))
     
-    fig_area.update_layout(
-        title=dict(
-            text="<b>Évolution Cumulative des Objectifs Techniques</b>",
-            font=dict(size=20, color='#1A2B47', family='Poppins'),
-            x=0.5
-        ),
-        xaxis=dict(
-            title=dict(text="<b>Période</b>", font=dict(color='#1A2B47', size=14)),
-            tickfont=dict(color='#1A2B47', size=12),
-            gridcolor='rgba(26, 43, 71, 0.1)'
-        ),
-        yaxis=dict(
-            title=dict(text="<b>Nombre d'Inventaires</b>", font=dict(color='#1A2B47', size=14)),
-            tickfont=dict(color='#1A2B47', size=12),
-            gridcolor='rgba(26, 43, 71, 0.1)'
-        ),
-        height=400,
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        font=dict(family="Poppins", color='#1A2B47')
-    )
+        # Ligne des réalisés
+        fig_area.add_hline(
+            y=realises_total,
+            line_dash="dash",
+            line_color="#FFD700",
+            line_width=4,
+            annotation_text=f"<b>Réalisés: {realises_total:,}</b>",
+            annotation_position="top right",
+            annotation_font=dict(size=14, color='#FFD700', family='Poppins')
+        )
+    
+        fig_area.update_layout(
+            title=dict(
+                text="<b>Évolution Cumulative des Objectifs Techniques</b>",
+                font=dict(size=20, color='#1A2B47', family='Poppins'),
+                x=0.5
+            ),
+            xaxis=dict(
+                title=dict(text="<b>Période</b>", font=dict(color='#1A2B47', size=14)),
+                tickfont=dict(color='#1A2B47', size=12),
+                gridcolor='rgba(26, 43, 71, 0.1)'
+            ),
+            yaxis=dict(
+                title=dict(text="<b>Nombre d'Inventaires</b>", font=dict(color='#1A2B47', size=14)),
+                tickfont=dict(color='#1A2B47', size=12),
+                gridcolor='rgba(26, 43, 71, 0.1)'
+            ),
+            height=400,
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)',
+            font=dict(family="Poppins", color='#1A2B47')
+        )
+        return fig_area
+    fig_area = figure_en_cache(df_source, "projections.evolution_cumulative", _figure_evolution)
     
     st.plotly_chart(fig_area, use_container_width=True)
     st.markdown('</div>', unsafe_allow_html=True)
@@ -585,42 +613,45 @@ def afficher_projections_2025():
     # Calcul du pourcentage de réalisation par mois
     df['perf_pct'] = (df['realises'] / df['objectif_mensuel'] * 100).fillna(0)
     
-    fig_radar = go.Figure()
-    
-    fig_radar.add_trace(go.Scatterpolar(
-        r=df['perf_pct'],
-        theta=df['mois'],
-        fill='toself',
-        name='Performance Technique (%)',
-        line=dict(color='#FFD700', width=3),
-        fillcolor='rgba(255, 215, 0, 0.3)',
-        marker=dict(size=8, color='#FFD700', line=dict(width=2, color='white'))
-    ))
-    
-    fig_radar.update_layout(
-        polar=dict(
-            radialaxis=dict(
-                visible=True,
-                range=[0, max(df['perf_pct'].max() * 1.1, 100)],
-                tickfont=dict(color='#1A2B47', size=10),
-                gridcolor='rgba(26, 43, 71, 0.2)'
+    def _figure_radar():
+        fig_radar = go.Figure()
+    
+        fig_radar.add_trace(go.Scatterpolar(
+            r=df['perf_pct'],
+            theta=df['mois'],
+            fill='toself',
+            name='Performance Technique (%)',
+            line=dict(color='#FFD700', width=3),
+            fillcolor='rgba(255, 215, 0, 0.3)',
+            marker=dict(size=8, color='#FFD700', line=dict(width=2, color='white'))
+        ))
+    
+        fig_radar.update_layout(
+            polar=dict(
+                radialaxis=dict(
+                    visible=True,
+                    range=[0, max(df['perf_pct'].max() * 1.1, 100)],
+                    tickfont=dict(color='#1A2B47', size=10),
+                    gridcolor='rgba(26, 43, 71, 0.2)'
+                ),
+                angularaxis=dict(
+                    tickfont=dict(color='#1A2B47', size=12, family='Poppins'),
+                    gridcolor='rgba(26, 43, 71, 0.2)'
+                ),
+                bgcolor='rgba(0,0,0,0)'
             ),
-            angularaxis=dict(
-                tickfont=dict(color='#1A2B47', size=12, family='Poppins'),
-                gridcolor='rgba(26, 43, 71, 0.2)'
+            title=dict(
+                text="<b>Performance Technique par Période</b>",
+                font=dict(size=20, color='#1A2B47', family='Poppins'),
+                x=0.5
             ),
-            bgcolor='rgba(0,0,0,0)'
-        ),
-        title=dict(
-            text="<b>Performance Technique par Période</b>",
-            font=dict(size=20, color='#1A2B47', family='Poppins'),
-            x=0.5
-        ),
-        height=500,
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        font=dict(family="Poppins", color='#1A2B47')
-    )
+            height=500,
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)',
+            font=dict(family="Poppins", color='#1A2B47')
+        )
+        return fig_radar
+    fig_radar = figure_en_cache(df_source, "projections.radar", _figure_radar)
     
     st.plotly_chart(fig_radar, use_container_width=True)
     st.markdown('</div>', unsafe_allow_html=True)
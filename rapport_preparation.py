@@ -0,0 +1,149 @@
+import os
+import json
+import logging
+
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+
+from data_loader import registre_donnees, data_loader, FICHIER_RAPPORT_PREPARATION
+from cache_figures import figure_en_cache
+
+logger = logging.getLogger(__name__)
+
+# Jeux de données du registre utilisés par cette page
+DATASETS_REQUIS = ('rapport_preparation',)
+
+# Chemin explicite du rapport ; sinon, le plus récent trouvé dans le projet
+VARIABLE_CHEMIN_RAPPORT = "PROCASEF_RAPPORT_PREPARATION"
+
+LIBELLES_STATUT = {'succes': "✅ Succès", 'echec': "❌ Échec", 'en_cours': "⏳ En cours"}
+
+
+def chemin_rapport_preparation():
+    """Chemin du dernier rapport d'exécution de prepare_data, ou None"""
+    chemin = os.environ.get(VARIABLE_CHEMIN_RAPPORT)
+    if chemin:
+        return chemin if os.path.isfile(chemin) else None
+    data_loader.manifest.rafraichir()
+    chemin = data_loader.manifest.plus_recent(FICHIER_RAPPORT_PREPARATION)
+    return str(chemin) if chemin else None
+
+
+def _lire_rapport(chemin):
+    with open(chemin, encoding="utf-8") as fichier:
+        return json.load(fichier)
+
+
+def charger_rapport_preparation():
+    """Charge le dernier rapport JSON (rechargé en arrière-plan quand il est réécrit)"""
+    chemin = chemin_rapport_preparation()
+    if chemin is None:
+        return None
+    try:
+        return data_loader.cache_donnees.obtenir(
+            ('rapport_preparation', chemin), [chemin], lambda: _lire_rapport(chemin)
+        )
+    except (OSError, ValueError) as e:
+        logger.error(f"Rapport d'exécution illisible ({chemin}): {e}")
+        return None
+
+
+registre_donnees.declarer('rapport_preparation', charger_rapport_preparation)
+
+
+def tableau_etapes(rapport):
+    """Étapes du rapport sous forme de DataFrame, dans l'ordre d'exécution"""
+    df = pd.DataFrame(rapport.get('etapes') or [])
+    if df.empty:
+        return df
+    colonnes = ['etape', 'parent', 'origine', 'duree_s', 'memoire_pic_mo', 'lignes_entree', 'lignes_sortie']
+    return df[[col for col in colonnes if col in df.columns]]
+
+
+def _figure_durees(df_etapes):
+    # Étapes de premier niveau seulement : les étapes imbriquées sont comprises dans leur parent
+    df = df_etapes[df_etapes['parent'].isna()] if 'parent' in df_etapes.columns else df_etapes
+    fig = px.bar(df, x='duree_s', y='etape', color='origine', orientation='h',
+                 labels={'duree_s': "Durée (s)", 'etape': "Étape", 'origine': "Origine"},
+                 color_discrete_map={'calcul': "#f39c12", 'cache': "#3498db"})
+    fig.update_layout(height=max(250, 40 * len(df)), yaxis={'autorange': 'reversed'})
+    return fig
+
+
+def afficher_rapport_preparation(rapport=None):
+    """Affiche le dernier rapport d'exécution de prepare_data (étapes, rapprochements, avertissements)"""
+    st.header("⚙️ Préparation des données")
+
+    if rapport is None:
+        rapport = registre_donnees.charger_page(DATASETS_REQUIS)['rapport_preparation']
+    if not rapport:
+        st.info(f"Aucun rapport d'exécution trouvé. Lancez `python prepare_data.py` puis copiez "
+                f"{FICHIER_RAPPORT_PREPARATION} dans le projet, ou indiquez son chemin via "
+                f"{VARIABLE_CHEMIN_RAPPORT}.")
+        return
+
+    if rapport.get('statut') == 'echec':
+        st.error(f"La dernière préparation a échoué : {rapport.get('erreur')}")
+
+    # === Indicateurs ===
+    exports = rapport.get('exports') or {}
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Statut", LIBELLES_STATUT.get(rapport.get('statut'), rapport.get('statut')))
+    col2.metric("Exécution", str(rapport.get('debut', "—")).replace("T", " "))
+    col3.metric("Durée", f"{rapport['duree_s']:.1f} s" if rapport.get('duree_s') is not None else "—")
+    col4.metric("Parcelles exportées", f"{max(exports.values()):,}" if exports else "—")
+    col5.metric("Avertissements", len(rapport.get('avertissements') or []))
+    if rapport.get('memoire_pic_mo') is not None:
+        st.caption(f"Pic mémoire (processus principal) : {rapport['memoire_pic_mo']} Mo")
+
+    # === Étapes ===
+    st.subheader("⏱️ Étapes")
+    df_etapes = tableau_etapes(rapport)
+    if df_etapes.empty:
+        st.info("Aucune étape enregistrée")
+    else:
+        fig = figure_en_cache(df_etapes, "preparation.durees_etapes", lambda: _figure_durees(df_etapes))
+        st.plotly_chart(fig, use_container_width=True)
+        st.dataframe(df_etapes, use_container_width=True, hide_index=True)
+
+    # === Rapprochements et délibérations ===
+    col_gauche, col_droite = st.columns(2)
+    with col_gauche:
+        st.subheader("🧩 Rapprochement enquête / référence")
+        rapprochements = rapport.get('rapprochements') or {}
+        if rapprochements:
+            st.dataframe(pd.DataFrame.from_dict(rapprochements, orient='index'), use_container_width=True)
+        else:
+            st.info("Aucune statistique de rapprochement")
+    with col_droite:
+        st.subheader("📜 Délibérations")
+        deliberations = rapport.get('deliberations') or {}
+        if deliberations:
+            st.dataframe(pd.Series(deliberations, name="valeur").to_frame(), use_container_width=True)
+        else:
+            st.info("Aucune statistique de délibération")
+
+    if exports:
+        st.subheader("📦 Fichiers exportés")
+        st.dataframe(pd.Series(exports, name="lignes").to_frame(), use_container_width=True)
+
+    controles = rapport.get('controles') or {}
+    if controles.get('croisement'):
+        st.subheader("🔍 Contrôles NICAD / délibération")
+        st.dataframe(pd.Series(controles['croisement'], name="parcelles").to_frame(), use_container_width=True)
+
+    # === Avertissements ===
+    avertissements = rapport.get('avertissements') or []
+    if avertissements:
+        st.subheader("⚠️ Avertissements")
+        st.dataframe(pd.DataFrame(avertissements), use_container_width=True, hide_index=True)
+
+    # === Profil des colonnes (prepare_data --profil-colonnes) ===
+    profil = rapport.get('profil_colonnes')
+    if profil:
+        with st.expander("📋 Profil des colonnes des classeurs sources", expanded=False):
+            for nom, profil_source in profil.items():
+                st.markdown(f"**{nom}** — {profil_source['lignes']:,} lignes")
+                st.dataframe(pd.DataFrame.from_dict(profil_source['colonnes'], orient='index'),
+                             use_container_width=True)
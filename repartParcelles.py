@@ -1,9 +1,28 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 from plotly.subplots import make_subplots
 import plotly.graph_objects as go
 
+from data_loader import charger_parcelles, SCHEMAS_COLONNES
+from analyse_parcelles import (
+    obtenir_cube,
+    obtenir_moteur_filtres,
+    classes_histogramme,
+    figure_histogramme,
+    resume_par_commune,
+    profil_qualite,
+    obtenir_echantillon,
+    ECHELLES_HISTOGRAMME,
+    BORNES_HISTOGRAMME
+)
+from cache_figures import figure_en_cache, normaliser_parametres
+from grille_donnees import afficher_grille_paginee
+
+# Jeux de données du registre (data_loader.registre_donnees) utilisés par cette page
+DATASETS_REQUIS = ('parcelles',)
+
 
 def afficher_dashboard_parcelles(df_parcelles):
     """
@@ -29,52 +48,51 @@ def afficher_dashboard_parcelles(df_parcelles):
         st.info("Les colonnes suivantes sont requises: nicad, statut_deliberation, superficie")
         return
 
+    # Cube d'agrégats construit une seule fois par version du jeu de données :
+    # les métriques et graphiques des onglets ci-dessous en sont des tranches
+    cube = obtenir_cube(df_parcelles)
+
     with st.container():
         col1, col2, col3, col4 = st.columns(4)
 
-        # Calculer les métriques avec gestion des erreurs
-        total_parcelles = len(df_parcelles)
-
-        try:
-            parcelles_nicad = (df_parcelles["nicad"] == "Avec NICAD").sum()
-        except:
-            parcelles_nicad = 0
-
-        try:
-            parcelles_deliberees = (df_parcelles["statut_deliberation"] == "Délibérée").sum()
-        except:
-            parcelles_deliberees = 0
-
-        try:
-            superficie_totale = df_parcelles['superficie'].sum()
-        except:
-            superficie_totale = 0
+        # Calculer les métriques à partir du cube
+        total_parcelles = cube.total()
+        parcelles_nicad = cube.nombre_nicad()
+        parcelles_deliberees = cube.nombre_deliberees()
+        superficie_totale = cube.superficie_totale()
 
         col1.metric("Nombre total de parcelles", total_parcelles)
         col2.metric("Parcelles NICAD", parcelles_nicad)
         col3.metric("Parcelles délibérées", parcelles_deliberees)
         col4.metric("Superficie totale (m²)", f"{superficie_totale:,.2f}")
 
-    # Création des onglets principaux
-    tab_vue_globale, tab_par_commune, tab_details, tab_donnees = st.tabs([
-        "🌍 Vue Globale",
-        "🏘️ Analyse par Commune",
-        "📍 Analyse Détaillée",
-        "🧾 Données"
-    ])
-
-    # ===== TAB 1: VUE GLOBALE =====
-    with tab_vue_globale:
-        col_nicad, col_deliberation = st.columns(2)
-
-        with col_nicad:
-            # Répartition NICAD
-            if 'nicad' in df_parcelles.columns and not df_parcelles['nicad'].empty:
+    # Sélecteur d'onglet : contrairement à st.tabs, qui exécute le corps de
+    # chaque onglet à chaque rerun, seul l'onglet actif est calculé et affiché
+    onglet_actif = st.radio(
+        "Onglet",
+        list(ONGLETS),
+        horizontal=True,
+        key="onglet_parcelles",
+        label_visibility="collapsed"
+    )
+
+    ONGLETS[onglet_actif](df_parcelles, cube)
+
+
+def _onglet_vue_globale(df_parcelles, cube):
+    """Onglet "Vue Globale" : répartitions NICAD, délibération et usages"""
+    col_nicad, col_deliberation = st.columns(2)
+
+    with col_nicad:
+        # Répartition NICAD
+        repartition_nicad = cube.repartition("nicad")
+        if not repartition_nicad.empty:
+            def _figure_nicad():
                 fig_global_nicad = px.pie(
-                    df_parcelles,
-                    names="nicad",
+                    names=repartition_nicad.index,
+                    values=repartition_nicad.values,
                     title="Répartition globale des parcelles NICAD",
-                    labels={"nicad": "Statut NICAD"}
+                    labels={"names": "Statut NICAD"}
                 )
                 fig_global_nicad.update_traces(
                     textposition='inside',
@@ -90,18 +108,22 @@ def afficher_dashboard_parcelles(df_parcelles):
                         x=1.05
                     )
                 )
-                st.plotly_chart(fig_global_nicad, use_container_width=True)
-            else:
-                st.info("Données NICAD non disponibles")
+                return fig_global_nicad
+            fig_global_nicad = figure_en_cache(df_parcelles, "parcelles.repartition_nicad", _figure_nicad)
+            st.plotly_chart(fig_global_nicad, use_container_width=True)
+        else:
+            st.info("Données NICAD non disponibles")
 
-        with col_deliberation:
-            # Répartition délibération
-            if 'statut_deliberation' in df_parcelles.columns and not df_parcelles['statut_deliberation'].empty:
+    with col_deliberation:
+        # Répartition délibération
+        repartition_deliberation = cube.repartition("statut_deliberation")
+        if not repartition_deliberation.empty:
+            def _figure_deliberation():
                 fig_global_deliberation = px.pie(
-                    df_parcelles,
-                    names="statut_deliberation",
+                    names=repartition_deliberation.index,
+                    values=repartition_deliberation.values,
                     title="Répartition des parcelles délibérées",
-                    labels={"statut_deliberation": "Statut délibération"}
+                    labels={"names": "Statut délibération"}
                 )
                 fig_global_deliberation.update_traces(
                     textposition='inside',
@@ -117,17 +139,19 @@ def afficher_dashboard_parcelles(df_parcelles):
                         x=1.05
                     )
                 )
-                st.plotly_chart(fig_global_deliberation, use_container_width=True)
-            else:
-                st.info("Données de délibération non disponibles")
+                return fig_global_deliberation
+            fig_global_deliberation = figure_en_cache(df_parcelles, "parcelles.repartition_deliberation", _figure_deliberation)
+            st.plotly_chart(fig_global_deliberation, use_container_width=True)
+        else:
+            st.info("Données de délibération non disponibles")
 
-        # Relation NICAD et délibération
-        if 'nicad' in df_parcelles.columns and 'statut_deliberation' in df_parcelles.columns:
-            st.subheader("🔄 Relation entre NICAD et délibération")
-            nicad_delib_data = df_parcelles.groupby(["nicad", "statut_deliberation"]).size().reset_index(
-                name="Nombre de parcelles")
+    # Relation NICAD et délibération
+    if cube.a_dimension('nicad') and cube.a_dimension('statut_deliberation'):
+        st.subheader("🔄 Relation entre NICAD et délibération")
+        nicad_delib_data = cube.croise("nicad", "statut_deliberation", nom="Nombre de parcelles")
 
-            if not nicad_delib_data.empty:
+        if not nicad_delib_data.empty:
+            def _figure_relation():
                 fig_relation = px.bar(
                     nicad_delib_data,
                     x="nicad",
@@ -137,29 +161,30 @@ def afficher_dashboard_parcelles(df_parcelles):
                     title="Relation entre statut NICAD et délibération",
                     labels={"nicad": "Statut NICAD", "statut_deliberation": "Statut délibération"}
                 )
-                st.plotly_chart(fig_relation, use_container_width=True)
-            else:
-                st.info("Données insuffisantes pour afficher la relation NICAD/délibération")
+                return fig_relation
+            fig_relation = figure_en_cache(df_parcelles, "parcelles.relation_nicad_deliberation", _figure_relation)
+            st.plotly_chart(fig_relation, use_container_width=True)
+        else:
+            st.info("Données insuffisantes pour afficher la relation NICAD/délibération")
 
-        # Répartition par usage
-        if "type_usag" in df_parcelles.columns and not df_parcelles["type_usag"].empty:
-            st.subheader("🏗️ Répartition par usage des parcelles")
+    # Répartition par usage
+    if cube.a_dimension("type_usag") and not cube.repartition("type_usag").empty:
+        st.subheader("🏗️ Répartition par usage des parcelles")
 
-            # Option pour choisir le type de visualisation
-            type_viz_usage = st.radio(
-                "Type de visualisation :",
-                ["Graphique en secteurs", "Graphique en barres"],
-                key="viz_usage_global"
-            )
+        # Option pour choisir le type de visualisation
+        type_viz_usage = st.radio(
+            "Type de visualisation :",
+            ["Graphique en secteurs", "Graphique en barres"],
+            key="viz_usage_global"
+        )
 
-            col_usage, col_usage_delib = st.columns(2)
+        col_usage, col_usage_delib = st.columns(2)
 
-            with col_usage:
-                if type_viz_usage == "Graphique en secteurs":
-                    # Calculer les pourcentages pour affichage personnalisé
-                    usage_counts = df_parcelles["type_usag"].value_counts()
-                    usage_percentages = (usage_counts / len(df_parcelles) * 100).round(1)
+        with col_usage:
+            usage_counts = cube.repartition("type_usag")
 
+            def _figure_usage():
+                if type_viz_usage == "Graphique en secteurs":
                     fig_usage = px.pie(
                         values=usage_counts.values,
                         names=usage_counts.index,
@@ -191,11 +216,11 @@ def afficher_dashboard_parcelles(df_parcelles):
 
                 else:
                     # Graphique en barres horizontal pour plus de lisibilité
-                    usage_counts = df_parcelles["type_usag"].value_counts().reset_index()
-                    usage_counts.columns = ['Usage', 'Nombre']
+                    df_usage = usage_counts.reset_index()
+                    df_usage.columns = ['Usage', 'Nombre']
 
                     fig_usage = px.bar(
-                        usage_counts,
+                        df_usage,
                         x='Nombre',
                         y='Usage',
                         orientation='h',
@@ -204,16 +229,18 @@ def afficher_dashboard_parcelles(df_parcelles):
                     )
                     fig_usage.update_traces(texttemplate='%{text}', textposition='outside')
                     fig_usage.update_layout(height=400, yaxis={'categoryorder': 'total ascending'})
+                return fig_usage
+            fig_usage = figure_en_cache(df_parcelles, "parcelles.repartition_usage", _figure_usage, type_viz=type_viz_usage)
 
-                st.plotly_chart(fig_usage, use_container_width=True)
+            st.plotly_chart(fig_usage, use_container_width=True)
 
-            with col_usage_delib:
-                # Graphique montrant la répartition des délibérations par type d'usage
-                if 'statut_deliberation' in df_parcelles.columns:
-                    usage_delib_data = df_parcelles.groupby(["type_usag", "statut_deliberation"]).size().reset_index(
-                        name="Nombre")
+        with col_usage_delib:
+            # Graphique montrant la répartition des délibérations par type d'usage
+            if cube.a_dimension('statut_deliberation'):
+                usage_delib_data = cube.croise("type_usag", "statut_deliberation")
 
-                    if not usage_delib_data.empty:
+                if not usage_delib_data.empty:
+                    def _figure_usage_delib():
                         fig_usage_delib = px.bar(
                             usage_delib_data,
                             x="type_usag",
@@ -223,50 +250,54 @@ def afficher_dashboard_parcelles(df_parcelles):
                             labels={"type_usag": "Type d'usage", "statut_deliberation": "Statut délibération"}
                         )
                         fig_usage_delib.update_xaxes(tickangle=45)
-                        st.plotly_chart(fig_usage_delib, use_container_width=True)
-                    else:
-                        st.info("Données insuffisantes pour afficher la délibération par usage")
+                        return fig_usage_delib
+                    fig_usage_delib = figure_en_cache(df_parcelles, "parcelles.deliberation_par_usage", _figure_usage_delib)
+                    st.plotly_chart(fig_usage_delib, use_container_width=True)
                 else:
-                    st.info("Données de délibération non disponibles")
-    
-    # ===== TAB 2: ANALYSE PAR COMMUNE =====
-    with tab_par_commune:
-        if 'commune' in df_parcelles.columns and not df_parcelles['commune'].empty:
-            st.subheader("🏘️ Analyse par commune")
-            
-            # Sélection de la commune
-            communes_list = ['Toutes les communes'] + sorted(df_parcelles['commune'].unique().tolist())
-            commune_selectionnee = st.selectbox("Sélectionnez une commune :", communes_list)
-            
-            # Filtrer les données selon la commune sélectionnée
-            if commune_selectionnee != 'Toutes les communes':
-                df_filtered = df_parcelles[df_parcelles['commune'] == commune_selectionnee]
+                    st.info("Données insuffisantes pour afficher la délibération par usage")
             else:
-                df_filtered = df_parcelles
-            
-            # Métriques pour la commune sélectionnée
-            col1, col2, col3, col4 = st.columns(4)
-            
-            total_parcelles_commune = len(df_filtered)
-            parcelles_nicad_commune = (df_filtered["nicad"] == "Avec NICAD").sum() if 'nicad' in df_filtered.columns else 0
-            parcelles_deliberees_commune = (df_filtered["statut_deliberation"] == "Délibérée").sum() if 'statut_deliberation' in df_filtered.columns else 0
-            superficie_commune = df_filtered['superficie'].sum() if 'superficie' in df_filtered.columns else 0
-            
-            col1.metric("Parcelles", total_parcelles_commune)
-            col2.metric("NICAD", parcelles_nicad_commune)
-            col3.metric("Délibérées", parcelles_deliberees_commune)
-            col4.metric("Superficie (m²)", f"{superficie_commune:,.2f}")
+                st.info("Données de délibération non disponibles")
+
+
+def _onglet_par_commune(df_parcelles, cube):
+    """Onglet "Analyse par Commune" : comparaison des communes ou détail d'une commune"""
+    if cube.a_dimension('commune') and cube.total() > 0:
+        st.subheader("🏘️ Analyse par commune")
+        
+        # Sélection de la commune
+        communes_list = ['Toutes les communes'] + cube.valeurs('commune')
+        commune_selectionnee = st.selectbox("Sélectionnez une commune :", communes_list)
+        
+        # Tranche du cube pour la commune sélectionnée
+        if commune_selectionnee != 'Toutes les communes':
+            cube_filtre = cube.filtrer(commune=commune_selectionnee)
+        else:
+            cube_filtre = cube
+        
+        # Métriques pour la commune sélectionnée
+        col1, col2, col3, col4 = st.columns(4)
+        
+        total_parcelles_commune = cube_filtre.total()
+        parcelles_nicad_commune = cube_filtre.nombre_nicad()
+        parcelles_deliberees_commune = cube_filtre.nombre_deliberees()
+        superficie_commune = cube_filtre.superficie_totale()
+        
+        col1.metric("Parcelles", total_parcelles_commune)
+        col2.metric("NICAD", parcelles_nicad_commune)
+        col3.metric("Délibérées", parcelles_deliberees_commune)
+        col4.metric("Superficie (m²)", f"{superficie_commune:,.2f}")
+        
+        # Graphiques par commune
+        if commune_selectionnee == 'Toutes les communes':
+            # Vue comparative entre toutes les communes
+            col_commune1, col_commune2 = st.columns(2)
             
-            # Graphiques par commune
-            if commune_selectionnee == 'Toutes les communes':
-                # Vue comparative entre toutes les communes
-                col_commune1, col_commune2 = st.columns(2)
-                
-                with col_commune1:
-                    # Nombre de parcelles par commune
-                    parcelles_par_commune = df_parcelles['commune'].value_counts().reset_index()
+            with col_commune1:
+                # Nombre de parcelles par commune
+                def _figure_communes():
+                    parcelles_par_commune = cube.repartition('commune').reset_index()
                     parcelles_par_commune.columns = ['Commune', 'Nombre de parcelles']
-                    
+                
                     fig_communes = px.bar(
                         parcelles_par_commune.head(10),  # Top 10 communes
                         x='Commune',
@@ -274,14 +305,17 @@ def afficher_dashboard_parcelles(df_parcelles):
                         title="Top 10 communes par nombre de parcelles"
                     )
                     fig_communes.update_xaxes(tickangle=45)
-                    st.plotly_chart(fig_communes, use_container_width=True)
-                
-                with col_commune2:
-                    # Superficie par commune
-                    if 'superficie' in df_parcelles.columns:
-                        superficie_par_commune = df_parcelles.groupby('commune')['superficie'].sum().reset_index()
+                    return fig_communes
+                fig_communes = figure_en_cache(df_parcelles, "parcelles.top_communes", _figure_communes)
+                st.plotly_chart(fig_communes, use_container_width=True)
+            
+            with col_commune2:
+                # Superficie par commune
+                if 'superficie' in df_parcelles.columns:
+                    def _figure_superficie():
+                        superficie_par_commune = cube.superficie_par('commune').reset_index(name='superficie')
                         superficie_par_commune = superficie_par_commune.sort_values('superficie', ascending=False).head(10)
-                        
+                    
                         fig_superficie = px.bar(
                             superficie_par_commune,
                             x='commune',
@@ -289,62 +323,69 @@ def afficher_dashboard_parcelles(df_parcelles):
                             title="Top 10 communes par superficie totale"
                         )
                         fig_superficie.update_xaxes(tickangle=45)
-                        st.plotly_chart(fig_superficie, use_container_width=True)
-                    else:
-                        st.info("Données de superficie non disponibles")
-                
-                # Tableau récapitulatif par commune
-                st.subheader("📋 Récapitulatif par commune")
-                summary_commune = df_parcelles.groupby('commune').agg({
-                    'nicad': lambda x: (x == "Avec NICAD").sum() if 'nicad' in df_parcelles.columns else 0,
-                    'statut_deliberation': lambda x: (x == "Délibérée").sum() if 'statut_deliberation' in df_parcelles.columns else 0,
-                    'superficie': 'sum' if 'superficie' in df_parcelles.columns else lambda x: 0
-                }).reset_index()
-                
-                summary_commune.columns = ['Commune', 'Parcelles NICAD', 'Parcelles délibérées', 'Superficie totale']
-                summary_commune['Nombre total parcelles'] = df_parcelles['commune'].value_counts().values
-                
-                # Réorganiser les colonnes
-                summary_commune = summary_commune[['Commune', 'Nombre total parcelles', 'Parcelles NICAD', 'Parcelles délibérées', 'Superficie totale']]
-                summary_commune = summary_commune.sort_values('Nombre total parcelles', ascending=False)
-                
-                st.dataframe(summary_commune, use_container_width=True)
+                        return fig_superficie
+                    fig_superficie = figure_en_cache(df_parcelles, "parcelles.top_superficies", _figure_superficie)
+                    st.plotly_chart(fig_superficie, use_container_width=True)
+                else:
+                    st.info("Données de superficie non disponibles")
             
-            else:
-                # Vue détaillée pour une commune spécifique
-                col_detail1, col_detail2 = st.columns(2)
-                
-                with col_detail1:
-                    # Répartition NICAD pour la commune
-                    if 'nicad' in df_filtered.columns and not df_filtered['nicad'].empty:
+            # Tableau récapitulatif par commune (jointure par clé commune)
+            st.subheader("📋 Récapitulatif par commune")
+            summary_commune = resume_par_commune(df_parcelles)
+            
+            st.dataframe(summary_commune, use_container_width=True)
+            st.download_button(
+                label="📥 Télécharger le récapitulatif (CSV)",
+                data=lambda: summary_commune.to_csv(index=False),
+                file_name="recapitulatif_communes.csv",
+                mime="text/csv",
+                key="export_recapitulatif_communes"
+            )
+        
+        else:
+            # Vue détaillée pour une commune spécifique
+            col_detail1, col_detail2 = st.columns(2)
+            
+            with col_detail1:
+                # Répartition NICAD pour la commune
+                repartition_nicad_commune = cube_filtre.repartition("nicad")
+                if not repartition_nicad_commune.empty:
+                    def _figure_nicad_commune():
                         fig_nicad_commune = px.pie(
-                            df_filtered,
-                            names="nicad",
+                            names=repartition_nicad_commune.index,
+                            values=repartition_nicad_commune.values,
                             title=f"Répartition NICAD - {commune_selectionnee}"
                         )
-                        st.plotly_chart(fig_nicad_commune, use_container_width=True)
-                    else:
-                        st.info("Données NICAD non disponibles pour cette commune")
-                
-                with col_detail2:
-                    # Répartition délibération pour la commune
-                    if 'statut_deliberation' in df_filtered.columns and not df_filtered['statut_deliberation'].empty:
+                        return fig_nicad_commune
+                    fig_nicad_commune = figure_en_cache(df_parcelles, "parcelles.nicad_commune", _figure_nicad_commune, commune=commune_selectionnee)
+                    st.plotly_chart(fig_nicad_commune, use_container_width=True)
+                else:
+                    st.info("Données NICAD non disponibles pour cette commune")
+            
+            with col_detail2:
+                # Répartition délibération pour la commune
+                repartition_delib_commune = cube_filtre.repartition("statut_deliberation")
+                if not repartition_delib_commune.empty:
+                    def _figure_delib_commune():
                         fig_delib_commune = px.pie(
-                            df_filtered,
-                            names="statut_deliberation",
+                            names=repartition_delib_commune.index,
+                            values=repartition_delib_commune.values,
                             title=f"Répartition délibération - {commune_selectionnee}"
                         )
-                        st.plotly_chart(fig_delib_commune, use_container_width=True)
-                    else:
-                        st.info("Données de délibération non disponibles pour cette commune")
+                        return fig_delib_commune
+                    fig_delib_commune = figure_en_cache(df_parcelles, "parcelles.deliberation_commune", _figure_delib_commune, commune=commune_selectionnee)
+                    st.plotly_chart(fig_delib_commune, use_container_width=True)
+                else:
+                    st.info("Données de délibération non disponibles pour cette commune")
+            
+            # Répartition par usage pour la commune
+            if cube_filtre.a_dimension('type_usag') and not cube_filtre.repartition('type_usag').empty:
+                st.subheader(f"🏗️ Répartition par usage - {commune_selectionnee}")
                 
-                # Répartition par usage pour la commune
-                if 'type_usag' in df_filtered.columns and not df_filtered['type_usag'].empty:
-                    st.subheader(f"🏗️ Répartition par usage - {commune_selectionnee}")
-                    
-                    usage_commune = df_filtered['type_usag'].value_counts().reset_index()
+                def _figure_usage_commune():
+                    usage_commune = cube_filtre.repartition('type_usag').reset_index()
                     usage_commune.columns = ['Usage', 'Nombre']
-                    
+                
                     fig_usage_commune = px.bar(
                         usage_commune,
                         x='Usage',
@@ -352,209 +393,353 @@ def afficher_dashboard_parcelles(df_parcelles):
                         title=f"Répartition des usages - {commune_selectionnee}"
                     )
                     fig_usage_commune.update_xaxes(tickangle=45)
-                    st.plotly_chart(fig_usage_commune, use_container_width=True)
-        
-        else:
-            st.info("Données de commune non disponibles")
+                    return fig_usage_commune
+                fig_usage_commune = figure_en_cache(df_parcelles, "parcelles.usage_commune", _figure_usage_commune, commune=commune_selectionnee)
+                st.plotly_chart(fig_usage_commune, use_container_width=True)
     
-    # ===== TAB 3: ANALYSE DÉTAILLÉE =====
-    with tab_details:
-        st.subheader("📍 Analyse détaillée")
-        
-        # Filtres interactifs
-        st.sidebar.header("🔍 Filtres")
-        
-        # Filtre par commune
-        if 'commune' in df_parcelles.columns:
-            communes_filtre = st.sidebar.multiselect(
-                "Communes",
-                options=df_parcelles['commune'].unique(),
-                default=df_parcelles['commune'].unique()
-            )
-            df_filtered_details = df_parcelles[df_parcelles['commune'].isin(communes_filtre)]
-        else:
-            df_filtered_details = df_parcelles
-        
-        # Filtre par NICAD
-        if 'nicad' in df_parcelles.columns:
-            nicad_filtre = st.sidebar.multiselect(
-                "Statut NICAD",
-                options=df_parcelles['nicad'].unique(),
-                default=df_parcelles['nicad'].unique()
-            )
-            df_filtered_details = df_filtered_details[df_filtered_details['nicad'].isin(nicad_filtre)]
-        
-        # Filtre par délibération
-        if 'statut_deliberation' in df_parcelles.columns:
-            deliberation_filtre = st.sidebar.multiselect(
-                "Statut délibération",
-                options=df_parcelles['statut_deliberation'].unique(),
-                default=df_parcelles['statut_deliberation'].unique()
-            )
-            df_filtered_details = df_filtered_details[df_filtered_details['statut_deliberation'].isin(deliberation_filtre)]
-        
-        # Filtre par usage
-        if 'type_usag' in df_parcelles.columns:
-            usage_filtre = st.sidebar.multiselect(
-                "Type d'usage",
-                options=df_parcelles['type_usag'].unique(),
-                default=df_parcelles['type_usag'].unique()
-            )
-            df_filtered_details = df_filtered_details[df_filtered_details['type_usag'].isin(usage_filtre)]
+    else:
+        st.info("Données de commune non disponibles")
+
+
+# Métriques de l'onglet "Analyse détaillée" : (libellé, clé d'estimation, unité)
+METRIQUES_DETAILS = [
+    ("Total", 'total', ""),
+    ("NICAD", 'nicad', ""),
+    ("Délibérées", 'deliberees', ""),
+    ("Superficie", 'superficie', " m²"),
+]
+
+
+def _onglet_details(df_parcelles, cube):
+    """Onglet "Analyse détaillée" : filtres de la barre latérale et graphiques filtrés"""
+    st.subheader("📍 Analyse détaillée")
+    
+    # Filtres interactifs, résolus par le moteur à index bitmap
+    moteur = obtenir_moteur_filtres(df_parcelles)
+    st.sidebar.header("🔍 Filtres")
+    
+    selections = {}
+    libelles_filtres = {
+        'commune': "Communes",
+        'nicad': "Statut NICAD",
+        'statut_deliberation': "Statut délibération",
+        'type_usag': "Type d'usage"
+    }
+    for colonne, libelle in libelles_filtres.items():
+        if moteur.a_colonne(colonne):
+            options = moteur.valeurs(colonne)
+            selections[colonne] = st.sidebar.multiselect(libelle, options=options, default=options)
+    
+    # Filtre par superficie
+    plage_superficie = None
+    bornes_superficie = moteur.bornes_superficie()
+    if bornes_superficie is not None:
+        superficie_min, superficie_max = bornes_superficie
+        plage_superficie = st.sidebar.slider(
+            "Superficie (m²)",
+            min_value=superficie_min,
+            max_value=superficie_max,
+            value=(superficie_min, superficie_max)
+        )
+    
+    # Mode approximatif : les estimations sur un échantillon stratifié par commune
+    # s'affichent pendant la saisie ; le passage exact a lieu une fois les filtres
+    # stables depuis l'estimation affichée, ou tout de suite avec le bouton
+    mode_approximatif = st.sidebar.toggle(
+        "⚡ Mode approximatif",
+        key="mode_approximatif_parcelles",
+        help="Métriques et histogramme estimés sur un échantillon stratifié par commune, "
+             "avec intervalles de confiance à 95 %"
+    )
+    etat_filtres = normaliser_parametres({'selections': selections, 'plage': plage_superficie})
+    estimation_affichee = st.session_state.pop("estimation_parcelles", None)
+    if mode_approximatif and estimation_affichee == etat_filtres:
+        # Filtres inchangés depuis l'estimation affichée : la saisie est terminée
+        _demander_valeurs_exactes(etat_filtres)
+    valeurs_exactes = (not mode_approximatif
+                       or st.session_state.get("valeurs_exactes_parcelles") == etat_filtres)
+    
+    if valeurs_exactes:
+        _details_exacts(df_parcelles, moteur, selections, plage_superficie, mode_approximatif)
+    else:
+        _details_estimes(df_parcelles, selections, plage_superficie, etat_filtres)
+
+
+def _demander_valeurs_exactes(etat_filtres):
+    st.session_state["valeurs_exactes_parcelles"] = etat_filtres
+
+
+# Délai sans saisie (secondes) après lequel les estimations sont remplacées par les valeurs exactes
+DELAI_VALEURS_EXACTES = 1.5
+
+
+@st.fragment(run_every=DELAI_VALEURS_EXACTES)
+def _valeurs_exactes_differees():
+    """
+    Relance la page DELAI_VALEURS_EXACTES secondes après l'affichage des estimations
+
+    Chaque saisie relance la page et réarme le délai ; la relance n'a donc
+    lieu qu'une fois les filtres stables, et _onglet_details passe alors aux
+    valeurs exactes si l'état des filtres n'a pas changé.
+    """
+    if st.session_state.pop("delai_valeurs_exactes_arme", False):
+        return
+    st.rerun()
+
+
+def _afficher_histogramme(df_parcelles, superficies, poids, selections, plage_superficie, approximatif):
+    """Histogramme des superficies filtrées (exactes, ou de l'échantillon pondérées par strate)"""
+    # Classes calculées côté serveur : seules les barres sont envoyées au navigateur
+    col_echelle, col_bornes = st.columns(2)
+    echelle = ECHELLES_HISTOGRAMME[col_echelle.selectbox("Échelle", list(ECHELLES_HISTOGRAMME), key="echelle_histogramme")]
+    bornes = BORNES_HISTOGRAMME[col_bornes.selectbox("Classes", list(BORNES_HISTOGRAMME), key="bornes_histogramme")]
+    
+    def _figure_histogramme():
+        classes = classes_histogramme(
+            superficies, nb_classes=20, echelle=echelle, bornes=bornes, poids=poids
+        )
+        titre = "Distribution des superficies (données filtrées)"
+        if approximatif:
+            titre = "Distribution estimée des superficies (échantillon stratifié)"
+        fig_hist = figure_histogramme(
+            classes,
+            titre=titre,
+            libelle_x="superficie",
+            echelle=echelle,
+            bornes=bornes
+        )
+        return fig_hist
+    fig_hist = figure_en_cache(
+        df_parcelles, "parcelles.histogramme_filtre", _figure_histogramme,
+        selections=selections, plage=plage_superficie, echelle=echelle, bornes=bornes,
+        approximatif=approximatif
+    )
+    st.plotly_chart(fig_hist, use_container_width=True)
+
+
+def _details_estimes(df_parcelles, selections, plage_superficie, etat_filtres):
+    """Métriques et histogramme estimés sur l'échantillon stratifié, sans aucun passage exact"""
+    echantillon = obtenir_echantillon(df_parcelles)
+    estimation = echantillon.estimer(selections, plage_superficie)
+    total_estime, ic_total = estimation['total']
+    
+    col_nombre, col_exact = st.columns([3, 1])
+    col_nombre.write(f"**Nombre de parcelles après filtrage : ≈ {total_estime:,.0f} ± {ic_total:,.0f} (estimation)**")
+    col_exact.button("🎯 Calculer les valeurs exactes", key="bouton_valeurs_exactes",
+                     on_click=_demander_valeurs_exactes, args=(etat_filtres,))
+    
+    # Valeurs exactes calculées automatiquement une fois la saisie terminée
+    st.session_state["estimation_parcelles"] = etat_filtres
+    st.session_state["delai_valeurs_exactes_arme"] = True
+    _valeurs_exactes_differees()
+    
+    if total_estime <= 0:
+        st.warning("Aucune parcelle de l'échantillon ne correspond aux filtres sélectionnés.")
+        return
+    
+    for col, (libelle, cle, unite) in zip(st.columns(4), METRIQUES_DETAILS):
+        valeur, demi_intervalle = estimation[cle]
+        col.metric(
+            libelle,
+            f"≈ {valeur:,.0f}{unite}",
+            help=f"IC 95 % : ± {demi_intervalle:,.0f}{unite} (échantillon de {echantillon.taille:,} parcelles)"
+        )
+    
+    col_graph1, col_graph2 = st.columns(2)
+    with col_graph1:
+        if len(estimation['superficies']) > 0:
+            _afficher_histogramme(df_parcelles, estimation['superficies'], estimation['poids'],
+                                  selections, plage_superficie, approximatif=True)
+    with col_graph2:
+        st.info("L'analyse croisée NICAD / délibération est affichée avec les valeurs exactes.")
+
+
+def _details_exacts(df_parcelles, moteur, selections, plage_superficie, mode_approximatif):
+    """Métriques et graphiques exacts, résolus par le moteur à index bitmap"""
+    bitmap_filtre = moteur.bitmap(selections, plage_superficie)
+    total_filtrees = moteur.compter(bitmap_filtre)
+    
+    # Affichage des résultats filtrés
+    st.write(f"**Nombre de parcelles après filtrage : {total_filtrees}**")
+    if mode_approximatif:
+        st.caption("Valeurs exactes pour les filtres courants ; un changement de filtre revient aux estimations "
+                   "jusqu'à la fin de la saisie.")
+    
+    if total_filtrees > 0:
+        superficies_filtrees = moteur.superficies(moteur.masque(selections, plage_superficie))
         
-        # Filtre par superficie
-        if 'superficie' in df_parcelles.columns:
-            superficie_min = float(df_parcelles['superficie'].min())
-            superficie_max = float(df_parcelles['superficie'].max())
-            superficie_range = st.sidebar.slider(
-                "Superficie (m²)",
-                min_value=superficie_min,
-                max_value=superficie_max,
-                value=(superficie_min, superficie_max)
-            )
-            df_filtered_details = df_filtered_details[
-                (df_filtered_details['superficie'] >= superficie_range[0]) & 
-                (df_filtered_details['superficie'] <= superficie_range[1])
-            ]
+        # Métriques des données filtrées
+        nicad_filtrees = moteur.compter_valeur(bitmap_filtre, 'nicad', "Avec NICAD")
+        deliberees_filtrees = moteur.compter_valeur(bitmap_filtre, 'statut_deliberation', "Délibérée")
+        superficie_filtrees = float(np.nansum(superficies_filtrees))
         
-        # Affichage des résultats filtrés
-        st.write(f"**Nombre de parcelles après filtrage : {len(df_filtered_details)}**")
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Total", total_filtrees)
+        col2.metric("NICAD", nicad_filtrees)
+        col3.metric("Délibérées", deliberees_filtrees)
+        col4.metric("Superficie", f"{superficie_filtrees:,.2f} m²")
         
-        if len(df_filtered_details) > 0:
-            # Métriques des données filtrées
-            col1, col2, col3, col4 = st.columns(4)
+        # Graphiques des données filtrées
+        if total_filtrees > 1:
+            col_graph1, col_graph2 = st.columns(2)
             
-            total_filtrees = len(df_filtered_details)
-            nicad_filtrees = (df_filtered_details["nicad"] == "Avec NICAD").sum() if 'nicad' in df_filtered_details.columns else 0
-            deliberees_filtrees = (df_filtered_details["statut_deliberation"] == "Délibérée").sum() if 'statut_deliberation' in df_filtered_details.columns else 0
-            superficie_filtrees = df_filtered_details['superficie'].sum() if 'superficie' in df_filtered_details.columns else 0
+            with col_graph1:
+                # Distribution des superficies
+                if len(superficies_filtrees) > 0:
+                    _afficher_histogramme(df_parcelles, superficies_filtrees, None,
+                                          selections, plage_superficie, approximatif=False)
             
-            col1.metric("Total", total_filtrees)
-            col2.metric("NICAD", nicad_filtrees)
-            col3.metric("Délibérées", deliberees_filtrees)
-            col4.metric("Superficie", f"{superficie_filtrees:,.2f} m²")
-            
-            # Graphiques des données filtrées
-            if len(df_filtered_details) > 1:
-                col_graph1, col_graph2 = st.columns(2)
-                
-                with col_graph1:
-                    # Distribution des superficies
-                    if 'superficie' in df_filtered_details.columns:
-                        fig_hist = px.histogram(
-                            df_filtered_details,
-                            x='superficie',
-                            nbins=20,
-                            title="Distribution des superficies (données filtrées)"
-                        )
-                        st.plotly_chart(fig_hist, use_container_width=True)
-                
-                with col_graph2:
-                    # Analyse croisée
-                    if 'nicad' in df_filtered_details.columns and 'statut_deliberation' in df_filtered_details.columns:
-                        crosstab = pd.crosstab(df_filtered_details['nicad'], df_filtered_details['statut_deliberation'])
+            with col_graph2:
+                # Analyse croisée
+                if moteur.a_colonne('nicad') and moteur.a_colonne('statut_deliberation'):
+                    def _figure_croisement():
+                        crosstab = moteur.tableau_croise(bitmap_filtre, 'nicad', 'statut_deliberation')
                         fig_heatmap = px.imshow(
                             crosstab,
                             text_auto=True,
                             aspect="auto",
                             title="Analyse croisée NICAD vs Délibération"
                         )
-                        st.plotly_chart(fig_heatmap, use_container_width=True)
-        
-        else:
-            st.warning("Aucune parcelle ne correspond aux filtres sélectionnés.")
+                        return fig_heatmap
+                    fig_heatmap = figure_en_cache(df_parcelles, "parcelles.croisement_filtre", _figure_croisement, selections=selections, plage=plage_superficie)
+                    st.plotly_chart(fig_heatmap, use_container_width=True)
+    
+    else:
+        st.warning("Aucune parcelle ne correspond aux filtres sélectionnés.")
+
+
+def _onglet_donnees(df_parcelles, cube):
+    """Onglet "Données" : données brutes, statistiques et qualité"""
+    st.subheader("🧾 Données brutes")
+    
+    # Colonnes optionnelles (id_parcelle, autorité...) chargées seulement sur demande
+    colonnes_absentes = [
+        col for col in SCHEMAS_COLONNES['parcelles']['optionnelles']
+        if col not in df_parcelles.columns
+    ]
+    if colonnes_absentes and st.checkbox(f"Charger les colonnes complémentaires ({', '.join(colonnes_absentes)})"):
+        df_complet = charger_parcelles(tuple(colonnes_absentes))
+        if not df_complet.empty:
+            df_parcelles = df_complet
+    
+    # Grille paginée : recherche, tri et pagination côté serveur
+    afficher_grille_paginee(df_parcelles, "grille_parcelles", "parcelles_data.csv")
     
-    # ===== TAB 4: DONNÉES =====
-    with tab_donnees:
-        st.subheader("🧾 Données brutes")
+    # Informations sur les données
+    st.subheader("ℹ️ Informations sur les données")
+    
+    col_info1, col_info2 = st.columns(2)
+    
+    with col_info1:
+        st.write("**Dimensions du dataset :**")
+        st.write(f"- Nombre de lignes : {len(df_parcelles)}")
+        st.write(f"- Nombre de colonnes : {len(df_parcelles.columns)}")
+    
+    with col_info2:
+        st.write("**Colonnes disponibles :**")
+        for col in df_parcelles.columns:
+            st.write(f"- {col}")
+    
+    # Statistiques descriptives
+    if st.checkbox("Afficher les statistiques descriptives"):
+        st.subheader("📊 Statistiques descriptives")
         
-        # Options d'affichage
-        col_options1, col_options2 = st.columns(2)
+        # Sélection des colonnes numériques
+        numeric_columns = df_parcelles.select_dtypes(include=['number']).columns
         
-        with col_options1:
-            nb_lignes = st.selectbox(
-                "Nombre de lignes à afficher",
-                options=[10, 25, 50, 100, len(df_parcelles)],
-                index=1
+        if len(numeric_columns) > 0:
+            selected_columns = st.multiselect(
+                "Sélectionnez les colonnes numériques à analyser",
+                options=numeric_columns,
+                default=numeric_columns[:3] if len(numeric_columns) >= 3 else numeric_columns
             )
+            
+            if selected_columns:
+                st.dataframe(df_parcelles[selected_columns].describe(), use_container_width=True)
+            else:
+                st.info("Sélectionnez au moins une colonne numérique")
+        else:
+            st.info("Aucune colonne numérique disponible pour les statistiques")
+    
+    # Vérification de la qualité des données
+    if st.checkbox("Vérifier la qualité des données"):
+        st.subheader("🔍 Qualité des données")
         
-        with col_options2:
-            if st.button("📥 Télécharger les données (CSV)"):
-                csv = df_parcelles.to_csv(index=False)
-                st.download_button(
-                    label="Télécharger CSV",
-                    data=csv,
-                    file_name="parcelles_data.csv",
-                    mime="text/csv"
-                )
+        # Profil calculé une seule fois par version, sur toutes les colonnes du fichier
+        # (les colonnes optionnelles sont chargées même si la case ci-dessus est décochée)
+        profil = profil_qualite(df_parcelles, charger_parcelles)
         
-        # Affichage du tableau
-        st.dataframe(df_parcelles.head(nb_lignes), use_container_width=True)
+        # Valeurs manquantes
+        quality_df = profil['valeurs_manquantes']
+        if len(quality_df) > 0:
+            st.warning("⚠️ Valeurs manquantes détectées :")
+            st.dataframe(quality_df, use_container_width=True)
+        else:
+            st.success("✅ Aucune valeur manquante détectée")
         
-        # Informations sur les données
-        st.subheader("ℹ️ Informations sur les données")
+        # Doublons
+        if profil['lignes_dupliquees'] > 0:
+            st.warning(f"⚠️ {profil['lignes_dupliquees']} lignes dupliquées détectées")
+        else:
+            st.success("✅ Aucune ligne dupliquée détectée")
         
-        col_info1, col_info2 = st.columns(2)
+        doublons_id = profil['doublons_id']
+        if doublons_id is None:
+            st.info("ℹ️ Colonne id_parcelle non chargée : doublons d'identifiants non vérifiés")
+        elif doublons_id['lignes'] > 0:
+            st.warning(
+                f"⚠️ {doublons_id['identifiants']} identifiants de parcelle en double "
+                f"({doublons_id['lignes']} lignes en trop), ex : {', '.join(doublons_id['exemples'][:5])}"
+            )
+        else:
+            st.success("✅ Aucun identifiant de parcelle en double")
         
-        with col_info1:
-            st.write("**Dimensions du dataset :**")
-            st.write(f"- Nombre de lignes : {len(df_parcelles)}")
-            st.write(f"- Nombre de colonnes : {len(df_parcelles.columns)}")
+        # Superficies invalides
+        superficie = profil['superficie']
+        if superficie is not None:
+            invalides = superficie['nulles_ou_negatives'] + superficie['non_finies']
+            if invalides > 0:
+                st.warning(f"⚠️ {invalides} superficies nulles, négatives ou non finies")
+            if superficie['manquantes'] > 0:
+                st.warning(f"⚠️ {superficie['manquantes']} parcelles sans superficie")
+            if invalides == 0 and superficie['manquantes'] == 0:
+                st.success("✅ Toutes les superficies sont valides")
         
-        with col_info2:
-            st.write("**Colonnes disponibles :**")
-            for col in df_parcelles.columns:
-                st.write(f"- {col}")
+        # Communes hors zone d'intervention
+        if profil['communes_inconnues']:
+            st.warning("⚠️ Communes inconnues :")
+            st.dataframe(
+                pd.DataFrame(list(profil['communes_inconnues'].items()), columns=['Commune', 'Parcelles']),
+                use_container_width=True
+            )
+        else:
+            st.success("✅ Toutes les communes sont connues")
         
-        # Statistiques descriptives
-        if st.checkbox("Afficher les statistiques descriptives"):
-            st.subheader("📊 Statistiques descriptives")
-            
-            # Sélection des colonnes numériques
-            numeric_columns = df_parcelles.select_dtypes(include=['number']).columns
-            
-            if len(numeric_columns) > 0:
-                selected_columns = st.multiselect(
-                    "Sélectionnez les colonnes numériques à analyser",
-                    options=numeric_columns,
-                    default=numeric_columns[:3] if len(numeric_columns) >= 3 else numeric_columns
+        # Format des numéros cadastraux
+        nicad = profil['nicad']
+        if nicad is None:
+            st.info("ℹ️ Numéros cadastraux non chargés : format NICAD non vérifié")
+        else:
+            if nicad['format_invalide'] > 0:
+                st.warning(
+                    f"⚠️ {nicad['format_invalide']} numéros cadastraux au format invalide, "
+                    f"ex : {', '.join(nicad['exemples_invalides'][:5])}"
                 )
-                
-                if selected_columns:
-                    st.dataframe(df_parcelles[selected_columns].describe(), use_container_width=True)
-                else:
-                    st.info("Sélectionnez au moins une colonne numérique")
-            else:
-                st.info("Aucune colonne numérique disponible pour les statistiques")
-        
-        # Vérification de la qualité des données
-        if st.checkbox("Vérifier la qualité des données"):
-            st.subheader("🔍 Qualité des données")
-            
-            # Valeurs manquantes
-            missing_data = df_parcelles.isnull().sum()
-            missing_percentage = (missing_data / len(df_parcelles)) * 100
-            
-            quality_df = pd.DataFrame({
-                'Colonne': missing_data.index,
-                'Valeurs manquantes': missing_data.values,
-                'Pourcentage': missing_percentage.values
-            })
-            
-            quality_df = quality_df[quality_df['Valeurs manquantes'] > 0]
-            
-            if len(quality_df) > 0:
-                st.warning("⚠️ Valeurs manquantes détectées :")
-                st.dataframe(quality_df, use_container_width=True)
-            else:
-                st.success("✅ Aucune valeur manquante détectée")
-            
-            # Doublons
-            nb_doublons = df_parcelles.duplicated().sum()
-            if nb_doublons > 0:
-                st.warning(f"⚠️ {nb_doublons} lignes dupliquées détectées")
-            else:
-                st.success("✅ Aucune ligne dupliquée détectée")
+            if nicad['nicad_sans_numero'] > 0:
+                st.warning(f"⚠️ {nicad['nicad_sans_numero']} parcelles avec NICAD sans numéro cadastral")
+            if nicad['numero_sans_nicad'] > 0:
+                st.warning(f"⚠️ {nicad['numero_sans_nicad']} parcelles sans NICAD avec un numéro cadastral")
+            if nicad['format_invalide'] == 0 and nicad['nicad_sans_numero'] == 0 and nicad['numero_sans_nicad'] == 0:
+                st.success("✅ Numéros cadastraux conformes")
+
+
+# Onglets du tableau de bord, dans l'ordre d'affichage
+ONGLETS = {
+    "🌍 Vue Globale": _onglet_vue_globale,
+    "🏘️ Analyse par Commune": _onglet_par_commune,
+    "📍 Analyse Détaillée": _onglet_details,
+    "🧾 Données": _onglet_donnees,
+}
 
 
 # Fonction utilitaire pour le préprocessing des données
@@ -0,0 +1,213 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyse_parcelles import (VALEUR_MANQUANTE_FILTRE, CubeParcelles, EchantillonStratifie, MoteurFiltres,
+                               classes_histogramme, construire_profil_qualite, construire_resume_par_commune,
+                               profil_qualite)
+
+
+@pytest.fixture
+def parcelles():
+    """Petit jeu de parcelles : communes en catégories, une superficie manquante"""
+    return pd.DataFrame({
+        'commune': pd.Categorical(["BALA", "BALA", "DIMBOLI", "BALA", "MISSIRAH", "DIMBOLI", "BALA", "MISSIRAH"]),
+        'village': ["V1", "V2", "V3", "V1", "V4", "V3", "V2", "V4"],
+        'nicad': pd.Categorical(["Avec NICAD", "Sans NICAD", "Avec NICAD", "Avec NICAD",
+                                 "Sans NICAD", "Sans NICAD", "Avec NICAD", "Avec NICAD"]),
+        'statut_deliberation': pd.Categorical(["Délibérée", "Non délibérée", "Délibérée", "Non délibérée",
+                                               "Non délibérée", "Délibérée", "Délibérée", "Non délibérée"]),
+        'type_usag': ["Habitation", "Agriculture", "Agriculture", "Habitation",
+                      "Habitation", "Agriculture", "Commerce", "Habitation"],
+        'superficie': np.array([1.5, 2.0, np.nan, 0.25, 10.0, 3.0, 0.75, 6.5], dtype="float32"),
+    })
+
+
+def test_cube_totaux_identiques_a_pandas(parcelles):
+    cube = CubeParcelles.construire(parcelles)
+
+    assert cube.total() == len(parcelles)
+    assert cube.nombre_nicad() == int((parcelles['nicad'] == "Avec NICAD").sum())
+    assert cube.nombre_deliberees() == int((parcelles['statut_deliberation'] == "Délibérée").sum())
+    assert cube.superficie_totale() == pytest.approx(parcelles['superficie'].astype("float64").sum())
+
+    attendu = parcelles['commune'].value_counts()
+    repartition = cube.repartition('commune')
+    assert repartition.to_dict() == attendu[attendu > 0].to_dict()
+
+    bala = cube.filtrer(commune="BALA")
+    assert bala.total() == int((parcelles['commune'] == "BALA").sum())
+    assert bala.superficie_totale() == pytest.approx(
+        parcelles.loc[parcelles['commune'] == "BALA", 'superficie'].astype("float64").sum())
+
+
+@pytest.mark.parametrize("taille_bloc", [1, 3])
+def test_cube_par_blocs_identique_au_cube_entier(parcelles, taille_bloc):
+    entier = CubeParcelles.construire(parcelles)
+    par_blocs = CubeParcelles.construire(parcelles, taille_bloc=taille_bloc)
+    pd.testing.assert_frame_equal(par_blocs.cube, entier.cube)
+    assert CubeParcelles.construire(parcelles.iloc[:0]).superficie_totale() == 0.0
+
+
+def test_cube_croise_identique_a_crosstab(parcelles):
+    croise = CubeParcelles.construire(parcelles).croise('commune', 'type_usag')
+    attendu = pd.crosstab(parcelles['commune'], parcelles['type_usag']).stack()
+    attendu = attendu[attendu > 0]
+    obtenu = croise.set_index(['commune', 'type_usag'])['Nombre']
+    assert obtenu.sort_index().to_dict() == attendu.sort_index().to_dict()
+
+
+@pytest.mark.parametrize("selections, plage", [
+    (None, None),
+    ({'commune': ["BALA", "MISSIRAH"]}, None),
+    ({'commune': ["BALA"], 'nicad': ["Avec NICAD"]}, None),
+    ({'type_usag': ["Habitation"]}, (0.5, 7.0)),
+    ({'commune': ["BALA", "DIMBOLI", "MISSIRAH"]}, (0.25, 10.0)),
+])
+def test_moteur_filtres_identique_au_masque_pandas(parcelles, selections, plage):
+    moteur = MoteurFiltres(parcelles)
+    masque = pd.Series(True, index=parcelles.index)
+    for colonne, valeurs in (selections or {}).items():
+        masque &= parcelles[colonne].isin(valeurs)
+    if plage is not None:
+        # Plage de superficie inclusive ; les superficies manquantes en sont exclues
+        masque &= parcelles['superficie'].between(*plage)
+
+    bitmap = moteur.bitmap(selections, plage)
+    assert moteur.compter(bitmap) == int(masque.sum())
+    assert moteur.masque(selections, plage).tolist() == masque.tolist()
+    assert moteur.compter_valeur(bitmap, 'nicad', "Avec NICAD") == int(
+        (masque & (parcelles['nicad'] == "Avec NICAD")).sum())
+
+    attendu = pd.crosstab(parcelles.loc[masque, 'commune'], parcelles.loc[masque, 'type_usag'])
+    croise = moteur.tableau_croise(bitmap, 'commune', 'type_usag')
+    assert croise.to_numpy().tolist() == attendu.to_numpy().tolist()
+    assert list(croise.index) == list(attendu.index) and list(croise.columns) == list(attendu.columns)
+
+
+def test_moteur_filtres_garde_les_lignes_sans_valeur(parcelles):
+    parcelles = parcelles.assign(type_usag=parcelles['type_usag'].where(parcelles.index % 3 != 0))
+    moteur = MoteurFiltres(parcelles)
+    assert moteur.valeurs('type_usag')[-1] == VALEUR_MANQUANTE_FILTRE
+
+    # Comme isin sur les valeurs de unique() (NaN compris) : les lignes sans valeur restent retenues
+    options = moteur.valeurs('type_usag')
+    masque = moteur.masque({'type_usag': [v for v in options if v != "Commerce"]})
+    attendu = parcelles['type_usag'].isin([v for v in parcelles['type_usag'].unique() if v != "Commerce"])
+    assert masque.tolist() == attendu.tolist()
+
+    # Désélectionner l'option les retire
+    masque = moteur.masque({'type_usag': ["Habitation", "Agriculture"]})
+    assert masque.tolist() == parcelles['type_usag'].isin(["Habitation", "Agriculture"]).tolist()
+
+    # Le tableau croisé les ignore, comme pd.crosstab
+    croise = moteur.tableau_croise(moteur.bitmap(), 'commune', 'type_usag')
+    assert VALEUR_MANQUANTE_FILTRE not in croise.columns
+    assert croise.to_numpy().sum() == parcelles['type_usag'].notna().sum()
+
+
+def test_classes_histogramme_identiques_a_numpy():
+    valeurs = np.array([0.5, 1.0, 1.2, 2.5, 3.0, 3.1, 7.9, 8.0, np.nan, np.inf])
+    classes = classes_histogramme(valeurs, nb_classes=4)
+    finies = valeurs[np.isfinite(valeurs)]
+    nombres, limites = np.histogram(finies, bins=4)
+
+    assert classes['nombre'].tolist() == nombres.tolist()
+    assert classes['debut'].tolist() == pytest.approx(limites[:-1].tolist())
+    assert classes['fin'].tolist() == pytest.approx(limites[1:].tolist())
+    assert classes['nombre'].sum() == finies.size
+
+
+def test_classes_histogramme_poids_et_cas_limites():
+    # Pondérées par 10 (inverse d'un taux de sondage de 10 %)
+    classes = classes_histogramme([1.0, 2.0, 3.0, 4.0], nb_classes=2, poids=[10, 10, 10, 10])
+    assert classes['nombre'].tolist() == [20, 20]
+
+    # Échelle log : valeurs nulles et négatives exclues
+    assert classes_histogramme([-1.0, 0.0, 1.0, 10.0, 100.0], nb_classes=2, echelle="log")['nombre'].sum() == 3
+
+    # Une seule valeur distincte : une classe unique autour d'elle en échelle log
+    unique = classes_histogramme([2.0, 2.0, 2.0], echelle="log")
+    assert unique[['debut', 'fin', 'nombre']].to_numpy().tolist() == [[1.0, 4.0, 3]]
+    assert classes_histogramme([2.0, 2.0, 2.0])['nombre'].sum() == 3
+    assert classes_histogramme([np.nan]).empty
+
+
+def test_resume_par_commune_identique_au_groupby(parcelles):
+    resume = construire_resume_par_commune(parcelles).set_index('Commune')
+    groupes = parcelles.groupby('commune', observed=True)
+
+    assert resume['Nombre total parcelles'].to_dict() == groupes.size().to_dict()
+    assert resume['Parcelles NICAD'].to_dict() == groupes['nicad'].apply(
+        lambda s: int((s == "Avec NICAD").sum())).to_dict()
+    assert resume['Parcelles délibérées'].to_dict() == groupes['statut_deliberation'].apply(
+        lambda s: int((s == "Délibérée").sum())).to_dict()
+    superficies = groupes['superficie'].apply(lambda s: s.astype("float64").sum())
+    for commune, superficie in superficies.items():
+        assert resume.loc[commune, 'Superficie totale'] == pytest.approx(superficie)
+    # Du plus grand au plus petit nombre de parcelles
+    assert resume['Nombre total parcelles'].is_monotonic_decreasing
+
+
+def test_resume_par_commune_sans_colonne_commune():
+    resume = construire_resume_par_commune(pd.DataFrame({'superficie': [1.0]}))
+    assert resume.empty and 'Commune' in resume.columns
+
+
+def test_profil_qualite_d_une_projection_porte_sur_toutes_les_colonnes(parcelles):
+    complet = parcelles.assign(
+        id_parcelle=["1", "2", "3", "4", "5", "6", "7", "7"],
+        region="TAMBACOUNDA",
+        autorite_delib="Conseil",
+        **{'numero cadastral': [522000000001.0, 522000000002.0, np.nan, 522000000004.0,
+                                np.nan, 522000000006.0, 522000000007.0, 522000000007.0]},
+    )
+    # Projection par défaut : deux lignes ne diffèrent que par leur identifiant
+    projection = complet.drop(columns=['id_parcelle', 'region', 'autorite_delib', 'numero cadastral'])
+    projection.loc[1] = projection.loc[0]
+    complet.loc[1, projection.columns] = projection.loc[1]
+    demandes = []
+
+    def charger_colonnes(colonnes):
+        demandes.append(colonnes)
+        return complet
+
+    profil = profil_qualite(projection, charger_colonnes)
+    attendu = construire_profil_qualite(complet)
+
+    assert demandes == [('id_parcelle', 'region', 'autorite_delib', 'numero cadastral')]
+    assert construire_profil_qualite(projection)['lignes_dupliquees'] == 1
+    assert profil['lignes_dupliquees'] == attendu['lignes_dupliquees'] == 0
+    assert profil['doublons_id']['exemples'] == ["7"]
+    assert profil['nicad']['format_invalide'] == 0
+    assert profil['nicad']['nicad_sans_numero'] == 1
+    pd.testing.assert_frame_equal(profil['valeurs_manquantes'], attendu['valeurs_manquantes'])
+
+
+def test_echantillon_complet_donne_les_totaux_exacts(parcelles):
+    # Fraction de 100 % : chaque strate est recensée, l'estimation est exacte et sans incertitude
+    echantillon = EchantillonStratifie(parcelles, fraction=1.0, minimum=0)
+    assert echantillon.taille == len(parcelles)
+
+    selections = {'type_usag': ["Habitation", "Agriculture"]}
+    estimations = echantillon.estimer(selections)
+    masque = parcelles['type_usag'].isin(selections['type_usag'])
+
+    assert estimations['total'] == (pytest.approx(masque.sum()), 0.0)
+    assert estimations['nicad'] == (pytest.approx((masque & (parcelles['nicad'] == "Avec NICAD")).sum()), 0.0)
+    assert estimations['deliberees'] == (
+        pytest.approx((masque & (parcelles['statut_deliberation'] == "Délibérée")).sum()), 0.0)
+    assert estimations['superficie'] == (
+        pytest.approx(parcelles.loc[masque, 'superficie'].astype("float64").sum()), 0.0)
+    assert estimations['poids'].tolist() == [1.0] * int(masque.sum())
+
+
+def test_echantillon_partiel_extrapole_par_strate():
+    df = pd.DataFrame({'commune': ["A"] * 100 + ["B"] * 10, 'superficie': np.ones(110)})
+    echantillon = EchantillonStratifie(df, fraction=0.2, minimum=10)
+
+    # 20 lignes tirées dans A, B recensée entièrement (pas plus que le minimum)
+    assert echantillon.taille == 30
+    total, demi_intervalle = echantillon.estimer()['total']
+    assert total == pytest.approx(110.0)
+    assert demi_intervalle == pytest.approx(0.0)
@@ -0,0 +1,222 @@
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from data_loader import (CacheVersionne, DataManifest, DataRegistry, DatasetStore,
+                         lire_excel_par_blocs, process_parcelles_data, version_dataset)
+
+
+def _fichier(tmp_path):
+    chemin = tmp_path / "source.csv"
+    chemin.write_text("commune,superficie\nBALA,1.5\nDIMBOLI,2.0\n", encoding="utf-8")
+    return str(chemin)
+
+
+def test_cache_remet_une_copie_a_chaque_appelant(tmp_path):
+    chemin = _fichier(tmp_path)
+    cache = CacheVersionne()
+    charger = lambda: pd.DataFrame({'commune': ["BALA", "DIMBOLI"], 'superficie': [1.5, 2.0]})
+
+    premier = cache.obtenir('source', [chemin], charger)
+    version_initiale = version_dataset(premier)
+
+    # Modifications faites par les pages sur le DataFrame reçu
+    premier['progres'] = 1
+    premier['superficie'] = premier['superficie'] * 100
+    premier.columns = premier.columns.str.upper()
+
+    second = cache.obtenir('source', [chemin], charger)
+    assert list(second.columns) == ['commune', 'superficie']
+    assert second['superficie'].tolist() == [1.5, 2.0]
+    assert version_dataset(second) == version_initiale
+
+
+def test_cache_copie_les_tuples_de_dataframes(tmp_path):
+    chemin = _fichier(tmp_path)
+    cache = CacheVersionne()
+    charger = lambda: (pd.DataFrame({'a': [1]}), pd.DataFrame({'b': [2]}))
+
+    premier_a, _ = cache.obtenir('genre', [chemin], charger)
+    premier_a['a'] = 0
+
+    second_a, second_b = cache.obtenir('genre', [chemin], charger)
+    assert second_a['a'].tolist() == [1]
+    assert second_b['b'].tolist() == [2]
+
+
+def _classeur(tmp_path):
+    """Classeur avec une ligne vide interne, une ligne vide finale et des colonnes de types variés"""
+    classeur = Workbook()
+    feuille = classeur.active
+    feuille.append(['id', 'surf', 'nom', 'vide', 'mixte'])
+    feuille.append([1, 1.5, "BALA", None, 1])
+    feuille.append([2, 2.0, "DIMBOLI", None, 2])
+    feuille.append([None, None, None, None, None])
+    feuille.append([4, 3.25, None, None, "x"])
+    feuille.append([5, 4.0, "MISSIRAH", None, 5])
+    feuille.append([None, None, None, None, None])
+    chemin = tmp_path / "blocs.xlsx"
+    classeur.save(chemin)
+    return str(chemin)
+
+
+@pytest.mark.parametrize("taille_bloc", [1, 2, 3, 100])
+def test_lecture_par_blocs_identique_a_read_excel(tmp_path, taille_bloc):
+    chemin = _classeur(tmp_path)
+    blocs = list(lire_excel_par_blocs(chemin, taille_bloc=taille_bloc))
+
+    resultat = pd.concat(blocs, ignore_index=True)
+    pd.testing.assert_frame_equal(resultat, pd.read_excel(chemin))
+
+    # Une fois établi (ou élargi), le type d'une colonne est gardé par tous les blocs suivants
+    for col in resultat.columns:
+        types = [bloc[col].dtype for bloc in blocs]
+        premier_final = types.index(resultat[col].dtype)
+        assert all(type_col == resultat[col].dtype for type_col in types[premier_final:])
+
+
+def _classeur_textes(tmp_path):
+    """Textes comme les exports Kobo : "nan" littéraux, NICAD en texte à zéros initiaux, booléens en texte
+
+    Les identifiants ne deviennent non numériques qu'à la fin de la feuille : la
+    conversion des blocs précédents doit en tenir compte.
+    """
+    classeur = Workbook()
+    feuille = classeur.active
+    feuille.append(['id_parcelle', 'Numero Cadastral', 'superficie', 'valide', 'commune'])
+    for i in range(9):
+        feuille.append([f"05220{i}", f"052203030130002{i}" if i % 3 else "nan", str(1000 + i),
+                        "True" if i % 2 else "False", "NULL" if i == 4 else "BALA"])
+    feuille.append(["nan", None, "N/A", "False", "DIMBOLI"])
+    feuille.append(["https://qrtor.net/", "0522030301300099", "12,5", "True", ""])
+    chemin = tmp_path / "textes.xlsx"
+    classeur.save(chemin)
+    return str(chemin)
+
+
+@pytest.mark.parametrize("taille_bloc", [1, 4, 100])
+def test_lecture_par_blocs_textes_comme_read_excel(tmp_path, taille_bloc):
+    chemin = _classeur_textes(tmp_path)
+    resultat = pd.concat(lire_excel_par_blocs(chemin, taille_bloc=taille_bloc), ignore_index=True)
+    attendu = pd.read_excel(chemin)
+    pd.testing.assert_frame_equal(resultat, attendu)
+
+    # Valeurs manquantes textuelles, NICAD numérique, textes gardés tels quels si une valeur ne se convertit pas
+    assert resultat['id_parcelle'].isna().sum() == 1
+    assert resultat['id_parcelle'].iloc[0] == "052200"
+    assert resultat['Numero Cadastral'].dtype == 'float64'
+    assert resultat['superficie'].tolist()[-1] == "12,5"
+    assert resultat['valide'].dtype == bool
+
+
+def test_lecture_par_blocs_applique_le_dtype_declare(tmp_path):
+    chemin = _classeur(tmp_path)
+    resultat = pd.concat(lire_excel_par_blocs(chemin, taille_bloc=2, dtype={'id': str}), ignore_index=True)
+    assert resultat['id'].tolist()[:2] == ["1", "2"]
+    assert resultat['id'].isna().sum() == 1
+
+
+def test_schema_compact_des_parcelles():
+    superficies = [0.1] * 30000 + [1234.567, None]
+    df = process_parcelles_data(pd.DataFrame({
+        'commune': ["BALA"] * 30001 + [None],
+        'nicad': ["Oui", "Non"] * 15001,
+        'delibere': ["Oui", "Non", "Oui", None] * 7500 + ["Oui", "Non"],
+        'superficie': superficies,
+        'id_parcelle': range(30002),
+    }))
+
+    assert isinstance(df['delibere'].dtype, pd.CategoricalDtype)
+    assert isinstance(df['commune'].dtype, pd.CategoricalDtype)
+    assert df['deliberee'].sum() == 15001
+    # Superficie en float64 : le total ne dérive pas
+    assert df['superficie'].dtype == 'float64'
+    assert df['superficie'].sum() == pd.Series(superficies, dtype="float64").sum()
+
+
+def test_version_recalculee_apres_modification_en_place():
+    df = pd.DataFrame({'a': [1, 2]})
+    version = version_dataset(df)
+    df['b'] = [3, 4]
+    assert version_dataset(df) != version
+
+
+def _jeu(taille):
+    return pd.DataFrame({'valeur': range(taille)})
+
+
+def test_magasin_supprime_le_fichier_relu(tmp_path):
+    magasin = DatasetStore(memoire_max=1, dossier_deversement=tmp_path)
+    magasin.deposer('a', _jeu(1000))
+    magasin.deposer('b', _jeu(1000))
+    assert list(tmp_path.glob("*.parquet")) == [tmp_path / "a.parquet"]
+
+    # Relire "a" le remet en mémoire, supprime son fichier et déverse "b"
+    assert magasin.obtenir('a')['valeur'].tolist() == list(range(1000))
+    assert list(tmp_path.glob("*.parquet")) == [tmp_path / "b.parquet"]
+
+
+def test_magasin_relache_supprime_le_jeu_inutilise(tmp_path):
+    magasin = DatasetStore(memoire_max=1, dossier_deversement=tmp_path)
+    for poignee in ('a', 'b'):
+        magasin.retenir(poignee)
+        magasin.deposer(poignee, _jeu(1000))
+    magasin.retenir('a')
+
+    magasin.relacher('a')
+    assert magasin.contient('a')
+    magasin.relacher('a')
+    assert not magasin.contient('a')
+    assert not (tmp_path / "a.parquet").exists()
+
+
+def test_magasin_purge_et_plafond_disque(tmp_path):
+    (tmp_path / "orphelin.parquet").write_bytes(b"ancien")
+    magasin = DatasetStore(memoire_max=1, dossier_deversement=tmp_path, disque_max=10 ** 9)
+    # Créer un magasin (import de data_loader dans un processus du pool) ne purge rien
+    assert (tmp_path / "orphelin.parquet").exists()
+    magasin.purger_dossier()
+    assert not (tmp_path / "orphelin.parquet").exists()
+
+    for poignee in 'abcd':
+        magasin.deposer(poignee, _jeu(1000))
+    taille_fichier = (tmp_path / "a.parquet").stat().st_size
+    magasin.disque_max = 2 * taille_fichier
+    magasin.deposer('e', _jeu(1000))
+    assert sorted(p.stem for p in tmp_path.glob("*.parquet")) == ['c', 'd']
+    assert magasin.disque_utilise() <= magasin.disque_max
+
+    # Purge tardive : les fichiers indexés par le magasin restent relisibles
+    magasin.purger_dossier()
+    assert magasin.obtenir('c')['valeur'].size == 1000
+
+
+def test_registre_garde_la_valeur_materialisee(tmp_path):
+    cache = CacheVersionne()
+    registre = DataRegistry(cache, DataManifest([tmp_path]))
+    appels = []
+
+    def charger():
+        appels.append(1)
+        return pd.DataFrame({'a': [1, 2]})
+
+    registre.declarer('jeu', charger)
+    premier = registre.obtenir('jeu')
+    premier['a'] = 0
+    second = registre.obtenir('jeu')
+    assert len(appels) == 1
+    assert second['a'].tolist() == [1, 2]
+
+    # Une entrée ajoutée ou rechargée dans le cache invalide la valeur gardée
+    cache.obtenir('autre', [], lambda: pd.DataFrame({'b': [1]}))
+    registre.obtenir('jeu')
+    assert len(appels) == 2
+
+
+def test_registre_retente_un_chargement_vide(tmp_path):
+    registre = DataRegistry(CacheVersionne(), DataManifest([tmp_path]))
+    appels = []
+    registre.declarer('jeu', lambda: appels.append(1) or pd.DataFrame())
+    registre.obtenir('jeu')
+    registre.obtenir('jeu')
+    assert len(appels) == 2
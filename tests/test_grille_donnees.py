@@ -0,0 +1,16 @@
+import numpy as np
+import pandas as pd
+
+from grille_donnees import export_csv_par_blocs
+
+
+def test_export_csv_par_blocs_identique_a_to_csv():
+    df = pd.DataFrame({'commune': list("abcdefg"), 'superficie': np.arange(7) * 1.5})
+    positions = np.array([6, 0, 3, 5])
+    attendu = df.iloc[positions].to_csv(index=False).encode("utf-8")
+    assert export_csv_par_blocs(df, positions, taille_bloc=3) == attendu
+
+
+def test_export_csv_vue_vide_garde_les_entetes():
+    df = pd.DataFrame({'commune': ["a"], 'superficie': [1.0]})
+    assert export_csv_par_blocs(df, np.array([], dtype="int64")) == b"commune,superficie\n"
@@ -0,0 +1,209 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from prepare_data import (VARIABLE_RACINE_SOURCES, CacheEtapes, RapportExecution, charger_config, cle_etape,
+                          ecrire_excel_flux, marquer_deliberations, rapprocher_reference, table_tableau_de_bord)
+
+
+def _rapprochement_par_fusion(df_enquete, df_reference, attributs, mapping_cols=None):
+    """Rapprochement d'origine (isin + map pour le NICAD, merge pour les attributs), servant de référence"""
+    mapping_cols = mapping_cols or {}
+    df_enquete = df_enquete.assign(id_parcelle=df_enquete['id_parcelle'].astype(str))
+    df_reference = df_reference.assign(id_parcelle=df_reference['id_parcelle'].astype(str))
+    df_enquete['hasNicad'] = df_enquete['id_parcelle'].isin(df_reference['id_parcelle']).map({True: "Oui", False: "Non"})
+    df_enquete['Nicad'] = df_enquete['id_parcelle'].map(df_reference.set_index('id_parcelle')['Nicad'].to_dict())
+
+    colonnes = [mapping_cols.get(a, a) for a in attributs if mapping_cols.get(a, a) in df_reference.columns]
+    df_merge = df_enquete.merge(df_reference[['id_parcelle'] + colonnes], on='id_parcelle', how='left',
+                                suffixes=('', '_urm'))
+    for attr in attributs:
+        col_source = mapping_cols.get(attr, attr)
+        col_urm = f"{col_source}_urm" if col_source in df_enquete.columns else col_source
+        if col_source in df_reference.columns:
+            valeurs = df_merge[col_urm]
+            if attr in df_enquete.columns:
+                valeurs = valeurs.combine_first(df_merge[attr])
+            df_merge[attr] = valeurs.fillna("Non spécifié")
+            if col_urm != attr:
+                df_merge = df_merge.drop(columns=[col_urm])
+        else:
+            df_merge[attr] = df_merge.get(attr, pd.Series("Non spécifié", index=df_merge.index)).fillna("Non spécifié")
+    df_merge['Nicad'] = df_merge['Nicad'].fillna("")
+    return df_merge
+
+
+@pytest.fixture
+def enquete():
+    return pd.DataFrame({
+        'id_parcelle': [101, 102, 103, 104, 105],
+        'commune': ["BALA", "BALA", "DIMBOLI", None, "MISSIRAH"],
+        'type_usag': ["Habitation", None, "Agriculture", None, None],
+    })
+
+
+@pytest.fixture
+def reference():
+    return pd.DataFrame({
+        'id_parcelle': ["103", "101", "105", "999"],
+        'Nicad': ["0522/A", "0522/B", None, "0522/Z"],
+        'commune': ["DIMBOLI", None, "MISSIRAH", "BALA"],
+        'usage': ["Commerce", "Habitation", None, "Habitation"],
+        'village': ["V3", "V1", "V5", "V9"],
+    })
+
+
+def test_rapprochement_identique_a_la_fusion(enquete, reference):
+    attributs = ['commune', 'type_usag', 'village', 'region']
+    mapping_cols = {'type_usag': 'usage'}
+    attendu = _rapprochement_par_fusion(enquete.copy(), reference.copy(), attributs, mapping_cols)
+    resultat, stats = rapprocher_reference(enquete.copy(), reference.copy(), attributs, mapping_cols)
+
+    colonnes = ['id_parcelle', 'hasNicad', 'Nicad'] + attributs
+    assert resultat[colonnes].astype(object).to_numpy().tolist() == attendu[colonnes].astype(object).to_numpy().tolist()
+    assert stats['correspondances'] == 3
+    assert stats['nicads_ajoutes'] == 2
+    assert stats['attributs_completes'] == {'commune': 2, 'type_usag': 2, 'village': 3, 'region': 0}
+
+
+def test_rapprochement_doublons_de_reference(enquete, reference):
+    doublee = pd.concat([reference, pd.DataFrame({'id_parcelle': ["101"], 'Nicad': ["0522/C"]})], ignore_index=True)
+    resultat, stats = rapprocher_reference(enquete.copy(), doublee, ['commune'])
+
+    # L'enquête n'est jamais dupliquée ; la dernière ligne de la référence est retenue
+    assert len(resultat) == len(enquete)
+    assert stats['doublons_reference'] == 1
+    assert resultat.loc[resultat['id_parcelle'] == "101", 'Nicad'].tolist() == ["0522/C"]
+
+
+def test_marquer_deliberations():
+    parcelles = pd.DataFrame({
+        'id_parcelle': ["1", "2", "3", "4", "5"],
+        'Nicad': [" 0522/a", "0522/B", None, "nan", "0522/E"],
+        'hasNicad': ["Oui", "Oui", "Non", "Oui", "Non"],
+    })
+    deliberations = pd.DataFrame({
+        'Nicad': ["0522/A", "0522/X", None, "0522/e "],
+        'Autorité': ["Conseil", "Préfet", "Conseil", None],
+    })
+
+    resultat, stats = marquer_deliberations(parcelles.copy(), deliberations.copy())
+
+    # Jointure sur le NICAD normalisé (1 et 5), puis parcelles hasNicad="Oui" non jointes (2 et 4)
+    assert resultat['delibere'].tolist() == ["Oui", "Oui", "Non", "Oui", "Oui"]
+    assert resultat['autorite_delib'].tolist() == ["Conseil", "Non spécifié", "Non spécifié", "Non spécifié",
+                                                   "Non spécifié"]
+    assert resultat['Nicad'].tolist()[:2] == ["0522/A", "0522/B"]
+    assert stats['nicads_communs'] == 2
+    assert stats['nicads_deliberations'] == 3
+    assert stats['taux_rapprochement_nicad'] == pytest.approx(2 / 3, abs=1e-4)
+    assert stats['nicads_invalides_parcelles'] == 1
+    assert stats['lignes_dupliquees_jointure'] == 0
+    assert stats['deliberees_par_jointure'] == 2
+    assert stats['deliberees_par_has_nicad'] == 2
+    assert stats['deliberees_sans_nicad'] == 1
+
+
+@pytest.fixture
+def config_json(tmp_path):
+    chemin = tmp_path / "config" / "prepare_data.json"
+    chemin.parent.mkdir()
+    chemin.write_text(json.dumps({
+        'lots': [{'nom': "Lot", 'groupe': "kobo", 'enquete': "Enquete\\lot 1.xlsx",
+                  'reference': "URM/lot 1.xlsx", 'attributs': ["superficie"]}],
+        'deliberations': ["Delib\\Delib_Individuel.xlsx"],
+    }), encoding="utf-8")
+    return chemin
+
+
+def test_config_chemins_portables_et_racine(config_json, tmp_path, monkeypatch):
+    monkeypatch.delenv(VARIABLE_RACINE_SOURCES, raising=False)
+    config = charger_config(config_json)
+    # Sans racine : dossier de la configuration ; \\ accepté comme séparateur
+    assert Path(config['lots'][0]['enquete']) == config_json.parent / "Enquete" / "lot 1.xlsx"
+    assert Path(config['lots'][0]['reference']) == config_json.parent / "URM" / "lot 1.xlsx"
+    assert Path(config['deliberations'][0]) == config_json.parent / "Delib" / "Delib_Individuel.xlsx"
+
+    # La variable d'environnement, puis l'option --racine, remplacent la racine
+    monkeypatch.setenv(VARIABLE_RACINE_SOURCES, str(tmp_path / "env"))
+    assert Path(charger_config(config_json)['deliberations'][0]).parent.parent == tmp_path / "env"
+    config = charger_config(config_json, racine=str(tmp_path / "cli"))
+    assert Path(config['lots'][0]['enquete']).parent.parent == tmp_path / "cli"
+    # Racine relative : par rapport au dossier de la configuration
+    assert Path(charger_config(config_json, racine="../sources")['racine']) == config_json.parent / ".." / "sources"
+
+
+def test_superficies_non_numeriques_exportees_telles_quelles(tmp_path, caplog):
+    openpyxl = pytest.importorskip("openpyxl")
+    df_export = pd.DataFrame({
+        'id_parcelle': ["1", "2", "3", "4"],
+        'superficie': [250.5, "env. 300", "Non spécifié", "12"],
+        'hasNicad': ["Oui", "Non", "Non", "Oui"],
+    })
+
+    with caplog.at_level("WARNING"):
+        df = table_tableau_de_bord(df_export, np.array(["kobo"] * 4))
+    # Parquet : superficie numérique ; le texte non numérique est compté dans les avertissements
+    assert df['superficie'].tolist()[::3] == [250.5, 12.0] and df['superficie'].isna().sum() == 2
+    assert "1 superficies non numériques" in caplog.text
+
+    chemin = tmp_path / "parcelles.xlsx"
+    colonnes = [col for col in df.columns if col != 'source']
+    assert ecrire_excel_flux(df, str(chemin), colonnes) == 4
+    lignes = list(openpyxl.load_workbook(chemin, read_only=True).active.iter_rows(values_only=True))
+    assert lignes[0] == ('id_parcelle', 'superficie', 'hasNicad')
+    assert [ligne[1] for ligne in lignes[1:]] == [250.5, "env. 300", "Non spécifié", 12]
+
+
+def test_cache_etapes_recalcule_seulement_si_la_cle_change(tmp_path):
+    cache = CacheEtapes(tmp_path / ".cache")
+    appels = []
+
+    def calculer():
+        appels.append(1)
+        return pd.DataFrame({'a': np.arange(3)})
+
+    cle = cle_etape("source", 1)
+    premier = cache.executer("lot", cle, calculer)
+    second = cache.executer("lot", cle, calculer)
+    pd.testing.assert_frame_equal(premier, second)
+    assert len(appels) == 1
+
+    # Nouvelle clé : recalcul, et l'ancienne version de l'étape est supprimée
+    nouvelle = cle_etape("source", 2)
+    cache.executer("lot", nouvelle, calculer)
+    assert len(appels) == 2
+    assert sorted(p.name for p in (tmp_path / ".cache").glob("lot.*.pkl")) == [cache.chemin("lot", nouvelle).name]
+
+
+def test_rapport_note_l_origine_et_les_lignes_des_etapes(tmp_path):
+    rapport = RapportExecution()
+    cache = CacheEtapes(tmp_path / ".cache", rapport=rapport)
+    for _ in range(2):
+        cache.executer("lot", cle_etape("source"), lambda: pd.DataFrame({'a': np.arange(3)}))
+
+    assert [etape['origine'] for etape in rapport.donnees['etapes']] == ['calcul', 'cache']
+    assert [etape['lignes_sortie'] for etape in rapport.donnees['etapes']] == [3, 3]
+
+
+def test_cache_etapes_pickle_illisible_recalcule(tmp_path):
+    cache = CacheEtapes(tmp_path / ".cache")
+    cle = cle_etape("source")
+    cache.executer("lot", cle, lambda: pd.DataFrame({'a': [1]}))
+    cache.chemin("lot", cle).write_bytes(b"pas un pickle")
+
+    resultat = cache.executer("lot", cle, lambda: pd.DataFrame({'a': [2]}))
+    assert resultat['a'].tolist() == [2]
+    assert pd.read_pickle(cache.chemin("lot", cle))['a'].tolist() == [2]
+
+
+def test_cache_etapes_inactif_n_ecrit_rien(tmp_path):
+    cache = CacheEtapes(tmp_path / ".cache", actif=False)
+    appels = []
+    for _ in range(2):
+        cache.executer("lot", cle_etape("source"), lambda: appels.append(1) or pd.DataFrame())
+    assert len(appels) == 2
+    assert not (tmp_path / ".cache").exists()